@@ -0,0 +1,64 @@
+"""
+Compare the interface type classifier with matching each pattern in turn
+
+The corpus mimics a fleet: a few dozen part numbers and interface types,
+each found on many interfaces.
+
+    pip install -e . && python benchmarks/interface_type_classifier.py
+"""
+import random
+import re
+import timeit
+
+from netbox_netdev_inventory.vendors.cisco.constants import InterfacesRegex
+from netbox_netdev_inventory.vendors.classifier import classify_interface_type
+from netbox_netdev_inventory.vendors.constants import NetboxInterfaceTypes
+
+
+PART_NUMBERS = (
+    "10/100BaseTX", "10/100/1000BaseTX", "10/100/1000-TX", "1000BaseSX SFP",
+    "1000BaseLX SFP", "1000BASE-T", "1000BASE-SX", "1000BASE-LX/LH",
+    "SFP-10G-SR", "SFP-10G-LR", "SFP-10G-ER", "SFP-H10GB-CU3M",
+    "DWDM-SFP-10G-C", "CWDM-SFP-10G-1550", "10Gbase-SR", "10Gbase-LR",
+    "10Gbase-CU3M", "SFP-25G-SR-S", "SFP-H25G-CU1M", "QSFP-40G-SR4",
+    "QSFP-40G-SR-BD", "QSFP-4X10G-LR-S", "QSFP-100G-SR4-S",
+    "QSFP-40/100-SRBD", "QSFP-4SFP25G-CU3M", "CFP-100G-LR4",
+    "CFP2-100G-ER4", "XENPAK-10GB-LR", "X2-10GB-SR", "GLC-T", "GLC-SX-MMD",
+    "SFP-GE-T", "--", "Not present",
+)
+#: interfaces of a fleet of a thousand 48 ports switches
+CORPUS = [
+    random.Random(index).choice(PART_NUMBERS) for index in range(48000)
+]
+
+
+def classify_one_by_one(value):
+    for pattern in InterfacesRegex:
+        if re.match(pattern.value, value):
+            return getattr(NetboxInterfaceTypes, pattern.name).value
+
+
+def classify(value):
+    return classify_interface_type(InterfacesRegex, value)
+
+
+def main():
+    assert list(map(classify, PART_NUMBERS)) == list(
+        map(classify_one_by_one, PART_NUMBERS)
+    )
+
+    for name, func in (
+            ("one pattern at a time", classify_one_by_one),
+            ("compiled and memoized", classify),
+    ):
+        duration = min(timeit.repeat(
+            lambda: list(map(func, CORPUS)), number=1, repeat=5
+        ))
+        print("{}: {:.1f}ms for {} interfaces".format(
+            name, duration * 1000, len(CORPUS)
+        ))
+    print(classify_interface_type.cache_info())
+
+
+if __name__ == "__main__":
+    main()
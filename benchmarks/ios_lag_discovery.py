@@ -0,0 +1,154 @@
+"""
+Compare the CLI commands sent, and the time spent, to discover the LAGs of
+an IOS switch with one `show run interface` per interface, or with one
+running-config section
+
+Both paths replay the outputs recorded in tests/mock_driver with the napalm
+mock driver. The `show run interface` outputs of the per-interface lookup
+are rebuilt from the recorded section, in a temporary mock directory. The
+mock driver answers without network: each path is also measured with a
+simulated round trip per command sent.
+
+    pip install -e . && python benchmarks/ios_lag_discovery.py
+"""
+from collections import defaultdict
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import napalm
+
+from netbox_netdev_inventory.vendors.cisco import IOSParser
+
+
+MOCK_PATH = os.path.join(
+    os.path.dirname(__file__), os.pardir, "tests", "mock_driver", "global",
+    "cisco", "ios"
+)
+SECTION_FIXTURE = "cli.3.show_running_config_section_interface.0"
+#: commands recorded before the LAG discovery
+SKIPPED_COMMANDS = ("show interface switchport", "show vlan all-ports")
+#: simulated round trip of a command, in seconds
+ROUND_TRIP = 0.05
+
+
+class CountingDevice():
+    """
+    Proxy of a napalm device counting the CLI commands sent, and the time
+    they would take with a round trip each
+    """
+
+    def __init__(self, device, round_trip=0):
+        self._device = device
+        self.round_trip = round_trip
+        self.commands = 0
+
+    def cli(self, commands):
+        self.commands += len(commands)
+        time.sleep(self.round_trip * len(commands))
+        return self._device.cli(commands)
+
+    def __getattr__(self, name):
+        return getattr(self._device, name)
+
+
+def per_interface_lags(device, interfaces):
+    """
+    LAG discovery as done before, one `show run interface` per interface
+    """
+    interfaces_lag = defaultdict(list)
+    for interface in sorted(interfaces):
+        cmd = "show run interface {}".format(interface)
+        interface_conf_dump = device.cli([cmd])[cmd]
+
+        channel_group_match = re.search(
+            r"^\s*channel-group (\S*)", interface_conf_dump, re.MULTILINE
+        )
+        if channel_group_match:
+            interfaces_lag[interface] = "port-channel{}".format(
+                channel_group_match.groups()[0]
+            )
+
+    return interfaces_lag
+
+
+def section_lags(device, interfaces):
+    return IOSParser(device).get_interfaces_lag(interfaces)
+
+
+def build_per_interface_mock(path, interfaces):
+    """
+    Copy the recorded outputs to `path`, with the `show run interface`
+    output of each interface, as the switch replies it
+    """
+    for name in os.listdir(MOCK_PATH):
+        shutil.copy(os.path.join(MOCK_PATH, name), path)
+
+    with open(os.path.join(MOCK_PATH, SECTION_FIXTURE)) as f:
+        conf = IOSParser._parse_interfaces_conf(f.read())
+
+    first_call = len(SKIPPED_COMMANDS) + 1
+    for call, interface in enumerate(sorted(interfaces), first_call):
+        section = "interface {}{}\nend\n".format(
+            interface, conf.get(interface, "")
+        )
+        output = (
+            "Building configuration...\n\n"
+            "Current configuration : {} bytes\n!\n{}".format(
+                len(section), section
+            )
+        )
+        name = "cli.{}.{}.0".format(call, re.sub(
+            "[^a-zA-Z0-9]+", "_", "show run interface {}".format(interface)
+        ))
+        with open(os.path.join(path, name), "w") as f:
+            f.write(output)
+
+
+def replay(path, lookup, round_trip):
+    device = napalm.get_network_driver("mock")(
+        "localhost", "foo", "bar",
+        optional_args={"path": path, "profile": ["ios"]}
+    )
+    device.open()
+    interfaces = device.get_interfaces()
+    for cmd in SKIPPED_COMMANDS:
+        device.cli([cmd])
+
+    counting_device = CountingDevice(device, round_trip)
+    start = time.perf_counter()
+    lags = lookup(counting_device, interfaces)
+    duration = time.perf_counter() - start
+
+    return interfaces, lags, counting_device.commands, duration
+
+
+def main():
+    tmp_path = tempfile.mkdtemp()
+    try:
+        interfaces = replay(MOCK_PATH, section_lags, 0)[0]
+        build_per_interface_mock(tmp_path, interfaces)
+
+        for name, path, lookup in (
+                ("per-interface lookup", tmp_path, per_interface_lags),
+                ("section lookup", MOCK_PATH, section_lags),
+        ):
+            for round_trip in (0, ROUND_TRIP):
+                interfaces, lags, commands, duration = replay(
+                    path, lookup, round_trip
+                )
+                print(
+                    "{}: {} interfaces, {} in a LAG, {} command(s) in "
+                    "{:.0f}ms with a {:.0f}ms round trip".format(
+                        name, len(interfaces), len(lags), commands,
+                        duration * 1000, round_trip * 1000
+                    )
+                )
+    finally:
+        shutil.rmtree(tmp_path)
+
+
+if __name__ == "__main__":
+    main()
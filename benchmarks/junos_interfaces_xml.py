@@ -0,0 +1,133 @@
+"""
+Compare the time and peak memory of reading the LAG members from a large
+get-interface-information reply, as napalm's _rpc returns it or as PyEZ does
+
+PyEZ always parses the whole reply: napalm's _rpc serializes that element to
+text, which was parsed again into a whole tree, or incrementally. The reply
+element of PyEZ can also be walked as is.
+
+The synthetic reply mimics an MX router with many logical units. Each path
+runs in its own process, from the reply element PyEZ would return, to
+measure its own peak RSS.
+
+    pip install -e . && python benchmarks/junos_interfaces_xml.py
+"""
+import multiprocessing
+import resource
+import time
+
+import defusedxml.lxml
+import lxml.etree
+
+from netbox_netdev_inventory.vendors.juniper.base import iter_xml_elements
+
+
+PHYSICAL_INTERFACES = 400
+UNITS = 50
+
+
+def build_reply():
+    units = "".join(
+        "<logical-interface><name>{{name}}.{unit}</name>"
+        "<admin-status>up</admin-status><oper-status>up</oper-status>"
+        "<address-family><address-family-name>inet</address-family-name>"
+        "<interface-address><ifa-local>10.{unit}.0.1/24</ifa-local>"
+        "</interface-address></address-family></logical-interface>".format(
+            unit=unit
+        )
+        for unit in range(UNITS)
+    )
+    interfaces = "".join(
+        "<physical-interface><name>{name}</name>"
+        "<admin-status>up</admin-status><oper-status>up</oper-status>"
+        "{units}<logical-interface><name>{name}.32767</name>"
+        "<address-family><address-family-name>aenet</address-family-name>"
+        "<ae-bundle-name>ae{ae}.0</ae-bundle-name></address-family>"
+        "</logical-interface></physical-interface>".format(
+            name="xe-0/{}/{}".format(index // 48, index % 48),
+            units=units.replace("{name}", "xe-0/{}/{}".format(
+                index // 48, index % 48
+            )),
+            ae=index % 10
+        )
+        for index in range(PHYSICAL_INTERFACES)
+    )
+    return (
+        '<rpc-reply xmlns:junos="http://xml.juniper.net/junos/17.3R3/junos">'
+        "<interface-information>{}</interface-information></rpc-reply>"
+    ).format(interfaces)
+
+
+def rpc_text(element):
+    """
+    Reply text, as returned by napalm's _rpc
+    """
+    return lxml.etree.tostring(element)
+
+
+def parse_tree(element):
+    lags = {}
+    parsed_xml = defusedxml.lxml.fromstring(rpc_text(element))
+    for ifblock in parsed_xml.xpath(".//physical-interface"):
+        bundle_xpath = ifblock.xpath(".//ae-bundle-name")
+        if bundle_xpath:
+            lags[ifblock.xpath("name")[0].text] = bundle_xpath[0].text
+    return lags
+
+
+def parse_incrementally(element):
+    return read_lags(rpc_text(element))
+
+
+def walk_element(element):
+    return read_lags(element)
+
+
+def read_lags(reply):
+    lags = {}
+    for ifblock in iter_xml_elements(reply, "physical-interface"):
+        bundle_name = ifblock.findtext(".//{*}ae-bundle-name")
+        if bundle_name:
+            lags[ifblock.findtext("{*}name")] = bundle_name
+    return lags
+
+
+def measure(parser, reply, results):
+    # the reply element returned by PyEZ execute()
+    element = lxml.etree.fromstring(reply)[0]
+    del reply
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    lags = parser(element)
+    duration = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((len(lags), duration, rss_after - rss_before))
+
+
+def main():
+    reply = build_reply()
+    print("reply of {:.1f}MB, {} physical interfaces of {} units".format(
+        len(reply) / 1024 ** 2, PHYSICAL_INTERFACES, UNITS + 1
+    ))
+
+    results = multiprocessing.Queue()
+    for name, parser in (
+            ("_rpc text, whole tree", parse_tree),
+            ("_rpc text, incremental", parse_incrementally),
+            ("PyEZ element, walked", walk_element),
+    ):
+        process = multiprocessing.Process(
+            target=measure, args=(parser, reply, results)
+        )
+        process.start()
+        lags, duration, rss = results.get()
+        process.join()
+        # ru_maxrss is in kB on Linux
+        print("{}: {} LAG members in {:.0f}ms, peak RSS +{:.1f}MB".format(
+            name, lags, duration * 1000, rss / 1024
+        ))
+
+
+if __name__ == "__main__":
+    main()
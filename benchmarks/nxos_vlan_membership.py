@@ -0,0 +1,111 @@
+"""
+Compare the interface to VLANs map built by expanding the ports of each
+VLAN with the one expanding each distinct list of port ranges once
+
+The fixture is the `show vlan brief | json` output of a switch with a full
+VLAN table: 4000 VLANs, each on 96 trunk ports and 4 port-channels, listed
+as ranges as NX-OS does.
+
+    pip install -e . && python benchmarks/nxos_vlan_membership.py
+"""
+import json
+import re
+import time
+import tracemalloc
+
+from netbox_netdev_inventory.vendors.cisco import NXOSParser
+
+
+VLANS = range(2, 4002)
+PORTS = "Ethernet1/1-48,Ethernet2/1-48,port-channel1-4"
+
+
+class ReplayDevice():
+    """
+    Device replying the full VLAN table to `show vlan brief`
+    """
+
+    hostname = "full-vlan-table"
+
+    def __init__(self):
+        self.output = json.dumps({
+            "TABLE_vlanbriefxbrief": {
+                "ROW_vlanbriefxbrief": [
+                    {
+                        "vlanshowbr-vlanid": str(vid),
+                        "vlanshowbr-vlanname": "VLAN{:04}".format(vid),
+                        "vlanshowplist-ifidx": PORTS,
+                    }
+                    for vid in VLANS
+                ]
+            }
+        })
+
+    def cli(self, commands):
+        return {cmd: self.output for cmd in commands}
+
+
+def parse_ports(vlan_s):
+    """
+    Port ranges expansion as done before, for each VLAN
+    """
+    vlans = []
+    find_regexp = r"^([A-Za-z\/-]+|.*\/)(\d+)-(\d+)$"
+    for vls in vlan_s.split(","):
+        find = re.findall(find_regexp, vls.strip())
+        if find:
+            for i in range(int(find[0][1]), int(find[0][2]) + 1):
+                vlans.append(find[0][0] + str(i))
+        else:
+            vlans.append(vls.strip())
+    return vlans
+
+
+def old_get_vlans(parser):
+    """
+    VLANs as yielded before, the port ranges expanded for each VLAN
+    """
+    vlans = parser._correct_and_convert_to_dict(
+        parser._cli("show vlan brief | json")
+    )["TABLE_vlanbriefxbrief"]["ROW_vlanbriefxbrief"]
+
+    for v in vlans:
+        yield v["vlanshowbr-vlanid"], {
+            "name": v["vlanshowbr-vlanname"],
+            "interfaces": parse_ports(v["vlanshowplist-ifidx"])
+        }
+
+
+def old_vlans_by_interface(parser):
+    parser.get_vlans = lambda: old_get_vlans(parser)
+    return parser._fetch_vlans_by_interface()
+
+
+def memoized_vlans_by_interface(parser):
+    return parser._fetch_vlans_by_interface()
+
+
+def measure(name, build):
+    start = time.perf_counter()
+    index = build(NXOSParser(ReplayDevice()))
+    duration = time.perf_counter() - start
+
+    tracemalloc.start()
+    index = build(NXOSParser(ReplayDevice()))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print("{}: {} interfaces indexed in {:.0f}ms, {:.1f}MB held".format(
+        name, len(index), duration * 1000, size / 1024 / 1024
+    ))
+    return index
+
+
+def main():
+    old = measure("expanded per VLAN", old_vlans_by_interface)
+    new = measure("expanded per list of ranges", memoized_vlans_by_interface)
+    assert old == new
+
+
+if __name__ == "__main__":
+    main()
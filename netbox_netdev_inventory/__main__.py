@@ -1,25 +1,47 @@
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
 import getpass
 import json
 import logging
+import os
 import socket
 import sys
+import time
+import appdirs
 import argparse
-from netboxapi import NetboxAPI
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
 from . import __appname__, __version__
+from netbox_netdev_inventory.cache import ChoicesRegistry, SiteVlansIndex
 from netbox_netdev_inventory.config import get_config, load_config
 from netbox_netdev_inventory.devices_list import parse_devices_yaml_def
-from netbox_netdev_inventory.devices_list import parse_filter_yaml_def
+from netbox_netdev_inventory.devices_list import (
+    FilterDevicesSource, parse_filter_yaml_def
+)
+from netbox_netdev_inventory.engine import (
+    async_poll_and_push, PipelineStats, poll_device, poll_neighbours,
+    threaded_poll_and_push
+)
+from netbox_netdev_inventory.netbox import get_netbox_api
 from netbox_netdev_inventory.push import (
     NetboxDevicePropsPusher, NetboxInterconnectionsPusher
 )
+from netbox_netdev_inventory.snapshots import PollsCache
+from netbox_netdev_inventory.state import (
+    DevicesState, IncrementalPolling, RunJournal
+)
+from netbox_netdev_inventory.writer import format_change
 
 
 logger = logging.getLogger("netbox_importer")
 
+DEFAULT_STATE_FILE = os.path.join(
+    appdirs.user_cache_dir(__appname__), "state.sqlite"
+)
+DEFAULT_JOURNAL_FILE = os.path.join(
+    appdirs.user_cache_dir(__appname__), "journal.sqlite"
+)
+
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -31,6 +53,11 @@ def parse_args():
         "import", aliases=["imp"], help=("import devices data")
     )
     sp_import.set_defaults(func=import_data)
+    sp_import.add_argument(
+        "--dry-run",
+        help="only print the changes that would be pushed to netbox",
+        dest="dry_run", action="store_true"
+    )
 
     sp_interconnect = subcommands.add_parser(
         "interconnect", aliases=["interco"], help=("interconnect devices")
@@ -43,6 +70,36 @@ def parse_args():
     )
     sp_inventory.set_defaults(func=inventory)
 
+    for sp in (sp_import, sp_inventory):
+        sp.add_argument(
+            "-b", "--batch-size", metavar="BATCH_SIZE",
+            help="number of objects sent in one bulk request to netbox",
+            dest="batch_size", default=100, type=int
+        )
+        sp.add_argument(
+            "--engine", choices=("threads", "async"),
+            help="poll devices in threads, or as coroutines",
+            dest="engine", default="threads"
+        )
+        sp.add_argument(
+            "--netbox-concurrency", metavar="NETBOX_CONCURRENCY",
+            help="number of devices pushed to netbox at the same time",
+            dest="netbox_concurrency", default=10, type=int
+        )
+        sp.add_argument(
+            "--queue-size", metavar="QUEUE_SIZE",
+            help=(
+                "number of polled devices waiting to be pushed before "
+                "pausing the polling"
+            ),
+            dest="queue_size", type=int
+        )
+        sp.add_argument(
+            "--incremental",
+            help="skip the devices that did not change since the last import",
+            dest="incremental", action="store_true"
+        )
+
     for sp in (sp_import, sp_interconnect, sp_inventory):
         sp.add_argument(
             "-f", "--file", metavar="DEVICES",
@@ -79,6 +136,34 @@ def parse_args():
             help="overwrite data already pushed",
             dest="overwrite", action="store_true"
         )
+        sp.add_argument(
+            "--from-cache",
+            help=(
+                "push the data of the last poll kept in cache, without "
+                "connecting to the devices"
+            ),
+            dest="from_cache", action="store_true"
+        )
+        sp.add_argument(
+            "--run-id", metavar="RUN_ID",
+            help="ID of the run in the journal, generated by default",
+            dest="run_id", type=str
+        )
+        sp.add_argument(
+            "--resume",
+            help="skip the devices already done by the run RUN_ID",
+            dest="resume", action="store_true"
+        )
+        sp.add_argument(
+            "--shard", metavar="N/M",
+            help="only handle the Nth of M shards of the devices",
+            dest="shard", type=_parse_shard
+        )
+        sp.add_argument(
+            "--processes", metavar="PROCESSES",
+            help="split the devices in shards run by parallel processes",
+            dest="processes", default=1, type=int
+        )
         sp.add_argument(
             "-v", "--verbose", metavar="LEVEL",
             help="enable debug or warning, verbose output",
@@ -98,44 +183,226 @@ def parse_args():
             load_config()
         except FileNotFoundError:
             sys.exit(2)
-
-        if args.verbose:
-            numeric_level = getattr(logging, args.verbose.upper(), None)
-            if not isinstance(numeric_level, int):
-                raise ValueError('Invalid log level: %s' % args.verbose)
-            logging.getLogger().setLevel(numeric_level)
+        _set_log_level(args.verbose)
 
         args.creds = _get_creds(args)
-        print("Initializing importers…")
-        if args.devices:
-            args.importers = parse_devices_yaml_def(
-                args.devices, args.creds
-            )
-        elif args.filter:
-            args.importers = parse_filter_yaml_def(
-                args.filter, args.creds
-            )
-        else:
+        if not (args.devices or args.filter):
             logger.error("Device file or filter file required")
             sys.exit(3)
 
-        args.func(parsed_args=args)
+        if args.resume and not args.run_id:
+            logger.error("--resume requires the --run-id of the run")
+            sys.exit(3)
+        args.run_id = args.run_id or time.strftime("%Y%m%d-%H%M%S")
+        print("Run ID: {}".format(args.run_id))
+
+        args.shards = [args.shard] if args.shard else []
+        if args.processes > 1:
+            _run_processes(args)
+        else:
+            _run(args)
     else:
         arg_parser.print_help()
         sys.exit(1)
 
+
+def _set_log_level(verbose):
+    if verbose:
+        numeric_level = getattr(logging, verbose.upper(), None)
+        if not isinstance(numeric_level, int):
+            raise ValueError('Invalid log level: %s' % verbose)
+        logging.getLogger().setLevel(numeric_level)
+
+
+def _parse_shard(shard):
+    try:
+        index, count = (int(i) for i in shard.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "shard must be N/M, not {}".format(shard)
+        )
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            "shard {} must be between 1 and {}".format(index, count)
+        )
+
+    return index, count
+
+
+def _run(parsed_args):
+    """
+    Run the subcommand on the devices of the shards in parsed_args
+
+    :returns summary: counters returned by the subcommand
+    """
+    # one connection per thread pushing to netbox: the pushers of the import,
+    # or the threads of the interconnect on the same session
+    get_netbox_api(pool_size=max(
+        parsed_args.threads, getattr(parsed_args, "netbox_concurrency", 0)
+    ))
+
+    print("Initializing importers…")
+    if parsed_args.devices:
+        parsed_args.importers = parse_devices_yaml_def(
+            parsed_args.devices, parsed_args.creds, shards=parsed_args.shards
+        )
+    else:
+        parsed_args.importers = parse_filter_yaml_def(
+            parsed_args.filter, parsed_args.creds, shards=parsed_args.shards
+        )
+
+    parsed_args.journal = RunJournal(
+        get_config().get("journal_file", DEFAULT_JOURNAL_FILE),
+        parsed_args.run_id, keep_runs=get_config().get("journal_keep_runs", 5)
+    )
+    parsed_args.polls_cache = _get_polls_cache()
+    try:
+        return parsed_args.func(parsed_args=parsed_args)
+    finally:
+        parsed_args.journal.close()
+        if parsed_args.polls_cache:
+            parsed_args.polls_cache.close()
+
+
+def _init_process(verbose):
+    """
+    Load the config and set the log level of a process running shards
+
+    Forked processes inherit them, but processes are spawned on Windows and
+    by default on macOS with python >= 3.8: they start without config.
+    """
+    load_config()
+    _set_log_level(verbose)
+
+
+def _run_shard(parsed_args, index):
+    # the initializer of ProcessPoolExecutor requires python 3.7: each shard
+    # initializes its process instead
+    _init_process(parsed_args.verbose)
+    parsed_args.shards = parsed_args.shards + [(index, parsed_args.processes)]
+    return _run(parsed_args)
+
+
+def _run_processes(parsed_args):
+    """
+    Split the devices in one shard per process, and merge their summaries
+
+    The processes do not rely on being forked: each one loads the config
+    before running its shard, whatever the start method.
+    """
+    summary = Counter()
+    errors_shard = 0
+    with ProcessPoolExecutor(max_workers=parsed_args.processes) as executor:
+        futures = [
+            executor.submit(_run_shard, parsed_args, index)
+            for index in range(1, parsed_args.processes + 1)
+        ]
+        for index, future in enumerate(futures, 1):
+            try:
+                summary.update(future.result() or {})
+            except Exception as e:
+                logger.error("Error when running shard %s: %s", index, e)
+                errors_shard += 1
+
+    print("Summary of {} process(es):".format(parsed_args.processes))
+    _print_summary(summary)
+    if errors_shard:
+        logger.error("%s shard(s) failed", errors_shard)
+
+
+def _print_summary(summary):
+    if "enumerated" in summary:
+        print("{} device(s) enumerated from netbox, {} skipped".format(
+            summary["enumerated"], summary["skipped"]
+        ))
+    if "devices" in summary:
+        print("{} device(s) pushed out of {}".format(
+            summary["pushed"], summary["devices"]
+        ))
+    if "unchanged" in summary:
+        print("{} device(s) unchanged since the last import".format(
+            summary["unchanged"]
+        ))
+    if "done" in summary:
+        print("{} interconnection(s) applied".format(summary["done"]))
+    if summary.get("errors_device"):
+        logger.error(
+            "Error getting neighbours on %s device(s)",
+            summary["errors_device"]
+        )
+    if summary.get("errors_interco"):
+        logger.error(
+            "Error pushing %s interconnection(s)", summary["errors_interco"]
+        )
+
 def inventory(parsed_args):
-    import_data(parsed_args)
-    interconnect(parsed_args)
+    summary = import_data(parsed_args)
+    summary.update(interconnect(parsed_args))
+    return summary
 
 def import_data(parsed_args):
+    dry_run = getattr(parsed_args, "dry_run", False)
     print("Fetching and pushing data…")
-    for host, props in _multithreaded_devices_polling(
-            importers=parsed_args.importers,
-            threads=parsed_args.threads,
-            overwrite=parsed_args.overwrite
-    ):
-        continue
+    journal = parsed_args.journal
+    devices = pushed = unchanged = 0
+    incremental = None
+    if parsed_args.incremental and not parsed_args.from_cache:
+        incremental = IncrementalPolling(DevicesState(
+            get_config().get("state_file", DEFAULT_STATE_FILE)
+        ))
+
+    importers = parsed_args.importers
+    if parsed_args.resume:
+        importers = journal.pending("import", importers)
+
+    try:
+        for host, result in _devices_polling(
+                importers=importers,
+                engine=parsed_args.engine,
+                threads=parsed_args.threads,
+                netbox_concurrency=parsed_args.netbox_concurrency,
+                queue_size=parsed_args.queue_size,
+                overwrite=parsed_args.overwrite,
+                dry_run=dry_run,
+                batch_size=parsed_args.batch_size,
+                incremental=incremental,
+                polls_cache=parsed_args.polls_cache,
+                from_cache=parsed_args.from_cache
+        ):
+            devices += 1
+            if isinstance(result, Exception):
+                logger.error("Error when polling device %s: %s", host, result)
+                continue
+            if not dry_run:
+                journal.mark_done("import", host)
+            if result is None:
+                unchanged += 1
+                continue
+
+            pushed += 1
+            if dry_run:
+                _print_changes(host, result.changes)
+    finally:
+        if incremental:
+            incremental.close()
+
+    summary = {"devices": devices, "pushed": pushed}
+    if incremental:
+        summary["unchanged"] = unchanged
+    if isinstance(parsed_args.importers, FilterDevicesSource):
+        summary["enumerated"] = parsed_args.importers.enumerated
+        summary["skipped"] = parsed_args.importers.skipped
+    _print_summary(summary)
+    return summary
+
+
+def _print_changes(host, changes):
+    if not changes:
+        tqdm.write("{}: no change".format(host))
+        return
+
+    for change in changes:
+        tqdm.write("{}: {}".format(host, format_change(change)))
 
 
 def _get_creds(parsed_args):
@@ -148,67 +415,152 @@ def _get_creds(parsed_args):
     return creds
 
 
-def _multithreaded_devices_polling(importers, threads=10, overwrite=False):
-    importers = importers.copy()
-    netbox_api = NetboxAPI(**get_config()["netbox"])
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = {}
-        for host, importer in importers.items():
-            future = executor.submit(
-                _poll_and_push, netbox_api, host, importer, overwrite
-            )
-
-            futures[future] = host
+def _devices_polling(importers, engine="threads", threads=10,
+                     netbox_concurrency=10, queue_size=None, overwrite=False,
+                     dry_run=False, batch_size=100, incremental=None,
+                     polls_cache=None, from_cache=False):
+    """
+    :param incremental: IncrementalPolling, to skip the devices that did not
+        change. They are then yielded with None as result.
+    :param polls_cache: PollsCache keeping the props of each polled device
+    :param from_cache: load the props from `polls_cache` instead of polling
+        the devices
+    """
+    netbox_api = get_netbox_api()
+    _register_choices(netbox_api)
+    vlans_index = SiteVlansIndex(
+        netbox_api, ttl=get_config().get("vlans_cache_ttl", 600)
+    )
+    stats = PipelineStats()
 
-        futures_with_progress = tqdm(
-            concurrent.futures.as_completed(futures),
-            total=len(futures)
-        )
-        for future in futures_with_progress:
-            host = futures[future]
+    def push(host, props):
+        if incremental:
             try:
-                yield host, future.result()
-                importers.pop(host)
-            except Exception as e:
-                logger.error("Error when polling device %s: %s", host, e)
-
-
-def _poll_and_push(netbox_api, host, importer, overwrite):
-    with importer:
-        props = importer.poll()
+                return push_incremental(host, props)
+            finally:
+                # tokens of devices failed or in dry run are not saved
+                incremental.discard(host)
+
+        return push_props(host, props)
+
+    def push_incremental(host, props):
+        if props is None:
+            return None
+        if incremental.is_unchanged(host, props):
+            if not dry_run:
+                incremental.save(host, props)
+            return None
+
+        pusher = push_props(host, props)
+        if not dry_run:
+            incremental.save(host, props)
+        return pusher
+
+    def push_props(host, props):
         pusher = NetboxDevicePropsPusher(
-            netbox_api, host, props, overwrite=overwrite
+            netbox_api, host, props, overwrite=overwrite, dry_run=dry_run,
+            batch_size=batch_size, vlans_index=vlans_index
         )
         pusher.push()
+        return pusher
+
+    poll = _cached_poll(
+        incremental.poll if incremental else poll_device, "props",
+        polls_cache, from_cache
+    )
+    if engine == "async":
+        results = async_poll_and_push(
+            importers, push, device_concurrency=threads,
+            netbox_concurrency=netbox_concurrency, queue_size=queue_size,
+            stats=stats, poll=poll
+        )
+    else:
+        results = threaded_poll_and_push(
+            importers, push, pollers=threads, pushers=netbox_concurrency,
+            queue_size=queue_size, stats=stats, poll=poll
+        )
 
-        return props
+    # the number of streamed devices is unknown
+    total = len(importers) if isinstance(importers, dict) else None
+    yield from tqdm(results, total=total)
+
+    stats.log()
+    vlans_index.log_stats()
+
+
+def _get_polls_cache():
+    """
+    :returns polls_cache: PollsCache in the directory from the config, or
+        None if not enabled
+    """
+    directory = get_config().get("polls_cache_dir")
+    if not directory:
+        return None
+
+    return PollsCache(directory, keep=get_config().get("polls_cache_keep", 3))
+
+
+def _cached_poll(poll, kind, polls_cache, from_cache=False):
+    """
+    Wrap `poll` to save what it returns in `polls_cache`, or to load it from
+    there if `from_cache` is set
+
+    :param poll: callable(device), polling `kind` on a device
+    :returns poll: callable(device)
+    """
+    if from_cache:
+        if polls_cache is None:
+            raise ValueError("polls_cache_dir is not set in the config")
+        return lambda device: polls_cache.load(device.hostname, kind)
+    if polls_cache is None:
+        return poll
+
+    def poll_and_save(device):
+        data = poll(device)
+        if data is not None:
+            polls_cache.save(device.hostname, kind, data)
+        return data
+
+    return poll_and_save
+
+
+def _register_choices(netbox_api):
+    """
+    Register the process-wide choices with the cache file from the config
+    """
+    ChoicesRegistry.get_registry(
+        netbox_api, app_name="dcim",
+        cache_path=get_config().get("choices_cache_file")
+    )
 
 
 def interconnect(parsed_args):
-    netbox_api = NetboxAPI(**get_config()["netbox"])
+    netbox_api = get_netbox_api()
+    _register_choices(netbox_api)
     remove_domains = get_config().get("remove_domains")
 
     interco_pusher = NetboxInterconnectionsPusher(
         netbox_api, remove_domains=remove_domains
     )
 
+    journal = parsed_args.journal
+    importers = parsed_args.importers
+    if parsed_args.resume:
+        importers = journal.pending("interconnect", importers)
+
     print("Finding neighbours and interconnecting…")
     interco_result = interco_pusher.push(
-        importers=parsed_args.importers,
+        importers=importers,
         threads=parsed_args.threads,
-        overwrite=parsed_args.overwrite
+        overwrite=parsed_args.overwrite,
+        get_neighbours=_cached_poll(
+            poll_neighbours, "neighbours", parsed_args.polls_cache,
+            parsed_args.from_cache
+        ),
+        on_device_done=lambda host: journal.mark_done("interconnect", host)
     )
-    print("{} interconnection(s) applied".format(interco_result["done"]))
-    if interco_result["errors_device"]:
-        logger.error(
-            "Error getting neighbours on %s device(s)",
-            interco_result["errors_device"]
-        )
-    if interco_result["errors_interco"]:
-        logger.error(
-            "Error pushing %s interconnection(s)",
-            interco_result["errors_interco"]
-        )
+    _print_summary(interco_result)
+    return interco_result
 
 
 if __name__ == "__main__":
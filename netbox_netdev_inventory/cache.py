@@ -0,0 +1,246 @@
+from collections import defaultdict
+import json
+import logging
+import os
+import threading
+import time
+
+from netboxapi import NetboxMapper
+
+
+logger = logging.getLogger("netbox_importer")
+
+
+class SiteVlansIndex():
+    """
+    Index of the VLANs of each site, shared between pushers and threads
+
+    All VLANs of a site are fetched at once, the first time the site is
+    requested, and kept `ttl` seconds.
+    """
+
+    def __init__(self, netbox_api, ttl=600):
+        self._mapper = NetboxMapper(netbox_api, app_name="ipam", model="vlans")
+        self.ttl = ttl
+
+        #: {site_id: (expiration_time, {vid: [vlan_id, …]})}
+        self._sites = {}
+        self._lock = threading.Lock()
+        #: one lock per site, to fetch a site only once without blocking
+        #: the lookups on other sites
+        self._sites_locks = defaultdict(threading.Lock)
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, site_id, vid):
+        """
+        :returns vlan_ids: ids of the VLANs using `vid` on the site
+        """
+        return self.get_site_vlans(site_id).get(int(vid), [])
+
+    def get_site_vlans(self, site_id):
+        """
+        :returns vlans: {vid: [vlan_id, …]} of all VLANs of the site
+        """
+        with self._lock:
+            site_lock = self._sites_locks[site_id]
+
+        with site_lock:
+            cached = self._sites.get(site_id)
+            if cached and cached[0] > time.monotonic():
+                self._count(hit=True)
+                return cached[1]
+
+            self._count(hit=False)
+            vlans = defaultdict(list)
+            for vlan in self._mapper.get(site_id=site_id):
+                vlans[int(vlan.vid)].append(vlan.id)
+            vlans = dict(vlans)
+
+            self._sites[site_id] = (time.monotonic() + self.ttl, vlans)
+            return vlans
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def invalidate(self, site_id=None):
+        """
+        Forget the VLANs of a site, or of all sites if site_id is None
+        """
+        with self._lock:
+            if site_id is None:
+                self._sites.clear()
+            else:
+                self._sites.pop(site_id, None)
+
+    def log_stats(self):
+        logger.info(
+            "VLANs index: %s hit(s), %s miss(es)", self.hits, self.misses
+        )
+
+
+class ChoicesRegistry():
+    """
+    Choices of a netbox app, loaded once per process and indexed by label
+
+    Use `get_registry()` to share the same registry between all pushers. If
+    `cache_path` is set, choices are also kept on disk, and reused as long as
+    the netbox API version does not change.
+    """
+    _registries = {}
+    _registries_lock = threading.Lock()
+
+    def __init__(self, netbox_api, app_name="dcim", cache_path=None):
+        self.netbox_api = netbox_api
+        self.app_name = app_name
+        self.cache_path = (
+            os.path.expanduser(cache_path) if cache_path else None
+        )
+
+        #: {choice_id: {label: value}}
+        self._index = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_registry(cls, netbox_api, app_name="dcim", cache_path=None):
+        """
+        Get the process-wide registry of a netbox app, create it if needed
+        """
+        key = (netbox_api.url, app_name)
+        with cls._registries_lock:
+            if key not in cls._registries:
+                cls._registries[key] = cls(
+                    netbox_api, app_name=app_name, cache_path=cache_path
+                )
+
+            return cls._registries[key]
+
+    @classmethod
+    def clear_registries(cls):
+        with cls._registries_lock:
+            cls._registries.clear()
+
+    def get_value(self, choice_id, label):
+        """
+        :param choice_id: choice field, as "interface:type"
+        :returns value: value of the choice matching `label`
+        """
+        try:
+            return self._get_index()[choice_id][label]
+        except KeyError:
+            raise KeyError("Label {} not in choices".format(label))
+
+    def _get_index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self._build_index(self._load_choices())
+
+            return self._index
+
+    def _build_index(self, choices):
+        index = {}
+        for choice_id, choice_values in choices.items():
+            index[choice_id] = {}
+            for choice in choice_values:
+                # keep the first value for a label, as a linear search would
+                index[choice_id].setdefault(choice["label"], choice["value"])
+
+        return index
+
+    def _load_choices(self):
+        if not self.cache_path:
+            return self._fetch_choices()
+
+        version = self._get_api_version()
+        try:
+            with open(self.cache_path) as cache_file:
+                cached = json.load(cache_file)
+            if cached["version"] == version and cached["app"] == self.app_name:
+                return cached["choices"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.debug("Cannot use choices cache %s: %s", self.cache_path, e)
+
+        choices = self._fetch_choices()
+        self._write_cache(version, choices)
+        return choices
+
+    def _fetch_choices(self):
+        logger.debug("Fetching %s choices", self.app_name)
+        return self.netbox_api.get("{}/_choices/".format(self.app_name))
+
+    def _get_api_version(self):
+        response = self.netbox_api._generic_http_method_request("get", "/")
+        return response.headers.get("API-Version")
+
+    def _write_cache(self, version, choices):
+        tmp_path = "{}.tmp".format(self.cache_path)
+        try:
+            os.makedirs(
+                os.path.dirname(os.path.abspath(self.cache_path)),
+                exist_ok=True
+            )
+            with open(tmp_path, "w") as cache_file:
+                json.dump({
+                    "version": version, "app": self.app_name,
+                    "choices": choices
+                }, cache_file)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(
+                "Cannot write choices cache %s: %s", self.cache_path, e
+            )
+
+
+class CommandsCache():
+    """
+    Results parsed from the commands sent to a device, kept until cleared
+
+    Meant to live as long as a connection to the device: nothing expires or
+    is evicted, as each parser only stores a few keys.
+    """
+
+    def __init__(self):
+        self._values = {}
+        #: keys fetched since the last clear, to count refetches
+        self._fetched = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.refetches = 0
+
+    def get_or_fetch(self, key, fetch):
+        """
+        :param fetch: callable returning the value of `key` if not cached
+        """
+        if key in self._values:
+            self.hits += 1
+            return self._values[key]
+
+        if key in self._fetched:
+            self.refetches += 1
+        else:
+            self.misses += 1
+        value = fetch()
+
+        self._values[key] = value
+        self._fetched.add(key)
+        return value
+
+    def invalidate(self, key):
+        self._values.pop(key, None)
+
+    def clear(self):
+        self._values.clear()
+        self._fetched.clear()
+        self.hits = self.misses = self.refetches = 0
+
+    def log_stats(self, hostname):
+        logger.debug(
+            "Commands cache of %s: %s hit(s), %s miss(es), %s refetch(es)",
+            hostname, self.hits, self.misses, self.refetches
+        )
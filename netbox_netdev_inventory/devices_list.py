@@ -8,74 +8,187 @@ import sys
 
 from netbox_netdev_inventory.importer import DeviceImporter
 
-from netboxapi import NetboxAPI
-from netbox_netdev_inventory.config import get_config
+from netbox_netdev_inventory.netbox import get_netbox_api
+from netbox_netdev_inventory.tools import in_shard
 
 logger = logging.getLogger("netbox_importer")
 
 
-def parse_devices_yaml_def(devices_yaml, creds=None):
+class DeviceSpec():
+    """
+    Definition of a device to poll
+
+    The DeviceImporter, with its napalm driver and parser, is only built
+    when a worker handles the device, and can be freed once it is done.
+    """
+    __slots__ = (
+        "hostname", "target", "driver", "optional_args", "creds",
+        "discovery_protocol", "neighbours_policy"
+    )
+
+    def __init__(self, hostname, driver, target=None, optional_args=None,
+                 creds=None, discovery_protocol=None, neighbours_policy=None):
+        self.hostname = hostname
+        self.target = target or hostname
+        self.driver = driver
+        self.optional_args = optional_args
+        self.creds = creds
+        self.discovery_protocol = discovery_protocol
+        self.neighbours_policy = neighbours_policy
+
+    def build_importer(self):
+        return DeviceImporter(
+            self.target, napalm_driver_name=self.driver,
+            napalm_optional_args=self.optional_args, creds=self.creds,
+            discovery_protocol=self.discovery_protocol,
+            neighbours_policy=self.neighbours_policy
+        )
+
+
+def parse_devices_yaml_def(devices_yaml, creds=None, shards=None):
     devices = {}
     with open(devices_yaml) as devices_yaml_str:
         for hostname, props in tqdm(yaml.safe_load(devices_yaml_str).items()):
+            if not in_shard(hostname, shards):
+                continue
+
             try:
-                devices[hostname] = DeviceImporter(
-                    props.get("target") or hostname,
-                    napalm_driver_name=props["driver"],
-                    napalm_optional_args=props.get("optional_args"),
-                    creds=creds,
-                    discovery_protocol=props.get("discovery_protocol")
+                devices[hostname] = DeviceSpec(
+                    hostname, props["driver"], target=props.get("target"),
+                    optional_args=props.get("optional_args"), creds=creds,
+                    discovery_protocol=props.get("discovery_protocol"),
+                    neighbours_policy=props.get("neighbours_policy")
                 )
             except Exception as e:
                 logger.error(
-                    "Cannot connect to device %s: %s", hostname, e
+                    "Cannot parse the definition of device %s: %s",
+                    hostname, e
                 )
     return devices
 
 
-def parse_filter_yaml_def(filter_yaml, creds=None):
-    netbox_api = NetboxAPI(**get_config()["netbox"])
-    devices = {}
+def parse_filter_yaml_def(filter_yaml, creds=None, shards=None):
     with open(filter_yaml) as filter_yaml_str:
         yml = yaml.safe_load(filter_yaml_str)
-        platforms_js = netbox_api.get("dcim/platforms")
-        platforms = {}
-        for platform in platforms_js["results"]:
-            if platform["napalm_driver"]:
-                platforms[platform["id"]] = {
-                    "napalm_driver": platform["napalm_driver"],
-                    "napalm_args":   platform["napalm_args"]
-                }
-        if not platforms:
-            raise Exception("Not for one platform napalm_driver is not "
-                            "defined")
-
-        devlist = netbox_api.get("dcim/devices/", params=yml["filter"].items())
-        for device in devlist["results"]:
-            if not device.get("platform") or \
-                    not platforms.get(device["platform"]["id"]):
+
+    return FilterDevicesSource(
+        yml["filter"], discovery_protocols=yml.get("discovery_protocol"),
+        neighbours_policies=yml.get("neighbours_policy"), creds=creds,
+        shards=shards
+    )
+
+
+class FilterDevicesSource():
+    """
+    Devices matching a netbox filter, streamed page by page
+
+    Behaves as a {hostname: DeviceSpec} dict through `items()`, which yields
+    each device as soon as its page is fetched. Devices are fetched again
+    each time `items()` is called.
+    """
+
+    def __init__(self, devices_filter, discovery_protocols=None, creds=None,
+                 shards=None, page_size=100, neighbours_policies=None):
+        self.devices_filter = devices_filter or {}
+        self.discovery_protocols = discovery_protocols or {}
+        self.neighbours_policies = neighbours_policies or {}
+        self.creds = creds
+        self.shards = shards
+        self.page_size = page_size
+
+        #: devices of the shards found by the last enumeration
+        self.enumerated = 0
+        #: devices of the shards without a napalm driver or not parsable
+        self.skipped = 0
+        self._platforms = None
+
+    def items(self):
+        self.enumerated = self.skipped = 0
+        platforms = self._get_platforms()
+        for device in _iter_results(
+                get_netbox_api(), "dcim/devices/",
+                params=list(self.devices_filter.items()),
+                page_size=self.page_size
+        ):
+            if not in_shard(device["name"], self.shards):
                 continue
 
+            self.enumerated += 1
             try:
-                if device["primary_ip"].get("address"):
-                    dev = device["primary_ip"].get("address").split("/")[0]
+                platform = platforms[device["platform"]["id"]]
+            except (KeyError, TypeError):
+                self.skipped += 1
+                continue
+
+            try:
+                primary_ip = device.get("primary_ip") or {}
+                if primary_ip.get("address"):
+                    dev = primary_ip["address"].split("/")[0]
                 else:
                     dev = device["name"]
-                devices[device["name"]] = DeviceImporter(
-                    dev,
-                    napalm_driver_name=platforms[
-                         device["platform"]["id"]
-                    ]["napalm_driver"],
-                    napalm_optional_args=platforms[
-                        device["platform"]["id"]
-                    ]["napalm_args"],
-                    creds=creds,
-                    discovery_protocol=yml["discovery_protocol"].get(
-                        platforms[device["platform"]["id"]]
+                spec = DeviceSpec(
+                    device["name"], platform["napalm_driver"], target=dev,
+                    optional_args=platform["napalm_args"], creds=self.creds,
+                    discovery_protocol=self.discovery_protocols.get(
+                        platform["napalm_driver"]
+                    ),
+                    neighbours_policy=self.neighbours_policies.get(
+                        platform["napalm_driver"]
                     )
                 )
             except Exception as e:
                 logger.error(
-                    "Cannot connect to device %s: %s", device["name"], e
+                    "Cannot parse the definition of device %s: %s",
+                    device["name"], e
                 )
-    return devices
+                self.skipped += 1
+                continue
+
+            yield device["name"], spec
+
+        logger.info(
+            "%s device(s) enumerated from netbox, %s skipped",
+            self.enumerated, self.skipped
+        )
+
+    def _get_platforms(self):
+        """
+        Fetch once the platforms having a napalm driver
+        """
+        if self._platforms is None:
+            self._platforms = {
+                platform["id"]: {
+                    "napalm_driver": platform["napalm_driver"],
+                    "napalm_args": platform["napalm_args"]
+                }
+                for platform in _iter_results(
+                    get_netbox_api(), "dcim/platforms/",
+                    page_size=self.page_size
+                )
+                if platform["napalm_driver"]
+            }
+            if not self._platforms:
+                raise Exception("Not for one platform napalm_driver is not "
+                                "defined")
+
+        return self._platforms
+
+
+def _iter_results(netbox_api, route, params=None, page_size=100):
+    """
+    Iterate lazily over all pages of a netbox listing
+
+    The offset follows the number of results received, in case netbox
+    caps the page size.
+    """
+    params = list(params or [])
+    offset = 0
+    while True:
+        page = netbox_api.get(route, params=params + [
+            ("limit", page_size), ("offset", offset)
+        ])
+        yield from page["results"]
+
+        if not page.get("next") or not page["results"]:
+            return
+        offset += len(page["results"])
@@ -0,0 +1,280 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import queue
+import threading
+import time
+
+
+logger = logging.getLogger("netbox_importer")
+
+
+class PipelineStats():
+    """
+    Latency of each stage of the polling, and depth of the queue of devices
+    waiting to be pushed
+    """
+
+    def __init__(self):
+        #: {stage: [durations in seconds]}
+        self.latencies = {}
+        self.max_queue_depth = 0
+        self._lock = threading.Lock()
+
+    def record(self, stage, duration):
+        with self._lock:
+            self.latencies.setdefault(stage, []).append(duration)
+
+    def record_queue_depth(self, depth):
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def log(self):
+        for stage, durations in sorted(self.latencies.items()):
+            logger.info(
+                "Stage %s: %s device(s), %.2fs average, %.2fs max", stage,
+                len(durations), sum(durations) / len(durations),
+                max(durations)
+            )
+        logger.info(
+            "%s device(s) at most waiting to be pushed", self.max_queue_depth
+        )
+
+
+def threaded_poll_and_push(importers, push, pollers=10, pushers=10,
+                           queue_size=None, stats=None, poll=None):
+    """
+    Poll devices and push their props to netbox in a two stages pipeline
+
+    Poller threads disconnect each device as soon as it is polled, and put
+    its props in a queue drained by pusher threads. When the queue is full,
+    pollers wait before connecting to the next device.
+
+    :param importers: {host: DeviceSpec}, or any object streaming them with
+        `items()`
+    :param push: callable(host, props), pushing the props of a device
+    :param queue_size: maximum number of polled devices waiting to be
+        pushed, twice the number of pushers by default
+    :param stats: PipelineStats to fill
+    :param poll: callable(device) returning the props of a device, polling
+        it through its importer by default
+    :returns: generator of (host, result) as devices are done, where result
+        is what `push` returned, or the exception raised while polling or
+        pushing the device
+    """
+    stats = stats or PipelineStats()
+    poll = poll or poll_device
+    props_queue = queue.Queue(maxsize=queue_size or 2 * pushers)
+    results = queue.Queue()
+    stopped = threading.Event()
+
+    def poll_one(host, device):
+        if stopped.is_set():
+            return
+
+        start = time.monotonic()
+        try:
+            props = poll(device)
+        except Exception as e:
+            results.put((host, e))
+            return
+        finally:
+            stats.record("poll", time.monotonic() - start)
+
+        props_queue.put((host, props, time.monotonic()))
+        stats.record_queue_depth(props_queue.qsize())
+
+    def consume():
+        while True:
+            item = props_queue.get()
+            if item is None:
+                return
+
+            host, props, queued_at = item
+            if stopped.is_set():
+                continue
+
+            start = time.monotonic()
+            stats.record("queue", start - queued_at)
+            try:
+                result = push(host, props)
+            except Exception as e:
+                result = e
+            stats.record("push", time.monotonic() - start)
+            results.put((host, result))
+
+    poll_executor = ThreadPoolExecutor(max_workers=pollers)
+    push_executor = ThreadPoolExecutor(max_workers=pushers)
+    try:
+        for _ in range(pushers):
+            push_executor.submit(consume)
+        # devices can be streamed: each one is polled as soon as it arrives
+        submitted = 0
+        for host, device in importers.items():
+            poll_executor.submit(poll_one, host, device)
+            submitted += 1
+
+        for _ in range(submitted):
+            yield results.get()
+    finally:
+        stopped.set()
+        # pushers keep draining the queue until pollers are done
+        poll_executor.shutdown()
+        for _ in range(pushers):
+            props_queue.put(None)
+        push_executor.shutdown()
+
+
+def async_poll_and_push(importers, push, device_concurrency=10,
+                        netbox_concurrency=10, queue_size=None, stats=None,
+                        poll=None):
+    """
+    Poll devices and push their props to netbox as coroutines
+
+    Blocking napalm and netbox calls are run in two separate executors, so
+    the number of devices connected at the same time and the number of
+    pushes sent to netbox are limited independently. A device is
+    disconnected before its props are pushed, freeing its slot for the next
+    device.
+
+    As with the threads engine, a device is only read from `importers` when
+    a polling slot is free, and a polled device waits for room among the
+    devices waiting to be pushed before freeing its polling slot.
+
+    :param importers: {host: DeviceSpec}, or any object streaming them with
+        `items()`, which are then read in a separate thread
+    :param push: callable(host, props), pushing the props of a device
+    :param queue_size: maximum number of polled devices waiting to be
+        pushed, twice `netbox_concurrency` by default
+    :param stats: PipelineStats to fill
+    :param poll: callable(device) returning the props of a device, polling
+        it through its importer by default
+    :returns: generator of (host, result) as devices are done, where result
+        is what `push` returned, or the exception raised while polling or
+        pushing the device
+    """
+    stats = stats or PipelineStats()
+    poll = poll or poll_device
+    loop = asyncio.new_event_loop()
+    device_executor = ThreadPoolExecutor(max_workers=device_concurrency)
+    netbox_executor = ThreadPoolExecutor(max_workers=netbox_concurrency)
+    feed_executor = ThreadPoolExecutor(max_workers=1)
+    tasks = set()
+    feeding = None
+    try:
+        asyncio.set_event_loop(loop)
+        done = asyncio.Queue()
+        polling = asyncio.Semaphore(device_concurrency)
+        queued = asyncio.Semaphore(queue_size or 2 * netbox_concurrency)
+        pushing = asyncio.Semaphore(netbox_concurrency)
+        #: polled devices waiting for a netbox slot
+        waiting = []
+
+        def timed_push(host, props, queued_at):
+            start = time.monotonic()
+            stats.record("queue", start - queued_at)
+            try:
+                return push(host, props)
+            finally:
+                stats.record("push", time.monotonic() - start)
+
+        async def poll_and_push(host, device):
+            try:
+                start = time.monotonic()
+                try:
+                    props = await loop.run_in_executor(
+                        device_executor, poll, device
+                    )
+                except Exception as e:
+                    done.put_nowait((host, e))
+                    return
+                finally:
+                    stats.record("poll", time.monotonic() - start)
+
+                # as a poller thread waiting for room in the queue
+                await queued.acquire()
+            finally:
+                polling.release()
+
+            queued_at = time.monotonic()
+            waiting.append(host)
+            stats.record_queue_depth(len(waiting))
+            try:
+                async with pushing:
+                    waiting.remove(host)
+                    queued.release()
+                    result = await loop.run_in_executor(
+                        netbox_executor, timed_push, host, props, queued_at
+                    )
+            except Exception as e:
+                result = e
+            done.put_nowait((host, result))
+
+        async def feed():
+            devices = iter(importers.items())
+            fed = 0
+            try:
+                while True:
+                    await polling.acquire()
+                    item = await loop.run_in_executor(
+                        feed_executor, next, devices, None
+                    )
+                    if item is None:
+                        break
+
+                    task = loop.create_task(poll_and_push(*item))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    fed += 1
+            finally:
+                done.put_nowait((_FED, fed))
+
+        feeding = loop.create_task(feed())
+        fed = None
+        received = 0
+        while fed is None or received < fed:
+            host, result = loop.run_until_complete(done.get())
+            if host is _FED:
+                fed = result
+                continue
+
+            received += 1
+            yield host, result
+
+        # raise the errors met while reading the devices
+        feeding.result()
+    finally:
+        pending = [t for t in list(tasks) + [feeding] if t and not t.done()]
+        for t in pending:
+            t.cancel()
+        if pending:
+            loop.run_until_complete(
+                asyncio.gather(*pending, return_exceptions=True)
+            )
+        asyncio.set_event_loop(None)
+        loop.close()
+        device_executor.shutdown()
+        netbox_executor.shutdown()
+        feed_executor.shutdown()
+
+
+#: marks the end of the devices read by the async engine
+_FED = object()
+
+
+def poll_device(device):
+    """
+    :returns props: props of a device, polled through its importer
+    """
+    importer = device.build_importer()
+    with importer:
+        return importer.poll()
+
+
+def poll_neighbours(device):
+    """
+    :returns neighbours: list of the neighbours discovered by a device
+    """
+    importer = device.build_importer()
+    with importer:
+        return list(importer.get_neighbours())
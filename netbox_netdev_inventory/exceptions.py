@@ -67,3 +67,12 @@ class DeviceNotSupportedError(Exception):
     def __init__(self, hostname):
         super().__init__("Device {} not supported".format(hostname))
         self.hostname = hostname
+
+
+class PollNotCachedError(Exception):
+    def __init__(self, hostname, kind):
+        super().__init__(
+            "No {} of device {} in the polls cache".format(kind, hostname)
+        )
+        self.hostname = hostname
+        self.kind = kind
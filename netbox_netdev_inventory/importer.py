@@ -12,11 +12,15 @@ from netbox_netdev_inventory.tools import is_macaddr
 
 logger = logging.getLogger("netbox_importer")
 
+#: ways to merge CDP and LLDP neighbours with the "multiple" discovery
+NEIGHBOURS_POLICIES = ("prefer_cdp", "prefer_lldp", "union")
+
 
 class DeviceImporter(ContextDecorator):
 
     def __init__(self, hostname, napalm_driver_name, target=None, creds=None,
-                 napalm_optional_args=None, discovery_protocol='lldp'):
+                 napalm_optional_args=None, discovery_protocol='lldp',
+                 neighbours_policy=None):
         self.hostname = hostname
         if not creds:
             creds = (None, None)
@@ -31,6 +35,13 @@ class DeviceImporter(ContextDecorator):
             napalm_driver_name
         )
         self.discovery_protocol = discovery_protocol
+        self.neighbours_policy = neighbours_policy or "prefer_cdp"
+        if self.neighbours_policy not in NEIGHBOURS_POLICIES:
+            raise ValueError(
+                "Unknown neighbours policy {}, expected one of {}".format(
+                    self.neighbours_policy, ", ".join(NEIGHBOURS_POLICIES)
+                )
+            )
         self.napalm_driver_name = napalm_driver_name
 
     def _get_specific_device_parser(self, os):
@@ -56,12 +67,14 @@ class DeviceImporter(ContextDecorator):
         self.device.open()
 
     def close(self):
+        self.specific_parser.close()
         self.device.close()
 
     def poll(self):
         assert self.device.device
 
         props = {}
+        self.specific_parser.prefetch_commands()
 
         logging.debug("Trying to resolve the primaries IP")
         try:
@@ -83,6 +96,25 @@ class DeviceImporter(ContextDecorator):
 
         return props
 
+    def get_state_token(self):
+        """
+        Cheap pre-check of the device state, see
+        `_AbstractVendorParser.get_state_token()`
+
+        :return: state token, None if it cannot be fetched
+        """
+        assert self.device.device
+
+        try:
+            return self.specific_parser.get_state_token()
+        except NotImplementedError:
+            return None
+        except Exception as e:
+            logger.debug(
+                "Cannot get the state token of %s: %s", self.hostname, e
+            )
+            return None
+
     def resolve_primary_ip(self):
         """
         Resolve primary IPs from hostname
@@ -205,7 +237,7 @@ class DeviceImporter(ContextDecorator):
                     navive = None
                 if navive in data["tagged_vlans"]:
                     interfaces[ifname]["untagged_vlan"] = navive
-                    interfaces[ifname]["tagged_vlans"].pop(navive)
+                    interfaces[ifname]["tagged_vlans"].remove(navive)
 
         for trunk in trunks:
             if trunk in interfaces:
@@ -299,13 +331,67 @@ class DeviceImporter(ContextDecorator):
             yield from self.get_lldp_neighbours()
 
     def get_multiple_neighbours(self):
-        neighbours = [n for n in self.get_cdp_neighbours()]
-        for n in self.get_lldp_neighbours():
-            if not any(self.specific_parser.get_abrev_if(elem['local_port']) \
-                       == self.specific_parser.get_abrev_if(n['local_port']) \
-                       for elem in neighbours):
+        """
+        Merge CDP and LLDP neighbours by local port, following the
+        neighbours policy:
+
+            - prefer_cdp: LLDP neighbours only on ports without CDP neighbour
+            - prefer_lldp: CDP neighbours only on ports without LLDP neighbour
+            - union: neighbours of both protocols. A device seen by both on
+              the same port, compared by hostname without domain, is only
+              kept once, from CDP, with the chassis ID seen by LLDP.
+
+        Local ports are normalized once per neighbour.
+        """
+        abrev_if = self.specific_parser.get_abrev_if
+        cdp_neighbours = [
+            (abrev_if(n["local_port"]), n) for n in self.get_cdp_neighbours()
+        ]
+        lldp_neighbours = [
+            (abrev_if(n["local_port"]), n) for n in self.get_lldp_neighbours()
+        ]
+
+        if self.neighbours_policy == "union":
+            yield from self._merge_neighbours_union(
+                cdp_neighbours, lldp_neighbours
+            )
+            return
+
+        if self.neighbours_policy == "prefer_lldp":
+            preferred, others = lldp_neighbours, cdp_neighbours
+        else:
+            preferred, others = cdp_neighbours, lldp_neighbours
+
+        preferred_ports = {port for port, _ in preferred}
+        for port, n in others:
+            if port not in preferred_ports:
                 yield n
-        for n in neighbours:
+        for _, n in preferred:
+            yield n
+
+    @staticmethod
+    def _merge_neighbours_union(cdp_neighbours, lldp_neighbours):
+        """
+        :param cdp_neighbours: [(normalized local port, neighbour), …]
+        :param lldp_neighbours: [(normalized local port, neighbour), …]
+        """
+        def key(port, neighbour):
+            hostname = neighbour.get("hostname") or ""
+            return port, hostname.split(".")[0].lower()
+
+        cdp_keys = {key(port, n) for port, n in cdp_neighbours}
+        chassis_ids = {}
+        for port, n in lldp_neighbours:
+            n_key = key(port, n)
+            if n_key not in cdp_keys:
+                yield n
+            elif n.get("chassis_id"):
+                chassis_ids[n_key] = n["chassis_id"]
+
+        for port, n in cdp_neighbours:
+            n_key = key(port, n)
+            if n_key in chassis_ids and "chassis_id" not in n:
+                n = dict(n, chassis_id=chassis_ids[n_key])
             yield n
 
     def get_cdp_neighbours(self):
@@ -0,0 +1,90 @@
+import logging
+
+from netboxapi import NetboxAPI
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from netbox_netdev_inventory.config import get_config
+
+
+logger = logging.getLogger("netbox_importer")
+
+#: default values of the "http" section of the netbox config
+HTTP_DEFAULTS = {
+    "timeout": 30, "retries": 3, "backoff_factor": 0.5, "pool_size": 10
+}
+#: answers after which a request is sent again
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+#: POST is not retried, as netbox could have created the objects before
+#: failing
+RETRY_METHODS = ("HEAD", "GET", "PUT", "PATCH", "DELETE", "OPTIONS")
+
+
+class NetboxSession(requests.Session):
+    """
+    requests session using a timeout by default
+    """
+
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(*args, **kwargs)
+
+
+def build_session(timeout=30, retries=3, backoff_factor=0.5, pool_size=10):
+    """
+    Build a session keeping `pool_size` connections alive, and retrying with
+    an exponential backoff when netbox is overloaded or failing
+
+    Connections are kept alive and answers compressed with gzip by
+    requests itself.
+    """
+    session = NetboxSession(timeout=timeout)
+    retry_kwargs = dict(
+        total=retries, backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        # let netboxapi raise the usual HTTPError after the last retry
+        raise_on_status=False
+    )
+    try:
+        retry = Retry(allowed_methods=RETRY_METHODS, **retry_kwargs)
+    except TypeError:
+        # urllib3 < 1.26
+        retry = Retry(method_whitelist=RETRY_METHODS, **retry_kwargs)
+    adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
+
+
+def get_netbox_api(pool_size=None):
+    """
+    Get the netbox client shared by the whole process
+
+    It is built at the first call, from the "netbox" section of the config.
+    Its optional "http" sub-section tunes the HTTP session.
+
+    :param pool_size: number of connections to keep alive, which should match
+        the number of threads. Only used at the first call, and if the config
+        does not set it.
+    """
+    if getattr(get_netbox_api, "cache", None):
+        return get_netbox_api.cache
+
+    netbox_config = dict(get_config()["netbox"])
+    http_config = dict(HTTP_DEFAULTS)
+    if pool_size:
+        http_config["pool_size"] = pool_size
+    http_config.update(netbox_config.pop("http", None) or {})
+
+    netbox_api = NetboxAPI(**netbox_config)
+    netbox_api.session = build_session(**http_config)
+    logger.debug("Netbox HTTP session: %s", http_config)
+
+    get_netbox_api.cache = netbox_api
+    return netbox_api
@@ -3,13 +3,14 @@ from collections import defaultdict
 import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 import logging
-from requests.exceptions import HTTPError
 import threading
 
 import cachetools
 from netboxapi import NetboxMapper
 from tqdm import tqdm
 
+from netbox_netdev_inventory.cache import ChoicesRegistry, SiteVlansIndex
+from netbox_netdev_inventory.engine import poll_neighbours
 from netbox_netdev_inventory.vendors.cisco import CiscoParser
 from netbox_netdev_inventory.vendors.juniper import JuniperParser
 from netbox_netdev_inventory.exceptions import (
@@ -17,8 +18,9 @@ from netbox_netdev_inventory.exceptions import (
     NetIfPushingError
 )
 from netbox_netdev_inventory.tools import (
-    generic_netbox_error, is_macaddr, macaddr_to_int
+    NetboxRequestsCounter, generic_netbox_error, is_macaddr, macaddr_to_int
 )
+from netbox_netdev_inventory.writer import NetboxWriter
 
 
 logger = logging.getLogger("netbox_importer")
@@ -30,9 +32,7 @@ class _NetboxPusher(ABC):
         self.netbox_api = netbox_api
 
         self._mappers = {
-            "dcim_choices": NetboxMapper(
-                self.netbox_api, app_name="dcim", model="_choices"
-            ), "devices": NetboxMapper(
+            "devices": NetboxMapper(
                 self.netbox_api, app_name="dcim", model="devices"
             ), "interfaces": NetboxMapper(
                 self.netbox_api, app_name="dcim", model="interfaces"
@@ -44,38 +44,54 @@ class _NetboxPusher(ABC):
                 self.netbox_api, app_name="ipam", model="vlans"
             )
         }
-        self._choices_cache = {}
+        # shared by all pushers of the process
+        self._choices = {
+            "dcim_choices": ChoicesRegistry.get_registry(
+                self.netbox_api, app_name="dcim"
+            )
+        }
 
     @abstractmethod
     def push(self):
         pass
 
-    def search_value_in_choices(self, mapper_name, id, label):
-        if mapper_name not in self._choices_cache:
-            try:
-                mapper = self._mappers[mapper_name]
-                self._choices_cache[mapper_name] = next(mapper.get())
-            except StopIteration:
-                pass
-
-        for choice in self._choices_cache[mapper_name][id]:
-            if choice["label"] == label:
-                return choice["value"]
-
-        raise KeyError("Label {} not in choices".format(label))
+    def search_value_in_choices(self, choices_name, id, label):
+        return self._choices[choices_name].get_value(id, label)
 
 
 class NetboxDevicePropsPusher(_NetboxPusher):
     _device = None
 
     def __init__(self, netbox_api, hostname, props, *args, overwrite=False,
-                 **kwargs):
-        super().__init__(netbox_api, *args, **kwargs)
+                 dry_run=False, batch_size=100, vlans_index=None, **kwargs):
+        # count requests sent for this device only
+        super().__init__(NetboxRequestsCounter(netbox_api), *args, **kwargs)
 
         self.hostname = hostname
         self.props = props
         self.overwrite = overwrite
-        self.vlans_cache = cachetools.LRUCache(4096)
+        self._writer = NetboxWriter(
+            self.netbox_api, dry_run=dry_run, batch_size=batch_size
+        )
+        #: can be shared between pushers
+        self.vlans_index = vlans_index or SiteVlansIndex(self.netbox_api)
+        #: interfaces of the device in netbox, indexed by name
+        self._interfaces = {}
+        #: IP addresses attached to the device in netbox
+        self._ip_addresses = []
+        #: {address: netbox_obj}, completed by searches and creations
+        self._ip_by_address = {}
+
+    @property
+    def requests_count(self):
+        return self.netbox_api.requests_count
+
+    @property
+    def changes(self):
+        """
+        Writes done (or planned, in dry run mode) in netbox for this device
+        """
+        return self._writer.changes
 
     @generic_netbox_error
     def push(self):
@@ -86,200 +102,340 @@ class NetboxDevicePropsPusher(_NetboxPusher):
         except StopIteration:
             raise DeviceNotFoundError(self.hostname)
 
+        self._fetch_interfaces()
+        self._fetch_ip_addresses()
         if self.overwrite:
             self._clean_unmatched_interfaces()
         self._push_interfaces()
         self._push_main_data()
 
+        logger.debug(
+            "Device %s pushed with %s request(s) to netbox",
+            self.hostname, self.requests_count
+        )
+
+    def _fetch_interfaces(self):
+        """
+        Index all interfaces of the device already in netbox by their name
+
+        Interfaces are all fetched at once, as some of them could then be
+        deleted, messing with the offset used by the query to fetch the next
+        pool.
+        """
+        self._interfaces = {
+            netbox_if.name: netbox_if
+            for netbox_if in self._mappers["interfaces"].get(
+                device_id=self._device
+            )
+        }
+        return self._interfaces
+
     def _clean_unmatched_interfaces(self):
-        # Interfaces are all forced to be fetched, as some of them will them
-        # be deleting, messing with the offset used by the query to fetch the
-        # next pool.
-        pushed_interfaces = tuple(
-            self._mappers["interfaces"].get(device_id=self._device)
+        unmatched_interfaces = [
+            netbox_if for netbox_if in self._interfaces.values()
+            if netbox_if.name not in self.props["interfaces"]
+        ]
+
+        for netbox_if in unmatched_interfaces:
+            self._clean_attached_ip(netbox_if)
+            self._writer.delete("interfaces", netbox_if.name, netbox_if)
+            self._interfaces.pop(netbox_if.name)
+
+    def _fetch_ip_addresses(self):
+        """
+        Index all IP addresses attached to the interfaces of the device
+        """
+        self._ip_addresses = list(
+            self._mappers["ip"].get(device_id=self._device)
         )
+        self._ip_by_address = {}
+        for ip_netbox_obj in self._ip_addresses:
+            self._ip_by_address.setdefault(
+                ip_netbox_obj.address, ip_netbox_obj
+            )
 
-        for netbox_if in pushed_interfaces:
-            if netbox_if.name not in self.props["interfaces"]:
-                self._clean_attached_ip(netbox_if)
-                netbox_if.delete()
+        return self._ip_addresses
 
-    def _clean_attached_ip(self, netbox_if):
-        attached_addrs = self._mappers["ip"].get(interface_id=netbox_if)
-        for a in attached_addrs:
-            a.delete()
+    def _clean_attached_ip(self, netbox_if, kept_ids=()):
+        unmatched_addrs = [
+            a for a in self._ip_addresses
+            if a._interface_id == netbox_if.id and a.id not in kept_ids
+        ]
+        for a in unmatched_addrs:
+            self._writer.delete("ip-addresses", a.address, a)
+            self._ip_addresses.remove(a)
+            if self._ip_by_address.get(a.address) is a:
+                self._ip_by_address.pop(a.address)
 
     def _push_interfaces(self):
         interfaces_props = self.props["interfaces"]
         interfaces_lag = {}
-        interfaces = {}
+        creates = []
+        updates = []
 
         for if_name, if_prop in interfaces_props.items():
-            if_prop = if_prop.copy()
-            interface_query = self._mappers["interfaces"].get(
-                device_id=self._device, name=if_name
-            )
-            try:
-                interface = next(interface_query)
-            except StopIteration:
-                try:
-                    interface = self._mappers["interfaces"].post(
-                        device=self._device, name=if_name
-                    )
-                except HTTPError as e:
-                    raise NetIfPushingError(if_name, e)
+            if if_prop.get("lag"):
+                interfaces_lag[if_name] = if_prop["lag"]
 
-            interfaces[if_name] = interface
+            fields = self._get_interface_fields(if_prop)
+            interface = self._interfaces.get(if_name)
+            if interface is None:
+                fields.update(device=self._device.id, name=if_name)
+                creates.append((if_name, fields))
+            else:
+                updates.append((
+                    if_name, interface,
+                    self._diff_netbox_obj(interface, fields)
+                ))
+
+        mapper = self._mappers["interfaces"]
+        created = self._writer.bulk_create(
+            mapper, creates, NetIfPushingError
+        )
+        for (if_name, _), interface in zip(creates, created):
+            # in dry run, interfaces are not created
+            if interface is not None:
+                self._interfaces[if_name] = interface
+        self._writer.bulk_update(mapper, updates, NetIfPushingError)
 
-            if_type = if_prop.pop("type")
-            if_prop["form_factor"] = self.search_value_in_choices(
-                "dcim_choices", "interface:type",
-                if_type
+        self._push_interfaces_ip(interfaces_props)
+        self._update_interfaces_lag(self._interfaces, interfaces_lag)
+
+    def _get_interface_fields(self, if_prop):
+        """
+        Convert polled properties of an interface to netbox fields
+        """
+        fields = {
+            k: if_prop[k]
+            for k in ("enabled", "description", "mac_address", "mtu")
+        }
+        fields["form_factor"] = self.search_value_in_choices(
+            "dcim_choices", "interface:type", if_prop["type"]
+        )
+
+        # cannot really guess (yet) the interface mode, so only set it if
+        # overwrite
+        if not self.overwrite:
+            # netbox clears the VLANs of an interface without mode: they
+            # would be seen as changed, and sent again, on every run
+            return fields
+
+        fields["mode"] = None
+        if if_prop.get("mode"):
+            fields["mode"] = self.search_value_in_choices(
+                "dcim_choices", "interface:mode", if_prop["mode"]
             )
-            if if_prop.get("lag"):
-                interfaces_lag[if_name] = if_prop.pop("lag")
-
-            if not self.overwrite and "mode" in if_prop:
-                if_prop.pop("mode")
-            elif if_prop.get("mode"):
-                # cannot really guess (yet) the interface mode, so only set it
-                # if overwrite
-                self._handle_interface_mode(interface, if_prop["mode"])
-                if_prop.pop("mode")
-
-            if if_prop["untagged_vlan"]:
-                vlan_id = self._get_vlan_id(if_prop["untagged_vlan"])
+
+        if if_prop["untagged_vlan"]:
+            vlan_id = self._get_vlan_id(if_prop["untagged_vlan"])
+            if vlan_id != -1:
+                fields["untagged_vlan"] = vlan_id
+
+        if len(if_prop["tagged_vlans"]):
+            fields["tagged_vlans"] = []
+            for vlan in if_prop["tagged_vlans"]:
+                vlan_id = self._get_vlan_id(vlan)
                 if vlan_id != -1:
-                    setattr(interface, "untagged_vlan", vlan_id)
+                    fields["tagged_vlans"].append(vlan_id)
 
-            if_prop.pop("untagged_vlan")
-            if len(if_prop["tagged_vlans"]):
-                setattr(interface, "tagged_vlans", [])
-                for vlan in if_prop["tagged_vlans"]:
-                    vlan_id = self._get_vlan_id(vlan)
-                    if vlan_id != -1:
-                        interface.tagged_vlans.append(vlan_id)
-            if_prop.pop("tagged_vlans")
+        return fields
 
-            for k, v in if_prop.items():
-                setattr(interface, k, v)
+    def _diff_netbox_obj(self, netbox_obj, fields):
+        """
+        Only keep fields whose value differ from the netbox object
 
-            try:
-                interface.put()
-            except HTTPError as e:
-                raise NetIfPushingError(interface.name, e)
-            if if_prop.get("ip"):
-                addrs = self._attach_interface_to_ip_addresses(
-                    interface, *if_prop["ip"]
-                )
-                if self.overwrite:
-                    self._clean_unmatched_ip_addresses(interface, *addrs)
+        :returns changes: {field: new_value, …}
+        """
+        changes = {}
+        for k, v in fields.items():
+            current = self._get_netbox_obj_value(netbox_obj, k)
+            if k == "mac_address":
+                differ = macaddr_to_int(current) != macaddr_to_int(v)
+            elif isinstance(v, list):
+                differ = sorted(current or []) != sorted(v)
+            else:
+                differ = current != v
 
-        self._update_interfaces_lag(interfaces, interfaces_lag)
+            if differ:
+                changes[k] = v
 
-    def _get_vlan_id(self, vlan):
-        if not self.vlans_cache.get(self._device.site.id):
-            self.vlans_cache[self._device.site.id] = {}
+        return changes
 
-        if not self.vlans_cache[self._device.site.id].get(vlan):
-            vlans = list(self._mappers["vlan"].get(
-                    site_id=self._device.site.id,
-                    vid=vlan
-                )
+    def _get_netbox_obj_value(self, netbox_obj, attr):
+        """
+        Get the value of a netbox object attribute as it would be written
+
+        Foreign keys are returned as their id, choices as their value.
+        """
+        if attr in netbox_obj.__foreign_keys__:
+            return getattr(netbox_obj, "_{}_id".format(attr))
+
+        value = getattr(netbox_obj, attr, None)
+        if isinstance(value, dict):
+            return value.get("value", value.get("id"))
+        elif isinstance(value, list):
+            return [
+                v.get("id") if isinstance(v, dict) else getattr(v, "id", v)
+                for v in value
+            ]
+        else:
+            return getattr(value, "id", value)
+
+    def _get_vlan_id(self, vlan):
+        site_id = self._device._site_id
+        vlan_ids = self.vlans_index.get(site_id, vlan)
+        if len(vlan_ids) == 1:
+            return vlan_ids[0]
+
+        # Ignore vlan 1 because it is usually not used.
+        if not vlan_ids and int(vlan) != 1:
+            logger.info("Switch %s, vlan %s not faund on site %s",
+                        self.hostname, vlan, site_id)
+        elif vlan_ids:
+            logger.info(
+                "Number of found Vlans %s on the site %s is more than one",
+                vlan, site_id
             )
-            # Ignore vlan 1 because it is usually not used.
-            # But if he is assign.
-            if len(vlans) == 0 and vlan != 1:
-                logger.info("Switch %s, vlan %s not faund on site %s",
-                            self.hostname, vlan, self._device.site.name)
-                # If set to None, then if not None will always trigger.
-                # Searches will occur every time.
-                self.vlans_cache[self._device.site.id][vlan] = -1
-            elif len(vlans) == 1:
-                self.vlans_cache[self._device.site.id][vlan] = vlans[0].id
-            else:
-                logger.info(
-                    "Number of found Vlans %s on the site %s is more than one",
-                    vlan, self._device.site.name
-                )
-                self.vlans_cache[self._device.site.id][vlan] = -1
-        return self.vlans_cache[self._device.site.id][vlan]
+        return -1
 
+    def _push_interfaces_ip(self, interfaces_props):
+        """
+        Attach polled IP addresses to their interface
+
+        Addresses already attached to the device come from the index built by
+        `_fetch_ip_addresses()`, and the other ones are searched at once.
+        Addresses are then created or reattached with bulk requests for the
+        whole device.
+        """
+        polled_addrs = {}
+        for if_name, if_prop in interfaces_props.items():
+            netbox_if = self._interfaces.get(if_name)
+            if not if_prop.get("ip") or netbox_if is None:
+                # in dry run, nothing can be attached to an interface that
+                # does not exist
+                continue
 
-    def _handle_interface_mode(self, netbox_if, mode):
-        netbox_mode = self.search_value_in_choices(
-            "dcim_choices", "interface:mode",
-            mode
+            polled_addrs[if_name] = if_prop["ip"]
+
+        attached = {
+            (ip_netbox_obj.address, ip_netbox_obj._interface_id): ip_netbox_obj
+            for ip_netbox_obj in self._ip_addresses
+        }
+        self._find_ip_addresses(
+            ip for addrs in polled_addrs.values() for ip in addrs
         )
 
-        netbox_if.mode = netbox_mode
+        creates = []
+        updates = []
+        kept_ids = set()
+        for if_name, addrs in polled_addrs.items():
+            netbox_if = self._interfaces[if_name]
+            for ip in addrs:
+                ip_netbox_obj = attached.get((ip, netbox_if.id))
+                if ip_netbox_obj is None:
+                    ip_netbox_obj = self._ip_by_address.get(ip)
+                    if ip_netbox_obj is None:
+                        creates.append(
+                            (ip, {"address": ip, "interface": netbox_if.id})
+                        )
+                        continue
 
-    def _attach_interface_to_ip_addresses(self, netbox_if, *ip_addresses):
-        mapper = self._mappers["ip"]
+                    # XXX: handle anycast
+                    updates.append(
+                        (ip, ip_netbox_obj, {"interface": netbox_if.id})
+                    )
 
-        addresses = []
-        for ip in ip_addresses:
-            # check if ip attached isn't already correct
-            try:
-                ip_netbox_obj = next(mapper.get(q=ip, interface_id=netbox_if))
-            except StopIteration:
-                try:
-                    ip_netbox_obj = next(mapper.get(q=ip))
-                except StopIteration:
-                    try:
-                        ip_netbox_obj = mapper.post(address=ip)
-                    except HTTPError as e:
-                        raise IPPushingError(ip, e)
-
-                # XXX: handle anycast
-                ip_netbox_obj.interface = netbox_if
-                try:
-                    ip_netbox_obj.put()
-                except HTTPError as e:
-                    raise IPPushingError(ip_netbox_obj.address, e)
+                kept_ids.add(ip_netbox_obj.id)
 
-            addresses.append(ip_netbox_obj)
+        mapper = self._mappers["ip"]
+        created = self._writer.bulk_create(mapper, creates, IPPushingError)
+        for (ip, _), ip_netbox_obj in zip(creates, created):
+            if ip_netbox_obj is not None:
+                self._ip_by_address.setdefault(ip, ip_netbox_obj)
+        self._writer.bulk_update(mapper, updates, IPPushingError)
 
-        return addresses
+        if self.overwrite:
+            for if_name in polled_addrs:
+                self._clean_attached_ip(
+                    self._interfaces[if_name], kept_ids=kept_ids
+                )
 
-    def _clean_unmatched_ip_addresses(self, netbox_if, *netbox_ip):
-        attached_addrs = self._mappers["ip"].get(interface_id=netbox_if)
-        netbox_ip_ids = set(obj.id for obj in netbox_ip)
+    def _find_ip_addresses(self, addresses):
+        """
+        Search addresses missing from the index, by chunks of exact matches
 
-        for addr in attached_addrs:
-            if addr.id not in netbox_ip_ids:
-                addr.delete()
+        `q` is not used, as it is a substring search.
+        """
+        missing = sorted(set(
+            ip for ip in addresses if ip not in self._ip_by_address
+        ))
+        mapper = self._mappers["ip"]
+        for i in range(0, len(missing), self._writer.batch_size):
+            chunk = missing[i:i + self._writer.batch_size]
+            for ip_netbox_obj in mapper.get(address=chunk):
+                self._ip_by_address.setdefault(
+                    ip_netbox_obj.address, ip_netbox_obj
+                )
 
     def _update_interfaces_lag(self, interfaces, interfaces_lag):
         """
         :param interfaces: {interface_name: netbox_interface_obj, …}
         """
+        updates = []
         for if_name, lag in interfaces_lag.items():
-            interface = interfaces[if_name]
-            interface.lag = interfaces[lag]
-            try:
-                interface.put()
-            except HTTPError as e:
-                raise NetIfPushingError(interface.name, e)
+            dry_run_created = self._writer.dry_run and not (
+                if_name in interfaces and lag in interfaces
+            )
+            if dry_run_created:
+                # one of the interfaces would have been created
+                updates.append((if_name, None, {"lag": lag}))
+                continue
+
+            interface, lag_interface = interfaces[if_name], interfaces[lag]
+            updates.append((
+                if_name, interface,
+                self._diff_netbox_obj(interface, {"lag": lag_interface.id})
+            ))
+
+        self._writer.bulk_update(
+            self._mappers["interfaces"], updates, NetIfPushingError
+        )
 
     def _push_main_data(self):
-        mapper = self._mappers["ip"]
+        fields = {}
         if self.props.get("serial"):
-            self._device.serial = self.props["serial"]
+            fields["serial"] = self.props["serial"]
 
         for ip_key in ("primary_ip4", "primary_ip6"):
             ip = self.props.get(ip_key)
             if ip:
-                try:
-                    ip_netbox_obj = next(mapper.get(q=ip))
-                    setattr(self._device, ip_key, ip_netbox_obj)
-                except StopIteration:
+                ip_netbox_obj = self._get_primary_ip(ip)
+                if ip_netbox_obj is None:
                     logger.error(
                         "Cannot set primary IP %s as it does not exist in "
                         "netbox", ip
                     )
+                else:
+                    fields[ip_key] = ip_netbox_obj.id
 
-        self._device.put()
+        self._writer.update(
+            "devices", self.hostname, self._device,
+            **self._diff_netbox_obj(self._device, fields)
+        )
+
+    def _get_primary_ip(self, ip):
+        """
+        :param ip: address without prefix length, as resolved from the
+            hostname
+        """
+        for address, ip_netbox_obj in self._ip_by_address.items():
+            if address.split("/")[0] == ip:
+                return ip_netbox_obj
+
+        try:
+            return next(self._mappers["ip"].get(address=ip))
+        except StopIteration:
+            return None
 
 
 class NetboxInterconnectionsPusher(_NetboxPusher):
@@ -294,16 +450,25 @@ class NetboxInterconnectionsPusher(_NetboxPusher):
         self.interfaces_cache = cachetools.LRUCache(128)
         self._lock = threading.Lock()
 
-    def push(self, importers, threads=1, overwrite=False):
+    def push(self, importers, threads=1, overwrite=False,
+             get_neighbours=None, on_device_done=None):
+        """
+        :param importers: {host: DeviceSpec}, or any object streaming them
+            with `items()`
+        :param get_neighbours: callable(device) returning the neighbours of a
+            device, polling them by default
+        :param on_device_done: callable(host), called for each device whose
+            interconnections were all applied
+        """
         result = {"done": 0, "errors_interco": 0, "errors_device": 0}
 
-        importers = importers.copy()
         with ThreadPoolExecutor(max_workers=threads) as executor:
             futures = {}
             discovered = defaultdict(dict)
             for host, importer in importers.items():
                 future = executor.submit(
-                    self._handle_device, host, importer, discovered, overwrite
+                    self._handle_device, host, importer, discovered,
+                    overwrite, get_neighbours
                 )
                 futures[future] = host
 
@@ -317,6 +482,8 @@ class NetboxInterconnectionsPusher(_NetboxPusher):
                     task_result = future.result()
                     result["done"] += task_result["done"]
                     result["errors_interco"] += task_result["errors"]
+                    if on_device_done and not task_result["errors"]:
+                        on_device_done(host)
                 except ValueError:
                     logger.debug(
                         "LLDP parsing not supported on {}".format(host)
@@ -328,53 +495,52 @@ class NetboxInterconnectionsPusher(_NetboxPusher):
                         host, e
                     )
                     result["errors_device"] += 1
-                importers.pop(host)
 
         return result
 
-    def _handle_device(self, hostname, importer, discovered, overwrite):
+    def _handle_device(self, hostname, device, discovered, overwrite,
+                       get_neighbours=None):
         result = {"done": 0, "errors": 0}
-        with importer:
-            for interco in importer.get_neighbours():
-                already_discovered = (
-                    discovered[importer.hostname].get(
-                        interco["local_port"], None
-                    ) == (interco["hostname"], interco["port"])
+        for interco in (get_neighbours or poll_neighbours)(device):
+            already_discovered = (
+                discovered[device.target].get(
+                    interco["local_port"], None
+                ) == (interco["hostname"], interco["port"])
+            )
+            if already_discovered:
+                continue
+
+            try:
+                discovered[device.target][interco["local_port"]] = (
+                    interco["hostname"], interco["port"]
+                )
+                discovered[interco["hostname"]][interco["port"]] = (
+                    device.target, interco["local_port"]
                 )
-                if already_discovered:
-                    continue
 
                 try:
-                    discovered[importer.hostname][interco["local_port"]] = (
-                        interco["hostname"], interco["port"]
-                    )
-                    discovered[interco["hostname"]][interco["port"]] = (
-                        importer.hostname, interco["local_port"]
+                    netif_connection = self._interconnect_using_lldp_names(
+                        hostname, device, interco
                     )
+                except DeviceNotFoundError:
+                    if "chassis_id" not in interco:
+                        raise
 
-                    try:
-                        netif_connection = self._interconnect_using_lldp_names(
-                            hostname, importer, interco
-                        )
-                    except DeviceNotFoundError:
-                        if "chassis_id" not in interco:
-                            raise
-
-                        netif_connection = self._interconnect_using_lldp_id(
-                            hostname, importer, interco
-                        )
-
-                    self._update_discovered_from_netif_connection(
-                        discovered, netif_connection
+                    netif_connection = self._interconnect_using_lldp_id(
+                        hostname, device, interco
                     )
 
-                    result["done"] += 1
-                    logger.debug("True with interco %s:", interco)
-                except Exception as e:
-                    result["errors"] += 1
-                    logger.warning("Switch %s Error with interco %s: %s",
-                                   hostname, interco, e)
-                    continue
+                self._update_discovered_from_netif_connection(
+                    discovered, netif_connection
+                )
+
+                result["done"] += 1
+                logger.debug("True with interco %s:", interco)
+            except Exception as e:
+                result["errors"] += 1
+                logger.warning("Switch %s Error with interco %s: %s",
+                               hostname, interco, e)
+                continue
 
         if overwrite:
             self._clean_undetected_intercos(hostname, discovered)
@@ -382,7 +548,7 @@ class NetboxInterconnectionsPusher(_NetboxPusher):
         return result
 
     @generic_netbox_error
-    def _interconnect_using_lldp_names(self, hostname, importer, interco):
+    def _interconnect_using_lldp_names(self, hostname, device, interco):
         a = hostname
         netif_a = self._get_netif_or_derivative(a, interco["local_port"])
         b = interco["hostname"]
@@ -402,7 +568,7 @@ class NetboxInterconnectionsPusher(_NetboxPusher):
             return self.interconnect_netbox_netif(netif_a, netif_b)
 
     @generic_netbox_error
-    def _interconnect_using_lldp_id(self, hostname, importer, interco):
+    def _interconnect_using_lldp_id(self, hostname, device, interco):
         a = hostname
         netif_a = self._get_netif_or_derivative(a, interco["local_port"])
         netif_b = self._find_netbox_netif_from_lldp_id(
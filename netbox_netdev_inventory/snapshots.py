@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from netbox_netdev_inventory.exceptions import PollNotCachedError
+
+
+logger = logging.getLogger("netbox_importer")
+
+
+class PollsCache():
+    """
+    Snapshots of the data polled on each device, kept on disk to push them
+    again without connecting to the devices
+
+    Each snapshot is appended as a JSON line to a file per device, and
+    indexed by hostname, kind ("props" or "neighbours") and timestamp in
+    sqlite, to read the last one without parsing the whole file. Only the
+    last `keep` snapshots of each kind are kept: the file of a device is
+    compacted when older ones are dropped.
+    """
+
+    def __init__(self, directory, keep=3):
+        self.directory = os.path.expanduser(directory)
+        self.keep = max(keep, 1)
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(self.directory, "index.sqlite"), timeout=30,
+            check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "hostname TEXT, kind TEXT, timestamp REAL, path TEXT, "
+                "offset INTEGER)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS snapshots_lookup "
+                "ON snapshots (hostname, kind, timestamp)"
+            )
+
+    def save(self, hostname, kind, data):
+        """
+        Append a snapshot of `data` polled on `hostname`
+        """
+        timestamp = time.time()
+        line = json.dumps(
+            {"timestamp": timestamp, "kind": kind, "data": data},
+            default=str
+        ).encode() + b"\n"
+        path = self._get_path(hostname)
+
+        with self._lock:
+            with open(path, "ab") as snapshots_file:
+                offset = snapshots_file.seek(0, os.SEEK_END)
+                snapshots_file.write(line)
+
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO snapshots "
+                    "(hostname, kind, timestamp, path, offset) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (hostname, kind, timestamp, path, offset)
+                )
+                dropped = self._conn.execute(
+                    "DELETE FROM snapshots WHERE rowid IN ("
+                    "SELECT rowid FROM snapshots "
+                    "WHERE hostname = ? AND kind = ? "
+                    "ORDER BY timestamp DESC, rowid DESC LIMIT -1 OFFSET ?)",
+                    (hostname, kind, self.keep)
+                ).rowcount
+                if dropped:
+                    self._compact(path)
+
+    def load(self, hostname, kind, before=None):
+        """
+        :param before: timestamp, to load an older snapshot than the last one
+        :returns data: data of the last snapshot of `kind` for `hostname`
+        """
+        query = (
+            "SELECT path, offset FROM snapshots "
+            "WHERE hostname = ? AND kind = ?"
+        )
+        params = [hostname, kind]
+        if before is not None:
+            query += " AND timestamp <= ?"
+            params.append(before)
+        query += " ORDER BY timestamp DESC LIMIT 1"
+
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        if row is None:
+            raise PollNotCachedError(hostname, kind)
+
+        path, offset = row
+        try:
+            with open(path, "rb") as snapshots_file:
+                snapshots_file.seek(offset)
+                snapshot = json.loads(snapshots_file.readline().decode())
+        except (OSError, ValueError) as e:
+            logger.debug("Cannot read snapshot in %s: %s", path, e)
+            raise PollNotCachedError(hostname, kind)
+
+        logger.debug(
+            "Loaded %s of %s polled at %s", kind, hostname,
+            time.ctime(snapshot["timestamp"])
+        )
+        return snapshot["data"]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _compact(self, path):
+        """
+        Rewrite a snapshots file with only its indexed snapshots, in the
+        transaction updating their offsets
+        """
+        rows = self._conn.execute(
+            "SELECT rowid, offset FROM snapshots WHERE path = ? "
+            "ORDER BY offset", (path,)
+        ).fetchall()
+
+        tmp_path = "{}.tmp".format(path)
+        new_offsets = []
+        with open(path, "rb") as snapshots_file, \
+                open(tmp_path, "wb") as compacted_file:
+            for rowid, offset in rows:
+                snapshots_file.seek(offset)
+                new_offsets.append((compacted_file.tell(), rowid))
+                compacted_file.write(snapshots_file.readline())
+
+        self._conn.executemany(
+            "UPDATE snapshots SET offset = ? WHERE rowid = ?", new_offsets
+        )
+        os.replace(tmp_path, path)
+
+    def _get_path(self, hostname):
+        filename = re.sub(r"[^a-zA-Z0-9.-]+", "_", hostname)
+        return os.path.join(self.directory, "{}.jsonl".format(filename))
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+logger = logging.getLogger("netbox_importer")
+
+
+def fingerprint(props):
+    """
+    Hash of polled props, independent from the order of keys and lists
+    """
+    return hashlib.sha256(
+        json.dumps(_normalize(props), sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return sorted((_normalize(v) for v in value), key=json.dumps)
+
+    return value
+
+
+class DevicesState():
+    """
+    Fingerprints of the last successful import of each device, in sqlite
+
+    Can be shared between threads, and between processes through sqlite
+    locking.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS devices ("
+                "hostname TEXT PRIMARY KEY, props_hash TEXT, "
+                "state_token TEXT, updated_at REAL)"
+            )
+
+    def get(self, hostname):
+        """
+        :returns (props_hash, state_token): of the last import, None for each
+            if unknown
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT props_hash, state_token FROM devices "
+                "WHERE hostname = ?", (hostname,)
+            ).fetchone()
+
+        return row or (None, None)
+
+    def save(self, hostname, props_hash, state_token=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO devices "
+                "(hostname, props_hash, state_token, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (hostname, props_hash, state_token, time.time())
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class IncrementalPolling():
+    """
+    Skip the devices that did not change since their last import
+
+    A device is not polled if its state token, a cheap vendor pre-check
+    like the time of the last configuration change, did not change. A
+    polled device is not pushed if the fingerprint of its props did not
+    change.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        #: {hostname: state token read before the poll}
+        self._tokens = {}
+
+    def poll(self, device):
+        """
+        :returns props: polled props, or None if the state token of the
+            device did not change
+        """
+        importer = device.build_importer()
+        with importer:
+            token = importer.get_state_token()
+            if token is not None and token == self.state.get(
+                    device.hostname
+            )[1]:
+                logger.debug(
+                    "State of %s did not change, skipping", device.hostname
+                )
+                return None
+
+            props = importer.poll()
+
+        self._tokens[device.hostname] = token
+        return props
+
+    def is_unchanged(self, hostname, props):
+        return self.state.get(hostname)[0] == fingerprint(props)
+
+    def save(self, hostname, props):
+        """
+        Save the fingerprint of a device successfully imported
+        """
+        self.state.save(
+            hostname, fingerprint(props), self._tokens.pop(hostname, None)
+        )
+
+    def discard(self, hostname):
+        """
+        Forget the state token of a device which will not be saved
+        """
+        self._tokens.pop(hostname, None)
+
+    def close(self):
+        self._tokens.clear()
+        self.state.close()
+
+
+class RunJournal():
+    """
+    Devices done by each phase of a run, in sqlite
+
+    Each device is recorded in its own transaction, so an interrupted run
+    leaves a consistent journal, and can be resumed with the same run ID.
+    Only the last `keep_runs` runs are kept. The database is in WAL mode, as
+    parallel processes write to it.
+    """
+
+    def __init__(self, path, run_id, keep_runs=5):
+        self.path = os.path.expanduser(path)
+        self.run_id = run_id
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS journal ("
+                "run_id TEXT, phase TEXT, hostname TEXT, done_at REAL, "
+                "PRIMARY KEY (run_id, phase, hostname))"
+            )
+        self._prune(keep_runs)
+
+    def _prune(self, keep_runs):
+        """
+        Drop the runs older than the last `keep_runs` ones, except this run
+        """
+        with self._lock, self._conn:
+            pruned = self._conn.execute(
+                "DELETE FROM journal WHERE run_id != ? AND run_id NOT IN ("
+                "SELECT run_id FROM journal GROUP BY run_id "
+                "ORDER BY MAX(done_at) DESC LIMIT ?)",
+                (self.run_id, max(keep_runs, 1))
+            ).rowcount
+        if pruned:
+            logger.debug("Pruned %s device(s) of old runs from the journal",
+                         pruned)
+
+    def get_done(self, phase):
+        """
+        :returns hostnames: set of the devices done by `phase` in this run
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT hostname FROM journal WHERE run_id = ? AND phase = ?",
+                (self.run_id, phase)
+            ).fetchall()
+
+        return {row[0] for row in rows}
+
+    def mark_done(self, phase, hostname):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO journal "
+                "(run_id, phase, hostname, done_at) VALUES (?, ?, ?, ?)",
+                (self.run_id, phase, hostname, time.time())
+            )
+
+    def pending(self, phase, devices):
+        """
+        Filter out the devices already done by `phase` in this run
+
+        :param devices: {host: DeviceSpec}, or any object streaming them with
+            `items()`
+        :returns devices: the devices left, in a dict if `devices` is one
+        """
+        done = self.get_done(phase)
+        if done:
+            logger.info(
+                "Resuming run %s: skipping %s device(s) done by %s",
+                self.run_id, len(done), phase
+            )
+        if isinstance(devices, dict):
+            return {
+                host: device for host, device in devices.items()
+                if host not in done
+            }
+
+        return _PendingDevices(devices, done)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _PendingDevices():
+    """
+    Stream of devices skipping the ones already done
+    """
+
+    def __init__(self, devices, done):
+        self.devices = devices
+        self.done = done
+
+    def items(self):
+        for host, device in self.devices.items():
+            if host not in self.done:
+                yield host, device
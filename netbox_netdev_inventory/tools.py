@@ -1,4 +1,5 @@
 from requests.exceptions import HTTPError
+import zlib
 
 from netbox_netdev_inventory.exceptions import GenericNetboxError
 
@@ -23,6 +24,25 @@ def macaddr_to_int(macaddr):
     return int(macaddr_simplified, 16)
 
 
+def in_shard(hostname, shards):
+    """
+    Check if a device is part of a shard
+
+    Devices are partitioned by a hash of their hostname, which gives the same
+    shards on every host and run.
+
+    :param shards: [(index, count), …], each shard (index between 1 and
+        count) splitting the previous one
+    """
+    hostname_hash = zlib.crc32(hostname.encode())
+    for index, count in shards or ():
+        if hostname_hash % count != index - 1:
+            return False
+        hostname_hash //= count
+
+    return True
+
+
 def generic_netbox_error(func):
     """
     Convert an HTTP error to a more explicit exception
@@ -33,3 +53,28 @@ def generic_netbox_error(func):
         except HTTPError as e:
             raise GenericNetboxError(e)
     return wrapper
+
+
+class NetboxRequestsCounter():
+    """
+    Proxy a NetboxAPI object and count the HTTP requests sent through it
+
+    Mappers built from the proxy, and the mappers they return, keep using it,
+    so every request made for one device can be counted.
+    """
+    _counted_methods = ("get", "post", "put", "patch", "delete")
+
+    def __init__(self, netbox_api):
+        self._netbox_api = netbox_api
+        self.requests_count = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._netbox_api, name)
+        if name not in self._counted_methods:
+            return attr
+
+        def counted_request(*args, **kwargs):
+            self.requests_count += 1
+            return attr(*args, **kwargs)
+
+        return counted_request
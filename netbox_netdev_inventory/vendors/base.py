@@ -6,9 +6,68 @@ logger = logging.getLogger("netbox_importer")
 
 
 class _AbstractVendorParser(ABC):
+    #: commands needed by the getters used during a poll, sent at once by
+    #: `prefetch_commands()`
+    poll_commands = ()
 
     def __init__(self, napalm_device, *args, **kwargs):
         self.device = napalm_device
+        #: {command: output} fetched in advance and not used yet
+        self._prefetched = {}
+
+    def get_poll_commands(self):
+        return list(self.poll_commands)
+
+    def prefetch_commands(self):
+        """
+        Send all commands needed during a poll in one `cli()` call
+
+        Their outputs are then returned by `_cli()`. If the batch fails, each
+        getter sends its own command as usual.
+        """
+        commands = self.get_poll_commands()
+        if not commands:
+            return
+
+        try:
+            self._prefetched.update(self.device.cli(commands))
+        except Exception as e:
+            logger.debug(
+                "Cannot prefetch commands on host %s: %s",
+                self.device.hostname, e
+            )
+
+    def close(self):
+        """
+        Forget what was fetched from the device, called when it is closed
+        """
+        self._prefetched.clear()
+
+    def _cli(self, command):
+        """
+        Get the output of a command, prefetched or sent now
+        """
+        try:
+            return self._prefetched.pop(command)
+        except KeyError:
+            return self.device.cli([command])[command]
+
+    def _cli_many(self, commands):
+        """
+        Get the outputs of several commands, the ones not prefetched sent
+        in one `cli()` call
+
+        :return outputs: {command: output}
+        """
+        outputs = {
+            command: self._prefetched.pop(command)
+            for command in commands if command in self._prefetched
+        }
+        missing = [command for command in commands if command not in outputs]
+        if missing:
+            outputs.update(self.device.cli(missing))
+
+        return outputs
 
     @abstractmethod
     def get_interfaces_lag(self, interfaces):
@@ -22,6 +81,15 @@ class _AbstractVendorParser(ABC):
             interface, self.device.hostname
         )
 
+    def get_state_token(self):
+        """
+        Get a token cheap to fetch, which changes when the device state could
+        have changed, like the time of the last configuration change
+
+        :raises NotImplementedError: if the vendor does not provide any
+        """
+        raise NotImplementedError()
+
     def get_all_derivatives_for_netif(self, interface):
         """
         Get all possible derivatives for an interface name
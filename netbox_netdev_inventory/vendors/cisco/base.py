@@ -1,6 +1,6 @@
-import cachetools
 import re
 
+from netbox_netdev_inventory.cache import CommandsCache
 from netbox_netdev_inventory.vendors import _AbstractVendorParser
 
 
@@ -8,7 +8,12 @@ class CiscoParser(_AbstractVendorParser):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self.cache = cachetools.TTLCache(10, 60)
+        self.cache = CommandsCache()
+
+    def close(self):
+        super().close()
+        self.cache.log_stats(self.device.hostname)
+        self.cache.clear()
 
     @staticmethod
     def get_abrev_if(interface):
@@ -23,15 +28,18 @@ class CiscoParser(_AbstractVendorParser):
         return prefix + if_index_re
 
     def get_interface_vlans(self, interface):
-
-        if not self.cache.get("vlan"):
-            self.cache["ttl"] = 600
-            self.cache["vlan"] = {}
-            for vlan, data in self.get_vlans():
-                for iface in data["interfaces"]:
-                    if not self.cache["vlan"].get(iface):
-                        self.cache["vlan"][iface] = []
-                    self.cache["vlan"][iface].append(vlan)
-        return self.cache["vlan"].get(interface)
+        return self.cache.get_or_fetch(
+            "vlan", self._fetch_vlans_by_interface
+        ).get(interface)
+
+    def _fetch_vlans_by_interface(self):
+        vlans_by_interface = {}
+        for vlan, data in self.get_vlans():
+            for iface in data["interfaces"]:
+                if not vlans_by_interface.get(iface):
+                    vlans_by_interface[iface] = []
+                vlans_by_interface[iface].append(vlan)
+
+        return vlans_by_interface
 
 
@@ -1,9 +1,9 @@
 import re
 import logging
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from netbox_netdev_inventory.exceptions import TypeCouldNotBeParsedError
-from netbox_netdev_inventory.vendors.constants import NetboxInterfaceTypes
+from netbox_netdev_inventory.vendors.classifier import classify_interface_type
 from .constants import InterfacesRegex
 from .base import CiscoParser
 
@@ -12,16 +12,23 @@ logger = logging.getLogger("netbox_importer")
 
 
 class IOSParser(CiscoParser):
+    poll_commands = (
+        "show interface status",
+        "show interface switchport",
+        "show vlan all-ports",
+        "show running-config | section ^interface",
+    )
+
     def get_interfaces_lag(self, interfaces):
         super().get_interfaces_lag(interfaces)
 
         interfaces_lag = defaultdict(list)
-        for interface in sorted(interfaces):
-            cmd = "show run interface {}".format(interface)
-            interface_conf_dump = self.device.cli([cmd])[cmd]
+        for interface, interface_conf in self._get_interfaces_conf().items():
+            if interface not in interfaces:
+                continue
 
             channel_group_match = re.search(
-                r"^\s*channel-group (\S*)", interface_conf_dump, re.MULTILINE
+                r"^\s*channel-group (\S*)", interface_conf, re.MULTILINE
             )
             if channel_group_match:
                 port_channel_id = channel_group_match.groups()[0]
@@ -34,6 +41,42 @@ class IOSParser(CiscoParser):
 
         return interfaces_lag
 
+    def _get_interfaces_conf(self):
+        """
+        Get the configuration of all interfaces in one command
+
+        :return interfaces_conf: {interface: configuration section}
+        """
+        cmd = "show running-config | section ^interface"
+        conf_dump = self._cli(cmd)
+        if "Invalid input detected" in conf_dump:
+            # section filter not supported, parse the whole configuration
+            cmd = "show running-config"
+            conf_dump = self._cli(cmd)
+
+        return self._parse_interfaces_conf(conf_dump)
+
+    @staticmethod
+    def _parse_interfaces_conf(conf_dump):
+        """
+        :return interfaces_conf: {interface: configuration section}
+        """
+        sections = re.split(r"^interface (\S+)\s*$", conf_dump, flags=re.M)
+        sections_iter = iter(sections[1:])
+        return {
+            # a section ends at the first line not indented
+            interface: re.match(r"(\n[ \t][^\n]*)*", conf).group(0)
+            for interface, conf in zip(sections_iter, sections_iter)
+        }
+
+    def get_state_token(self):
+        cmd = "show running-config | include Last configuration change"
+        last_change = self._cli(cmd).strip()
+        if not last_change.startswith("! Last configuration change"):
+            raise NotImplementedError()
+
+        return last_change
+
     def get_interface_type(self, interface):
         super().get_interface_type(interface)
         if re.search(r"^Vlan(\d*)|^Tunnel(\d+)", interface):
@@ -43,12 +86,11 @@ class IOSParser(CiscoParser):
         try:
             cisco_if_type = self._guess_type_from_if_type(interface)
 
-            for pattern_iftype in InterfacesRegex:
-                pattern = pattern_iftype.value
-                if re.match(pattern, cisco_if_type):
-                    return getattr(
-                        NetboxInterfaceTypes, pattern_iftype.name
-                    ).value
+            netbox_type = classify_interface_type(
+                InterfacesRegex, cisco_if_type
+            )
+            if netbox_type:
+                return netbox_type
         except TypeCouldNotBeParsedError:
             pass
 
@@ -64,27 +106,31 @@ class IOSParser(CiscoParser):
             raise TypeCouldNotBeParsedError()
 
     def _get_ifstatus_by_abrev_if(self):
+        return self.cache.get_or_fetch(
+            "ifstatus", self._fetch_ifstatus_by_abrev_if
+        )
+
+    def _fetch_ifstatus_by_abrev_if(self):
         cmd = "show interface status"
 
-        if not self.cache.get("ifstatus"):
-            status_conf_dump = self.device.cli([cmd])[cmd].strip()
-            self.cache["ifstatus"] = {}
-            start = status_conf_dump.find('Type')
-            for l in status_conf_dump.splitlines()[1:]:
-                split_l = l.split(maxsplit=1)
-                if_abrev = split_l[0]
-                try:
-                    if_type = l[start:]
-                except:
-                    if_type = None
+        status_conf_dump = self._cli(cmd).strip()
+        ifstatus = {}
+        start = status_conf_dump.find('Type')
+        for l in status_conf_dump.splitlines()[1:]:
+            split_l = l.split(maxsplit=1)
+            if_abrev = split_l[0]
+            try:
+                if_type = l[start:]
+            except:
+                if_type = None
 
-                self.cache["ifstatus"][if_abrev] = if_type
+            ifstatus[if_abrev] = if_type
 
-        return self.cache["ifstatus"]
+        return ifstatus
 
     def get_detailed_cdp_neighbours(self):
         cmd = "show cdp neighbors detail"
-        cmd_output = self.device.cli([cmd])[cmd]
+        cmd_output = self._cli(cmd)
         cmd_output = re.split('---+\n', cmd_output)
         neighbours = []
         for cdp_port_info in cmd_output:
@@ -139,41 +185,41 @@ class IOSParser(CiscoParser):
         return None
 
     def _get_interfaces_mode(self):
+        return self.cache.get_or_fetch("mode", self._fetch_interfaces_mode)
+
+    def _fetch_interfaces_mode(self):
         cmd = "show interface switchport"
 
-        if not self.cache.get("mode"):
-            mode_conf_dump = self.device.cli([cmd])[cmd]
-            mode_conf_lines = re.split(r"(^Name: \S+$)", mode_conf_dump, flags=re.M)
-            mode_conf_lines.pop(0)
-            if len(mode_conf_lines) % 2 != 0:
-                raise ValueError("Unexpected output data in '{}':\n\n{}".format(
-                    cmd, mode_conf_lines
-                ))
-            mode_conf_iter = iter(mode_conf_lines)
-            try:
-                new_mode = [line + next(mode_conf_iter, "") for line in mode_conf_iter]
-            except TypeError:
-                raise ValueError()
-
-            interfaces_mode = {}
-            for entry in new_mode:
-                grp = [
-                    r"^Name:\s+(?P<interface>\S+)",
-                    r"^Administrative Mode:\s+(?P<oper_mode>static access|trunk|access)",
-                    r"^Access Mode VLAN:\s+(?P<access_vlan>\d+)",
-                    r"^Trunking Native Mode VLAN:\s+(?P<native_valn>\d+)"
-                ]
-                inf_mode = {}
-                for g in grp:
-                    find = re.search(g, entry, re.MULTILINE)
-                    if find:
-                        inf_mode[find.lastgroup] = find.group(find.lastgroup)
-                if inf_mode.get("interface"):
-                    interfaces_mode[inf_mode["interface"]] = inf_mode
-
-            self.cache["mode"] = interfaces_mode
-
-        return self.cache["mode"]
+        mode_conf_dump = self._cli(cmd)
+        mode_conf_lines = re.split(r"(^Name: \S+$)", mode_conf_dump, flags=re.M)
+        mode_conf_lines.pop(0)
+        if len(mode_conf_lines) % 2 != 0:
+            raise ValueError("Unexpected output data in '{}':\n\n{}".format(
+                cmd, mode_conf_lines
+            ))
+        mode_conf_iter = iter(mode_conf_lines)
+        try:
+            new_mode = [line + next(mode_conf_iter, "") for line in mode_conf_iter]
+        except TypeError:
+            raise ValueError()
+
+        interfaces_mode = {}
+        for entry in new_mode:
+            grp = [
+                r"^Name:\s+(?P<interface>\S+)",
+                r"^Administrative Mode:\s+(?P<oper_mode>static access|trunk|access)",
+                r"^Access Mode VLAN:\s+(?P<access_vlan>\d+)",
+                r"^Trunking Native Mode VLAN:\s+(?P<native_valn>\d+)"
+            ]
+            inf_mode = {}
+            for g in grp:
+                find = re.search(g, entry, re.MULTILINE)
+                if find:
+                    inf_mode[find.lastgroup] = find.group(find.lastgroup)
+            if inf_mode.get("interface"):
+                interfaces_mode[inf_mode["interface"]] = inf_mode
+
+        return interfaces_mode
 
     def get_vlans(self):
         """
@@ -193,9 +239,9 @@ class IOSParser(CiscoParser):
             interface_dict[self.get_abrev_if(interface)] = interface
 
         command = "show vlan all-ports"
-        output = self.device.cli([command])[command]
+        output = self._cli(command)
         if output.find("Invalid input detected") >= 0:
-            yield from self._get_vlan_from_id(interface_dict)
+            yield from self._get_vlan_from_brief(interface_dict)
         else:
             yield from self._get_vlan_all_ports(interface_dict, output)
 
@@ -205,23 +251,62 @@ class IOSParser(CiscoParser):
         for v in find:
             yield v[0], {
                 "name": v[1],
-                "interfaces": [
-                    interface_dict[x.strip()] for x in v[2].split(",")
-                ],
+                "interfaces": self._get_ifnames(
+                    interface_dict, v[2].split(","), v[0]
+                ),
             }
         find_regexp = r"^(\d+)\s+(\S+)\s+\S+$"
         find = re.findall(find_regexp, output, re.MULTILINE)
         for v in find:
             yield v[0], {"name": v[1], "interfaces": []}
 
-    def _get_vlan_from_id(self, interface_dict):
+    def _get_vlan_from_brief(self, interface_dict):
+        """
+        Get the VLANs and their ports without `show vlan all-ports`
+
+        Access ports are listed by `show vlan brief`, and the VLANs allowed
+        and active on each trunk by `show interfaces trunk`, as `show vlan id`
+        lists them, so the number of commands does not depend on the number
+        of VLANs. Neither command lists all the ports alone: both are sent in
+        one `cli()` call. Devices without `show interfaces trunk` fall back to
+        `show vlan id`.
+        """
+        outputs = self._cli_many(["show vlan brief", "show interfaces trunk"])
+        brief_output = outputs["show vlan brief"]
+        output = outputs["show interfaces trunk"]
+        if output.find("Invalid input detected") >= 0:
+            yield from self._get_vlan_from_id(interface_dict, brief_output)
+            return
+
+        vlans = self._parse_vlan_brief(brief_output)
+        trunks = self._parse_interfaces_trunk(output)
+
+        for vid, (name, ports) in vlans.items():
+            ports = ports + [
+                port for port, trunk_vlans in trunks.items()
+                if int(vid) in trunk_vlans
+            ]
+            yield vid, {
+                "name": name,
+                "interfaces": sorted(
+                    self._get_ifnames(interface_dict, ports, vid),
+                    key=_natural_sort_key
+                ),
+            }
+
+    def _get_vlan_from_id(self, interface_dict, brief_output=None):
+        """
+        Get the VLANs and their ports with one `show vlan id` per VLAN
+
+        :param brief_output: output of `show vlan brief`, if already fetched
+        """
         command = "show vlan brief"
-        output = self.device.cli([command])[command]
+        output = brief_output or self._cli(command)
         vlan_regexp = r"^(\d+)\s+(\S+)\s+\S+.*$"
         find_vlan = re.findall(vlan_regexp, output, re.MULTILINE)
         for vlan in find_vlan:
             command = "show vlan id {}".format(vlan[0])
-            output = self.device.cli([command])[command]
+            output = self._cli(command)
             interface_regex = r"{}\s+{}\s+\S+\s+([A-Z][a-z].*)$".format(
                 vlan[0], vlan[1]
             )
@@ -229,9 +314,9 @@ class IOSParser(CiscoParser):
             if len(interfaces) == 1:
                 yield vlan[0], {
                     "name": vlan[1],
-                    "interfaces": [
-                        interface_dict[x.strip()] for x in interfaces[0].split(",")
-                    ],
+                    "interfaces": self._get_ifnames(
+                        interface_dict, interfaces[0].split(","), vlan[0]
+                    ),
                 }
             elif len(interfaces) == 0:
                 yield vlan[0], {"name": vlan[1], "interfaces": []}
@@ -242,3 +327,89 @@ class IOSParser(CiscoParser):
                     self.device.hostname, vlan[0]
                 )
                 yield None, None
+
+    def _get_ifnames(self, interface_dict, ports, vid):
+        """
+        :param interface_dict: {abbreviated name: interface name}
+        :param ports: abbreviated names of the ports of VLAN `vid`
+        :return ifnames: names of the ports, the unknown ones are skipped
+        """
+        ifnames = []
+        for port in ports:
+            port = port.strip()
+            try:
+                ifnames.append(interface_dict[port])
+            except KeyError:
+                logger.warning(
+                    "Switch %s unknown port %s in vlan id %s, skipped.",
+                    self.device.hostname, port, vid
+                )
+
+        return ifnames
+
+    @staticmethod
+    def _parse_vlan_brief(output):
+        """
+        :return vlans: OrderedDict {vid: (name, [port, …])}
+        """
+        vlans = OrderedDict()
+        ports = None
+        for line in output.splitlines():
+            vlan_match = re.match(r"^(\d+)\s+(\S+)\s+\S+\s*(.*)$", line)
+            if vlan_match:
+                vid, name, ports_line = vlan_match.groups()
+                ports = []
+                vlans[vid] = (name, ports)
+            elif ports is not None and re.match(r"^\s+\S", line):
+                # ports wrapped on continuation lines
+                ports_line = line
+            else:
+                continue
+
+            ports.extend(
+                port.strip() for port in ports_line.split(",")
+                if port.strip()
+            )
+
+        return vlans
+
+    @staticmethod
+    def _parse_interfaces_trunk(output):
+        """
+        VLANs blocked by the spanning tree are kept, as by `show vlan id`.
+
+        :return trunks: {port: set of VLANs allowed and active}
+        """
+        trunks = {}
+        vlans_lines = {}
+        in_active = False
+        port = None
+        for line in output.splitlines():
+            if line.startswith("Port"):
+                in_active = "allowed and active" in line
+                port = None
+            elif not in_active or not line.strip():
+                continue
+            elif line[0].isspace() and port:
+                # VLAN lists wrapped on continuation lines
+                vlans_lines[port] += line.strip()
+            else:
+                port, _, vlans_line = line.strip().partition(" ")
+                vlans_lines[port] = vlans_line.strip()
+
+        for port, vlans_line in vlans_lines.items():
+            trunks[port] = set()
+            for vlan_range in vlans_line.split(","):
+                if not vlan_range or vlan_range == "none":
+                    continue
+                first, _, last = vlan_range.partition("-")
+                trunks[port].update(range(int(first), int(last or first) + 1))
+
+        return trunks
+
+
+def _natural_sort_key(interface):
+    return [
+        int(part) if part.isdigit() else part
+        for part in re.split(r"(\d+)", interface)
+    ]
@@ -3,6 +3,7 @@ import re
 import logging
 
 from netbox_netdev_inventory.exceptions import TypeCouldNotBeParsedError
+from netbox_netdev_inventory.vendors.classifier import classify_interface_type
 from netbox_netdev_inventory.vendors.constants import NetboxInterfaceTypes
 from .constants import InterfacesRegex
 from .base import CiscoParser
@@ -13,6 +14,18 @@ logger = logging.getLogger("netbox_importer")
 
 
 class NXOSParser(CiscoParser):
+    poll_commands = (
+        "show interface transceiver",
+        "show interface status",
+        "show port-channel summary",
+        "show interface switchport",
+        "show vlan brief",
+    )
+
+    def get_poll_commands(self):
+        end_selection = self._driver_end_selection()
+        return [cmd + end_selection for cmd in self.poll_commands]
+
     def get_interface_type(self, interface):
         super().get_interface_type(interface)
         if re.search(r"^Vlan(\d*)|^Tunnel(\d+)", interface):
@@ -41,26 +54,25 @@ class NXOSParser(CiscoParser):
             logger.debug("%s has no transceiver detail", interface)
             raise TypeCouldNotBeParsedError()
 
-        for pattern_iftype in InterfacesRegex:
-            pattern = pattern_iftype.value
-            if re.match(pattern, part_num):
-                return getattr(NetboxInterfaceTypes, pattern_iftype.name).value
+        netbox_type = classify_interface_type(InterfacesRegex, part_num)
+        if netbox_type:
+            return netbox_type
 
         raise TypeCouldNotBeParsedError()
 
     def _get_transceiver_by_if(self):
-        cmd = "show interface transceiver" + self._driver_end_selection()
+        return self.cache.get_or_fetch(
+            "transceivers", self._fetch_transceiver_by_if
+        )
 
-        if not self.cache.get("transceivers"):
-            transceiver_conf_dump = self.device.cli([cmd])[cmd]
-            transceivers = self._correct_and_convert_to_dict(
-                transceiver_conf_dump)["TABLE_interface"]["ROW_interface"]
+    def _fetch_transceiver_by_if(self):
+        cmd = "show interface transceiver" + self._driver_end_selection()
 
-            self.cache["transceivers"] = {
-                i["interface"]: i for i in transceivers
-            }
+        transceiver_conf_dump = self._cli(cmd)
+        transceivers = self._correct_and_convert_to_dict(
+            transceiver_conf_dump)["TABLE_interface"]["ROW_interface"]
 
-        return self.cache["transceivers"]
+        return {i["interface"]: i for i in transceivers}
 
     def _guess_type_from_if_type(self, interface):
         from pynxos.errors import CLIError
@@ -78,25 +90,23 @@ class NXOSParser(CiscoParser):
             except ValueError:
                 pass
         else:
-            for pattern in InterfacesRegex:
-                if re.match(pattern.value, if_type):
-                    return getattr(NetboxInterfaceTypes, pattern.name).value
+            netbox_type = classify_interface_type(InterfacesRegex, if_type)
+            if netbox_type:
+                return netbox_type
 
         raise TypeCouldNotBeParsedError()
 
     def _get_ifstatus_by_if(self):
-        cmd = "show interface status" + self._driver_end_selection()
+        return self.cache.get_or_fetch("ifstatus", self._fetch_ifstatus_by_if)
 
-        if not self.cache.get("ifstatus"):
-            status_conf_dump = self.device.cli([cmd])[cmd]
-            status = self._correct_and_convert_to_dict(status_conf_dump)[
-                "TABLE_interface"]["ROW_interface"]
+    def _fetch_ifstatus_by_if(self):
+        cmd = "show interface status" + self._driver_end_selection()
 
-            self.cache["ifstatus"] = {
-                i["interface"]: i for i in status
-            }
+        status_conf_dump = self._cli(cmd)
+        status = self._correct_and_convert_to_dict(status_conf_dump)[
+            "TABLE_interface"]["ROW_interface"]
 
-        return self.cache["ifstatus"]
+        return {i["interface"]: i for i in status}
 
     def get_detailed_lldp_neighbours(self):
         """
@@ -111,7 +121,7 @@ class NXOSParser(CiscoParser):
         """
         cmd = "show lldp neighbors detail" + self._driver_end_selection()
 
-        cmd_output = self.device.cli([cmd])[cmd]
+        cmd_output = self._cli(cmd)
         neighbours = self._correct_and_convert_to_dict(cmd_output)[
             "TABLE_nbor_detail"]["ROW_nbor_detail"]
 
@@ -138,7 +148,7 @@ class NXOSParser(CiscoParser):
         """
         cmd = "show cdp neighbors detail" + self._driver_end_selection()
 
-        cmd_output = self.device.cli([cmd])[cmd]
+        cmd_output = self._cli(cmd)
         neighbours = self._correct_and_convert_to_dict(cmd_output)[
             "TABLE_cdp_neighbor_detail_info"]["ROW_cdp_neighbor_detail_info"]
 
@@ -170,7 +180,7 @@ class NXOSParser(CiscoParser):
         cmd = "show port-channel summary" + self._driver_end_selection()
         interfaces_lag = defaultdict(list)
 
-        cmd_output = self.device.cli([cmd])[cmd]
+        cmd_output = self._cli(cmd)
         port_cannels = self._correct_and_convert_to_dict(cmd_output)[
             "TABLE_channel"]["ROW_channel"]
 
@@ -223,18 +233,16 @@ class NXOSParser(CiscoParser):
         return None
 
     def _get_interfaces_mode(self):
-        cmd = "show interface switchport" + self._driver_end_selection()
+        return self.cache.get_or_fetch("mode", self._fetch_interfaces_mode)
 
-        if not self.cache.get("mode"):
-            mode_conf_dump = self.device.cli([cmd])[cmd]
-            mode = self._correct_and_convert_to_dict(mode_conf_dump)[
-                "TABLE_interface"]["ROW_interface"]
+    def _fetch_interfaces_mode(self):
+        cmd = "show interface switchport" + self._driver_end_selection()
 
-            self.cache["mode"] = {
-                i["interface"]: i for i in mode
-            }
+        mode_conf_dump = self._cli(cmd)
+        mode = self._correct_and_convert_to_dict(mode_conf_dump)[
+            "TABLE_interface"]["ROW_interface"]
 
-        return self.cache["mode"]
+        return {i["interface"]: i for i in mode}
 
     def get_vlans(self):
         """
@@ -249,35 +257,43 @@ class NXOSParser(CiscoParser):
         """
         cmd = "show vlan brief" + self._driver_end_selection()
 
-        cmd_output = self.device.cli([cmd])[cmd]
+        cmd_output = self._cli(cmd)
         vlans = self._correct_and_convert_to_dict(cmd_output)[
             "TABLE_vlanbriefxbrief"]["ROW_vlanbriefxbrief"]
 
         if isinstance(vlans, dict):
             vlans = [vlans]
 
+        # most VLANs of a switch are on the same ports: expand each list of
+        # ranges once
+        ports_by_ranges = {}
         for v in vlans:
+            ranges = v["vlanshowplist-ifidx"]
+            key = tuple(ranges) if isinstance(ranges, list) else ranges
+            if key not in ports_by_ranges:
+                ports_by_ranges[key] = self._parse_ports(ranges)
+
             yield v["vlanshowbr-vlanid"], {
                 "name": v["vlanshowbr-vlanname"],
-                "interfaces": self._parse_ports(v["vlanshowplist-ifidx"])
+                "interfaces": list(ports_by_ranges[key])
             }
 
     def _parse_ports(self, vlan_s) -> list:
-        vlans = []
-        find_regexp = r"^([A-Za-z\/-]+|.*\/)(\d+)-(\d+)$"
-        vlan_str = ""
-
         if isinstance(vlan_s, list):
-            for v in vlan_s:
-                vlan_str += "," + v
-        else:
-            vlan_str = vlan_s
+            vlan_s = ",".join(vlan_s)
 
-        for vls in vlan_str.split(","):
-            find = re.findall(find_regexp, vls.strip())
+        ports = []
+        for port in vlan_s.split(","):
+            port = port.strip()
+            find = _PORTS_RANGE_RE.match(port)
             if find:
-                for i in range(int(find[0][1]), int(find[0][2]) + 1):
-                    vlans.append(find[0][0] + str(i))
-            else:
-                vlans.append(vls.strip())
-        return vlans
+                prefix, first, last = find.groups()
+                ports.extend(
+                    prefix + str(i) for i in range(int(first), int(last) + 1)
+                )
+            elif port:
+                ports.append(port)
+        return ports
+
+
+_PORTS_RANGE_RE = re.compile(r"^([A-Za-z\/-]+|.*\/)(\d+)-(\d+)$")
@@ -0,0 +1,39 @@
+import functools
+import re
+
+from netbox_netdev_inventory.vendors.constants import NetboxInterfaceTypes
+
+
+@functools.lru_cache(maxsize=None)
+def compile_interfaces_regex(interfaces_regex):
+    """
+    Compile the patterns of a vendor in a single alternation
+
+    Each pattern is a named group, tried in the order of the enum, as
+    re.match would be on each pattern one after the other.
+
+    :param interfaces_regex: InterfacesRegex enum of a vendor
+    """
+    return re.compile("|".join(
+        "(?P<{}>{})".format(pattern.name, pattern.value)
+        for pattern in interfaces_regex
+    ))
+
+
+@functools.lru_cache(maxsize=4096)
+def classify_interface_type(interfaces_regex, value):
+    """
+    Get the netbox interface type matching a part number or interface type
+
+    Results are kept for the whole process, as the same part numbers are
+    found on most devices.
+
+    :param interfaces_regex: InterfacesRegex enum of a vendor
+    :param value: part number or interface type reported by the device
+    :return type: netbox interface type, None if no pattern matches
+    """
+    match = compile_interfaces_regex(interfaces_regex).match(value)
+    if not match:
+        return None
+
+    return getattr(NetboxInterfaceTypes, match.lastgroup).value
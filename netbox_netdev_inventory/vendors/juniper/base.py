@@ -1,5 +1,7 @@
 from collections import defaultdict
+import io
 import logging
+from defusedxml import DTDForbidden
 import defusedxml.lxml
 import lxml.etree
 # should be a napalm dependency
@@ -7,13 +9,83 @@ from jnpr.junos.exception import RpcError
 import re
 
 from netbox_netdev_inventory.vendors import _AbstractVendorParser
-from netbox_netdev_inventory.vendors.constants import NetboxInterfaceTypes
+from netbox_netdev_inventory.vendors.classifier import classify_interface_type
 from netbox_netdev_inventory.exceptions import TypeCouldNotBeParsedError
 from .constants import InterfacesRegex
 
 
 logger = logging.getLogger("netbox_importer")
 
+#: levels of modules of the chassis inventory, below the chassis modules
+CHASSIS_SUB_MODULES = (
+    "chassis-sub-module", "chassis-sub-sub-module",
+    "chassis-sub-sub-sub-module",
+)
+
+
+def iter_xml_elements(xml, tag):
+    """
+    Yield each element named `tag` of an RPC reply, and free it once handled
+
+    A reply element, as returned by PyEZ, is walked and emptied as its
+    elements are handled. A reply text is parsed incrementally, so its
+    parsed tree is never built whole. Namespaces are ignored, and elements
+    nested in another element to yield are yielded with it, not on their
+    own.
+
+    defusedxml.lxml has no incremental parser, so the same protections are
+    set on lxml to parse a reply text: no DTD loaded, no entity resolved, no
+    network access, no huge tree, and replies with a DOCTYPE are rejected.
+
+    :param xml: RPC reply, as an lxml element, str or bytes
+    :param tag: name of the elements to yield, or tuple of names
+    :raises DTDForbidden: if the reply text has a DOCTYPE
+    """
+    tags = [
+        "{{*}}{}".format(t) for t in ((tag,) if isinstance(tag, str) else tag)
+    ]
+    if lxml.etree.iselement(xml):
+        elements = _iter_tree_elements(xml, tags)
+    else:
+        elements = _iterparse_elements(xml, tags)
+
+    for element in elements:
+        if next(element.iterancestors(*tags), None) is not None:
+            continue
+
+        yield element
+
+        element.clear()
+        # drop the elements already handled, kept by their parent
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def _iter_tree_elements(root, tags):
+    # listed first, as the tree is emptied while walked
+    return list(root.iter(*tags))
+
+
+def _iterparse_elements(xml, tags):
+    if isinstance(xml, str):
+        xml = xml.encode()
+
+    doctype_checked = False
+    for _, element in lxml.etree.iterparse(
+            io.BytesIO(xml), tag=tags,
+            resolve_entities=False, no_network=True, load_dtd=False,
+            dtd_validation=False, huge_tree=False
+    ):
+        if not doctype_checked:
+            docinfo = element.getroottree().docinfo
+            if docinfo.doctype:
+                raise DTDForbidden(
+                    docinfo.root_name, docinfo.system_url, docinfo.public_id
+                )
+            doctype_checked = True
+
+        yield element
+
 
 class JuniperParser(_AbstractVendorParser):
 
@@ -21,6 +93,10 @@ class JuniperParser(_AbstractVendorParser):
         super().__init__(*args, **kwargs)
         self.cache = {}
 
+    def close(self):
+        super().close()
+        self.cache.clear()
+
     def get_interfaces_lag(self, interfaces):
         return super().get_interfaces_lag(interfaces)
 
@@ -38,33 +114,58 @@ class JuniperParser(_AbstractVendorParser):
 
 class JunOSParser(JuniperParser):
 
+    def _rpc_reply(self, rpc):
+        """
+        Send an RPC, and get its reply as parsed by PyEZ when possible
+
+        napalm's _rpc serializes the reply element of PyEZ to text, which
+        iter_xml_elements would parse again: the element is walked instead.
+
+        :param rpc: RPC request, as str
+        :return reply: lxml element, or reply text for the drivers not
+            based on PyEZ
+        """
+        execute = getattr(
+            getattr(self.device, "device", None), "execute", None
+        )
+        if execute is None:
+            return self.device._rpc(rpc)
+
+        reply = execute(lxml.etree.fromstring(rpc))
+        if not lxml.etree.iselement(reply):
+            # PyEZ returns True for replies without content
+            return lxml.etree.Element("rpc-reply")
+
+        return reply
+
     def get_interfaces_lag(self, interfaces):
         interfaces_lag = defaultdict(set)
 
         try:
-            interfaces_info_xml = self.device._rpc(
+            interfaces_info_xml = self._rpc_reply(
                 self._gen_rpc_request_interfaces_info()
             )
         except RpcError as e:
             logger.debug("RPC error: %s", e)
             raise
 
-        parsed_xml = defusedxml.lxml.fromstring(interfaces_info_xml)
-
-        for ifblock in parsed_xml.xpath(".//physical-interface"):
-            ifname = ifblock.xpath("name")[0].text.strip()
+        for ifblock in iter_xml_elements(
+                interfaces_info_xml, "physical-interface"
+        ):
+            ifname = ifblock.findtext("{*}name").strip()
             if ifname not in interfaces:
                 continue
 
-            bundle_xpath = ifblock.xpath(".//ae-bundle-name")
-            if bundle_xpath:
-                bundle_name = bundle_xpath[0].text.split(".")[0].strip()
-                interfaces_lag[ifname] = bundle_name
+            bundle_name = ifblock.findtext(".//{*}ae-bundle-name")
+            if bundle_name:
+                interfaces_lag[ifname] = bundle_name.split(".")[0].strip()
 
         return interfaces_lag
 
     def _gen_rpc_request_interfaces_info(self):
         get_pic_details_el = lxml.etree.Element("get-interface-information")
+        # only names and families are needed, not the details of each unit
+        lxml.etree.SubElement(get_pic_details_el, "terse")
         xml_tree = get_pic_details_el.getroottree()
 
         return lxml.etree.tostring(xml_tree).decode()
@@ -75,12 +176,7 @@ class JunOSParser(JuniperParser):
         except TypeCouldNotBeParsedError:
             return "Other"
 
-        for pattern_iftype in InterfacesRegex:
-            pattern = pattern_iftype.value
-            if re.match(pattern, junos_type):
-                return getattr(NetboxInterfaceTypes, pattern_iftype.name).value
-
-        return "Other"
+        return classify_interface_type(InterfacesRegex, junos_type) or "Other"
 
     def _guess_type_from_chassis_pic(self, interface):
         pattern = r".*-(\d+)/(\d+)/(\d+)"
@@ -94,74 +190,142 @@ class JunOSParser(JuniperParser):
         if max((fpc, pic, port_index)) > 254:
             return "Other"
 
-        if "pic" not in self.cache:
-            self.cache["pic"] = {}
+        try:
+            pic = self._get_pics_by_slot()[(fpc, pic)]
+        except KeyError:
+            raise TypeCouldNotBeParsedError(interface)
 
-        if (fpc, pic) not in self.cache["pic"]:
+        if not pic["ports"]:
+            return pic["type"]
+
+        try:
+            return pic["ports"][port_index]
+        except KeyError:
+            raise TypeCouldNotBeParsedError(interface)
+
+    def _get_pics_by_slot(self):
+        """
+        Get the type of each PIC and of its transceivers, with a single
+        chassis inventory RPC
+
+        Only these descriptions are kept, not the parsed inventory.
+
+        :return pics: {(fpc, pic): {
+                "type": PIC description,
+                "ports": {port index: transceiver description}
+            }}
+        """
+        if "pic" not in self.cache:
             try:
-                chassis_pic_xml = self.device._rpc(
-                    self._gen_rpc_request_pic_info(fpc, pic)
+                inventory_xml = self.device._rpc(
+                    self._gen_rpc_request_chassis_inventory()
                 )
             except RpcError as e:
                 logger.debug("RPC error: %s", e)
-                raise TypeCouldNotBeParsedError(interface)
+                inventory_xml = None
 
-            parsed_xml = defusedxml.lxml.fromstring(chassis_pic_xml)
-            self.cache["pic"][(fpc, pic)] = parsed_xml
-        else:
-            parsed_xml = self.cache["pic"][(fpc, pic)]
+            self.cache["pic"] = (
+                self._parse_pics(defusedxml.lxml.fromstring(inventory_xml))
+                if inventory_xml else {}
+            )
 
-        try:
-            ports_info = parsed_xml.findall(".//port-information")[0]
-        except IndexError:
-            return parsed_xml.findall(".//pic-type")[0].text
+        return self.cache["pic"]
 
-        for p in ports_info.getchildren():
-            if int(p.xpath("port-number")[0].text) == port_index:
-                return p.xpath("sfp-vendor-pno")[0].text
+    @staticmethod
+    def _parse_pics(parsed_xml):
+        pics = {}
+        slot_re = re.compile(r"^\s*(FPC|PIC|Xcvr) (\d+)\s*$")
+
+        def iter_sub_modules(module):
+            for tag in CHASSIS_SUB_MODULES:
+                yield from module.iterfind(".//" + tag)
+
+        def get_slot(module, expected):
+            slot_match = slot_re.match(module.findtext("name", ""))
+            if slot_match and slot_match.group(1) == expected:
+                return int(slot_match.group(2))
+
+        for fpc_module in parsed_xml.iterfind(".//chassis-module"):
+            fpc = get_slot(fpc_module, "FPC")
+            if fpc is None:
+                continue
 
-        raise TypeCouldNotBeParsedError(interface)
+            # PICs are in the FPC, or in a MIC of the FPC on MIC-based MX and
+            # SRX: look for them, and their transceivers, at any depth
+            for pic_module in iter_sub_modules(fpc_module):
+                pic = get_slot(pic_module, "PIC")
+                if pic is None:
+                    continue
 
-    def _gen_rpc_request_pic_info(self, fpc, pic):
-        get_pic_details_el = lxml.etree.Element("get-pic-detail")
-        xml_tree = get_pic_details_el.getroottree()
+                ports = {}
+                for xcvr_module in iter_sub_modules(pic_module):
+                    port = get_slot(xcvr_module, "Xcvr")
+                    if port is not None:
+                        ports[port] = xcvr_module.findtext(
+                            "description", ""
+                        ).strip()
+
+                pics[(fpc, pic)] = {
+                    "type": pic_module.findtext("description", "").strip(),
+                    "ports": ports,
+                }
+
+        return pics
 
-        for slot_type in ("fpc", "pic"):
-            slot_el = lxml.etree.Element("{}-slot".format(slot_type))
-            get_pic_details_el.append(slot_el)
-            slot_el.text = str(vars()[slot_type])
+    def _gen_rpc_request_chassis_inventory(self):
+        get_chassis_inventory_el = lxml.etree.Element("get-chassis-inventory")
+        xml_tree = get_chassis_inventory_el.getroottree()
+
+        return lxml.etree.tostring(xml_tree).decode()
+
+    def get_state_token(self):
+        try:
+            commit_xml = self.device._rpc(self._gen_rpc_commit_information())
+        except RpcError as e:
+            logger.debug("RPC error: %s", e)
+            raise NotImplementedError()
+
+        parsed_xml = defusedxml.lxml.fromstring(commit_xml)
+        last_commit = parsed_xml.xpath(".//commit-history[1]")
+        if not last_commit:
+            raise NotImplementedError()
+
+        return "{} {}".format(
+            last_commit[0].findtext("sequence-number", "").strip(),
+            last_commit[0].findtext("date-time", "").strip()
+        )
+
+    def _gen_rpc_commit_information(self):
+        get_commit_information_el = lxml.etree.Element(
+            "get-commit-information"
+        )
+        xml_tree = get_commit_information_el.getroottree()
 
         return lxml.etree.tostring(xml_tree).decode()
 
     def get_detailed_lldp_neighbours(self):
         try:
-            lldp_neighbours_xml = self.device._rpc(
+            lldp_neighbours_xml = self._rpc_reply(
                 self._gen_rpc_lldp_neighbours()
             )
         except RpcError as e:
             logger.debug("RPC error: %s", e)
             raise
 
-        parsed_xml = defusedxml.lxml.fromstring(lldp_neighbours_xml)
-
-        for n in parsed_xml.xpath(".//lldp-neighbor-information"):
+        for n in iter_xml_elements(
+                lldp_neighbours_xml, "lldp-neighbor-information"
+        ):
             yield {
                 "local_port": (
-                    n.xpath(
-                        "lldp-local-interface"
-                    )[0].text.split(".")[0].strip()
-                ),
-                "hostname": (
-                    n.xpath("lldp-remote-system-name")[0].text.strip()
+                    n.findtext("{*}lldp-local-interface").split(".")[0].strip()
                 ),
+                "hostname": n.findtext("{*}lldp-remote-system-name").strip(),
                 "port": (
-                    n.xpath(
-                        "lldp-remote-port-description"
-                    )[0].text.split(".")[0].strip()
-                ),
-                "chassis_id": (
-                    n.xpath("lldp-remote-chassis-id")[0].text.strip()
+                    n.findtext(
+                        "{*}lldp-remote-port-description"
+                    ).split(".")[0].strip()
                 ),
+                "chassis_id": n.findtext("{*}lldp-remote-chassis-id").strip(),
             }
 
     def _gen_rpc_lldp_neighbours(self):
@@ -172,21 +336,115 @@ class JunOSParser(JuniperParser):
 
         return lxml.etree.tostring(xml_tree).decode()
 
-    # The following features are stubs. Since I can not test.
     def get_interface_mode(self, interface):
-        logger.info("get_interface_mode function not implemented for junos")
-        raise NotImplementedError
+        return self._get_switching_by_if().get(interface, {}).get("mode")
 
     def get_interface_access_vlan(self, interface):
-        logger.info("get_interface_access_vlan function not implemented for "
-                    "junos")
-        raise NotImplementedError
+        switching = self._get_switching_by_if().get(interface, {})
+        if switching.get("mode") != "access":
+            return None
+
+        return switching.get("untagged_vlan")
 
     def get_interface_netive_vlan(self, interface):
-        logger.info("get_interface_netive_vlan function not implemented for "
-                    "junos")
-        raise NotImplementedError
+        switching = self._get_switching_by_if().get(interface, {})
+        if switching.get("mode") != "trunk":
+            return None
+
+        return switching.get("untagged_vlan")
 
     def get_interface_vlans(self, interface):
-        logger.info("get_interface_vlans function not implemented for junos")
-        raise NotImplementedError
+        vlans = self._get_switching_by_if().get(interface, {}).get("vlans")
+        return list(vlans) if vlans else None
+
+    def _get_switching_by_if(self):
+        """
+        Get the switching setup of all interfaces, with a single RPC
+
+        :return switching: {interface: {
+                "mode": "access" or "trunk",
+                "untagged_vlan": vid of the untagged VLAN,
+                "vlans": [vid, …] of all VLANs of the interface
+            }}
+        """
+        if "switching" not in self.cache:
+            try:
+                switching_xml = self._rpc_reply(
+                    self._gen_rpc_request_switching_info()
+                )
+            except RpcError as e:
+                logger.debug("RPC error: %s", e)
+                switching_xml = None
+
+            self.cache["switching"] = (
+                self._parse_switching(switching_xml)
+                if switching_xml is not None else {}
+            )
+
+        return self.cache["switching"]
+
+    def _parse_switching(self, switching_xml):
+        """
+        Parse the switching setup of the interfaces, from the original
+        schema or from the l2ng schema of the ELS switches
+
+        The ELS schema has no port mode: it is guessed from the VLANs.
+        """
+        switching = {}
+        for ifblock in iter_xml_elements(
+                switching_xml, ("interface", "l2ng-l2ald-iff-interface-entry")
+        ):
+            if lxml.etree.QName(ifblock).localname == "interface":
+                prefix = ""
+                members = ifblock.iterfind(".//{*}interface-vlan-member")
+            else:
+                # each VLAN is an entry nested in the interface entry
+                prefix = "l2iff-"
+                members = ifblock.iterfind(
+                    ".//{*}l2ng-l2ald-iff-interface-entry"
+                )
+
+            ifname = self.get_real_ifname(ifblock.findtext(
+                "{{*}}{}interface-name".format(prefix), ""
+            ).strip())
+            if not ifname:
+                continue
+
+            if_switching = switching.setdefault(ifname, {
+                "mode": None, "untagged_vlan": None, "vlans": []
+            })
+            tagged = False
+            for member in members:
+                try:
+                    vid = int(member.findtext(
+                        "{{*}}{}interface-vlan-member-tagid".format(prefix)
+                    ))
+                except (TypeError, ValueError):
+                    continue
+
+                if_switching["vlans"].append(vid)
+                tagness = member.findtext(
+                    "{{*}}{}interface-vlan-member-tagness".format(prefix), ""
+                ).strip().lower()
+                if tagness == "untagged":
+                    if_switching["untagged_vlan"] = vid
+                else:
+                    tagged = True
+
+            port_mode = ifblock.findtext(
+                "{*}interface-port-mode", ""
+            ).strip().lower()
+            if port_mode in ("access", "trunk"):
+                if_switching["mode"] = port_mode
+            elif if_switching["vlans"]:
+                if_switching["mode"] = "trunk" if tagged else "access"
+
+        return switching
+
+    def _gen_rpc_request_switching_info(self):
+        get_switching_info_el = lxml.etree.Element(
+            "get-ethernet-switching-interface-information"
+        )
+        xml_tree = get_switching_info_el.getroottree()
+
+        return lxml.etree.tostring(xml_tree).decode()
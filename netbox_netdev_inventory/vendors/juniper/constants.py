@@ -4,7 +4,9 @@ from enum import Enum
 class InterfacesRegex(Enum):
     eth100 = r".*100 Base(-T|TX)"
     eth1000 = r".*1000 Base(-T|TX)"
-    sfp = r"^SFP-.?G.*"
+    # part numbers of the PIC details (SFP-1GE-LX), or transceiver
+    # descriptions of the chassis inventory (SFP-SX)
+    sfp = r"^SFP-(.?G|SX|LX|LH|EX|ZX|BX|T$).*"
     sfp_plus = r"^(.?WDM-)?SFP.?-.?10G.*-.*"
     qsfp_plus = r"QSFP\+"
     xfp = r"XFP"
@@ -0,0 +1,238 @@
+import logging
+import threading
+from requests.exceptions import HTTPError
+
+
+logger = logging.getLogger("netbox_importer")
+
+
+class NetboxWriter():
+    """
+    Send the writes of a pusher to netbox, and keep track of them
+
+    In dry run mode, writes are only recorded and nothing is sent to netbox.
+    Bulk writes are sent as lists of objects, by chunks of `batch_size`.
+    Netbox before 2.10 does not accept PATCH on list endpoints: once it
+    answered 405, updates are sent object by object for the whole process.
+    """
+    #: URLs of the netbox not accepting bulk updates, shared by all writers
+    _bulk_update_unsupported = set()
+    _bulk_update_lock = threading.Lock()
+
+    def __init__(self, netbox_api, dry_run=False, batch_size=100):
+        self.netbox_api = netbox_api
+        self.dry_run = dry_run
+        self.batch_size = max(batch_size, 1)
+
+        #: [{"action": …, "model": …, "name": …, "fields": {…}}, …]
+        self.changes = []
+
+    @classmethod
+    def clear_bulk_support(cls):
+        with cls._bulk_update_lock:
+            cls._bulk_update_unsupported.clear()
+
+    def _record(self, action, model, obj_name, fields=None):
+        change = {
+            "action": action, "model": model, "name": obj_name,
+            "fields": fields or {}
+        }
+        logger.debug(format_change(change))
+        self.changes.append(change)
+
+    def create(self, mapper, obj_name, **fields):
+        """
+        Create an object from a root mapper
+
+        :returns netbox_obj: mapper of the created object, None in dry run
+        """
+        self._record("create", mapper.__model__, obj_name, fields)
+        if self.dry_run:
+            return None
+
+        return mapper.post(**fields)
+
+    def update(self, model, obj_name, netbox_obj, **fields):
+        """
+        Patch only `fields` of netbox_obj, and update the mapper accordingly
+
+        :param netbox_obj: mapper of the object to update. Can be None in dry
+            run mode, if the object would have been created before.
+        """
+        if not fields:
+            return
+
+        self._record("update", model, obj_name, fields)
+        if self.dry_run:
+            return
+
+        netbox_obj._replace_params_mappers_by_id(fields)
+        self.netbox_api.patch(netbox_obj._route, json=fields)
+        for k, v in fields.items():
+            setattr(netbox_obj, k, v)
+
+    def delete(self, model, obj_name, netbox_obj):
+        self._record("delete", model, obj_name)
+        if self.dry_run:
+            return
+
+        netbox_obj.delete()
+
+    def bulk_create(self, mapper, objects, error_cls):
+        """
+        Create objects from a root mapper with bulk requests
+
+        :param objects: [(obj_name, fields), …]
+        :param error_cls: exception raised with the name of an object netbox
+            failed to create
+        :returns netbox_objs: mappers of the created objects, in the same
+            order as `objects` (None for each object in dry run)
+        """
+        for obj_name, fields in objects:
+            self._record("create", mapper.__model__, obj_name, fields)
+        if self.dry_run:
+            return [None] * len(objects)
+
+        def build_mapper(obj):
+            return mapper._build_new_mapper_from(
+                obj, mapper._route + "{}/".format(obj["id"])
+            )
+
+        def send_bulk(payload):
+            return [
+                build_mapper(obj)
+                for obj in self.netbox_api.post(mapper._route, json=payload)
+            ]
+
+        def send_one(fields):
+            return build_mapper(
+                self.netbox_api.post(mapper._route, json=fields)
+            )
+
+        for _, fields in objects:
+            mapper._replace_params_mappers_by_id(fields)
+
+        created = []
+        for chunk in self._chunks(objects):
+            created.extend(
+                self._send_chunk(chunk, error_cls, send_bulk, send_one)
+            )
+
+        return created
+
+    def bulk_update(self, mapper, updates, error_cls):
+        """
+        Patch objects of a root mapper with bulk requests
+
+        :param updates: [(obj_name, netbox_obj, fields), …]. Updates without
+            fields are ignored. netbox_obj can be None in dry run mode, if the
+            object would have been created before.
+        :param error_cls: exception raised with the name of an object netbox
+            failed to update
+        """
+        updates = [u for u in updates if u[2]]
+        for obj_name, _, fields in updates:
+            self._record("update", mapper.__model__, obj_name, fields)
+        if self.dry_run or not updates:
+            return
+
+        netbox_url = self.netbox_api.url
+
+        def send_bulk(payload):
+            try:
+                return self.netbox_api.patch(mapper._route, json=payload)
+            except HTTPError as e:
+                if _get_status_code(e) == 405:
+                    logger.info(
+                        "Netbox %s does not accept bulk updates, patching "
+                        "objects one by one", netbox_url
+                    )
+                    with self._bulk_update_lock:
+                        self._bulk_update_unsupported.add(netbox_url)
+                raise
+
+        def send_one(fields):
+            return self.netbox_api.patch(
+                mapper._route + "{}/".format(fields["id"]), json=fields
+            )
+
+        objects = []
+        for obj_name, netbox_obj, fields in updates:
+            netbox_obj._replace_params_mappers_by_id(fields)
+            payload = {"id": netbox_obj.id}
+            payload.update(fields)
+            objects.append((obj_name, payload))
+
+        for chunk in self._chunks(objects):
+            bulk_supported = netbox_url not in self._bulk_update_unsupported
+            self._send_chunk(
+                chunk, error_cls, send_bulk if bulk_supported else None,
+                send_one
+            )
+
+        for _, netbox_obj, fields in updates:
+            for k, v in fields.items():
+                setattr(netbox_obj, k, v)
+
+    def _chunks(self, objects):
+        for i in range(0, len(objects), self.batch_size):
+            yield objects[i:i + self.batch_size]
+
+    def _send_chunk(self, chunk, error_cls, send_bulk, send_one):
+        """
+        Send a chunk of objects, and map a failure to the faulty object
+
+        Netbox answers to an invalid bulk request with one error per object,
+        in the same order as the objects sent. If a client error (4xx) cannot
+        be mapped this way, the request was rejected before any write, and
+        objects are sent again one by one. Other errors are raised, as the
+        chunk may have been partially written.
+
+        :param send_bulk: callable(payload), None to send objects one by one
+        """
+        names = [obj_name for obj_name, _ in chunk]
+        try:
+            if send_bulk is not None:
+                return send_bulk([fields for _, fields in chunk])
+        except HTTPError as e:
+            try:
+                errors = e.response.json()
+            except (AttributeError, ValueError):
+                errors = None
+
+            if isinstance(errors, list) and len(errors) == len(chunk):
+                for obj_name, error in zip(names, errors):
+                    if error:
+                        raise error_cls(obj_name, e)
+
+            status_code = _get_status_code(e)
+            if status_code is None or not 400 <= status_code < 500:
+                raise error_cls(", ".join(names), e)
+
+            logger.debug(
+                "Bulk request failed (%s), sending objects one by one", e
+            )
+
+        results = []
+        for obj_name, fields in chunk:
+            try:
+                results.append(send_one(fields))
+            except HTTPError as e:
+                raise error_cls(obj_name, e)
+
+        return results
+
+
+def _get_status_code(http_error):
+    response = getattr(http_error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def format_change(change):
+    fields = ", ".join(
+        "{}={!r}".format(k, v) for k, v in sorted(change["fields"].items())
+    )
+    return "{} {} {}{}".format(
+        change["action"], change["model"], change["name"],
+        ": {}".format(fields) if fields else ""
+    )
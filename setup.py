@@ -8,7 +8,7 @@ with open("README.rst") as readme_file:
 
 requirements = [
     "appdirs", "cachetools", "defusedxml", "lxml", "napalm", "netboxapi",
-    "simplejson", "tqdm"
+    "requests", "simplejson", "tqdm", "urllib3"
 ]
 setup_requirements = [
     "pytest-runner",
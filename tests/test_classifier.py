@@ -0,0 +1,71 @@
+import re
+
+import pytest
+
+from netbox_netdev_inventory.vendors.cisco.constants import (
+    InterfacesRegex as CiscoInterfacesRegex
+)
+from netbox_netdev_inventory.vendors.classifier import classify_interface_type
+from netbox_netdev_inventory.vendors.constants import NetboxInterfaceTypes
+from netbox_netdev_inventory.vendors.juniper.constants import (
+    InterfacesRegex as JuniperInterfacesRegex
+)
+
+
+def classify_one_by_one(interfaces_regex, value):
+    for pattern in interfaces_regex:
+        if re.match(pattern.value, value):
+            return getattr(NetboxInterfaceTypes, pattern.name).value
+
+
+@pytest.mark.parametrize("interfaces_regex, value", [
+    (CiscoInterfacesRegex, "CFP-100G-LR4"),
+    (CiscoInterfacesRegex, "CFP2-100G-ER4"),
+    (CiscoInterfacesRegex, "10/100BaseTX"),
+    (CiscoInterfacesRegex, "10/100/1000BaseTX"),
+    (CiscoInterfacesRegex, "1000BaseSX SFP"),
+    (CiscoInterfacesRegex, "1000BASE-LX"),
+    (CiscoInterfacesRegex, "SFP-10G-SR"),
+    (CiscoInterfacesRegex, "DWDM-SFP-10G-C"),
+    (CiscoInterfacesRegex, "10Gbase-LR"),
+    (CiscoInterfacesRegex, "SFP-H25G-CU1M"),
+    (CiscoInterfacesRegex, "QSFP-40G-SR4"),
+    (CiscoInterfacesRegex, "QSFP-100G-LR4-S"),
+    (CiscoInterfacesRegex, "XENPAK-10GB-LR"),
+    (CiscoInterfacesRegex, "X2-10GB-SR"),
+    (CiscoInterfacesRegex, "GLC-T"),
+    (JuniperInterfacesRegex, "4x 10/100/1000 Base-TX"),
+    (JuniperInterfacesRegex, "SFP-1GE-LX"),
+    (JuniperInterfacesRegex, "SFP-SX"),
+    (JuniperInterfacesRegex, "SFP-LX10"),
+    (JuniperInterfacesRegex, "SFP-T"),
+    (JuniperInterfacesRegex, "SFP+-10G-SR"),
+    (JuniperInterfacesRegex, "QSFP+-40G-SR4"),
+    (JuniperInterfacesRegex, "XFP-10G-LR"),
+    (JuniperInterfacesRegex, "UNKNOWN"),
+])
+def test_classify_interface_type(interfaces_regex, value):
+    assert classify_interface_type(interfaces_regex, value) == (
+        classify_one_by_one(interfaces_regex, value)
+    )
+
+
+def test_classify_interface_type_cached():
+    classify_interface_type.cache_clear()
+    classify_interface_type(CiscoInterfacesRegex, "SFP-10G-SR")
+    assert classify_interface_type(
+        CiscoInterfacesRegex, "SFP-10G-SR"
+    ) == NetboxInterfaceTypes.sfp_plus.value
+
+    assert classify_interface_type.cache_info().hits == 1
+
+
+@pytest.mark.parametrize("value", [
+    # part number of the PIC details, and transceiver descriptions of the
+    # chassis inventory
+    "SFP-1GE-LX", "SFP-SX", "SFP-LX10", "SFP-T",
+])
+def test_classify_juniper_sfp(value):
+    assert classify_interface_type(JuniperInterfacesRegex, value) == (
+        NetboxInterfaceTypes.sfp.value
+    )
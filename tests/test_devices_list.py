@@ -0,0 +1,182 @@
+import os
+
+import napalm
+import pytest
+
+from netbox_netdev_inventory import devices_list
+from netbox_netdev_inventory.devices_list import (
+    DeviceSpec, FilterDevicesSource, parse_devices_yaml_def
+)
+from netbox_netdev_inventory.importer import (
+    napalm as importer_napalm, DeviceImporter
+)
+from netbox_netdev_inventory.tools import in_shard
+
+
+BASE_PATH = os.path.dirname(__file__)
+
+
+def write_devices_yaml(tmpdir):
+    devices_yaml = tmpdir.join("devices.yml")
+    devices_yaml.write(
+        "switch1.foo.tld:\n"
+        "  driver: ios\n"
+        "  target: 10.0.0.1\n"
+        "  discovery_protocol: cdp\n"
+        "  neighbours_policy: union\n"
+        "switch2.foo.tld:\n"
+        "  driver: junos\n"
+        "broken.foo.tld:\n"
+        "  target: 10.0.0.3\n"
+    )
+    return str(devices_yaml)
+
+
+def test_parse_devices_yaml_def(tmpdir):
+    devices = parse_devices_yaml_def(
+        write_devices_yaml(tmpdir), creds=("user", "password")
+    )
+
+    # definition without driver is skipped
+    assert sorted(devices) == ["switch1.foo.tld", "switch2.foo.tld"]
+    assert all(isinstance(d, DeviceSpec) for d in devices.values())
+
+    switch1 = devices["switch1.foo.tld"]
+    assert (switch1.target, switch1.driver, switch1.discovery_protocol) == (
+        "10.0.0.1", "ios", "cdp"
+    )
+    assert switch1.neighbours_policy == "union"
+    assert devices["switch2.foo.tld"].target == "switch2.foo.tld"
+
+
+def test_parse_devices_yaml_def_shard(tmpdir):
+    shards = [(1, 2)]
+    devices = parse_devices_yaml_def(write_devices_yaml(tmpdir), shards=shards)
+
+    assert sorted(devices) == sorted(
+        h for h in ("switch1.foo.tld", "switch2.foo.tld") if in_shard(h, shards)
+    )
+
+
+def test_device_spec_build_importer(monkeypatch):
+    mock_driver = napalm.get_network_driver("mock")
+    monkeypatch.setattr(
+        importer_napalm, "get_network_driver", lambda *args: mock_driver
+    )
+    spec = DeviceSpec(
+        "switch1.foo.tld", "ios", target="10.0.0.1",
+        optional_args={
+            "path": os.path.join(BASE_PATH, "mock_driver/global"),
+            "profile": ["ios"],
+        }, creds=("user", "password"), discovery_protocol="cdp",
+        neighbours_policy="prefer_lldp"
+    )
+
+    importer = spec.build_importer()
+    assert isinstance(importer, DeviceImporter)
+    assert importer.hostname == "10.0.0.1"
+    assert importer.napalm_driver_name == "ios"
+    assert importer.discovery_protocol == "cdp"
+    assert importer.neighbours_policy == "prefer_lldp"
+    assert spec.build_importer() is not importer
+
+
+class FakeNetboxAPI():
+
+    def __init__(self, devices, platforms, max_page_size=1000):
+        self.devices = devices
+        self.platforms = platforms
+        self.max_page_size = max_page_size
+        self.requests = []
+
+    def get(self, route, params=None):
+        params = dict(params or [])
+        self.requests.append((route, params))
+        objects = {
+            "dcim/devices/": self.devices, "dcim/platforms/": self.platforms
+        }[route]
+        objects = [
+            o for o in objects
+            if o.get("site", params.get("site")) == params.get("site")
+        ]
+
+        limit = min(params["limit"], self.max_page_size)
+        offset = params["offset"]
+        return {
+            "count": len(objects),
+            "next": "next" if len(objects) > offset + limit else None,
+            "results": objects[offset:offset + limit],
+        }
+
+
+class TestFilterDevicesSource():
+
+    @pytest.fixture(autouse=True)
+    def netbox_api(self, monkeypatch):
+        platforms = [
+            {"id": i, "napalm_driver": "", "napalm_args": None}
+            for i in range(1, 5)
+        ]
+        platforms.append(
+            {"id": 5, "napalm_driver": "ios", "napalm_args": {"a": 1}}
+        )
+        devices = [
+            {
+                "name": "switch{}".format(i), "site": "site1",
+                "platform": {"id": 5}, "primary_ip": None,
+            } for i in range(7)
+        ]
+        devices[1]["platform"] = {"id": 1}
+        devices[2]["platform"] = None
+        devices[3]["primary_ip"] = {"address": "10.0.0.3/24"}
+        devices.append({"name": "other", "site": "site2"})
+
+        self.netbox_api = FakeNetboxAPI(devices, platforms, max_page_size=2)
+        monkeypatch.setattr(
+            devices_list, "get_netbox_api", lambda: self.netbox_api
+        )
+
+    def test_items(self):
+        source = FilterDevicesSource(
+            {"site": "site1"}, discovery_protocols={"ios": "cdp"},
+            neighbours_policies={"ios": "union"}, creds=("user", "password"),
+            page_size=3
+        )
+
+        devices = dict(source.items())
+
+        assert sorted(devices) == [
+            "switch0", "switch3", "switch4", "switch5", "switch6"
+        ]
+        assert devices["switch0"].target == "switch0"
+        assert devices["switch3"].target == "10.0.0.3"
+        assert devices["switch3"].optional_args == {"a": 1}
+        assert devices["switch3"].discovery_protocol == "cdp"
+        assert devices["switch3"].neighbours_policy == "union"
+        assert (source.enumerated, source.skipped) == (7, 2)
+
+        # netbox capped pages to 2 results, and every page has been read
+        device_pages = [
+            p["offset"] for r, p in self.netbox_api.requests
+            if r == "dcim/devices/"
+        ]
+        assert device_pages == [0, 2, 4, 6]
+
+    def test_items_streamed(self):
+        source = FilterDevicesSource({"site": "site1"})
+
+        items = source.items()
+        assert next(items)[0] == "switch0"
+        assert len([
+            r for r, _ in self.netbox_api.requests if r == "dcim/devices/"
+        ]) == 1
+
+    def test_platforms_fetched_once(self):
+        source = FilterDevicesSource({"site": "site1"})
+
+        for i in range(2):
+            list(source.items())
+
+        assert len([
+            r for r, _ in self.netbox_api.requests if r == "dcim/platforms/"
+        ]) == 3
@@ -0,0 +1,223 @@
+import threading
+import time
+
+import pytest
+
+from netbox_netdev_inventory.engine import (
+    async_poll_and_push, PipelineStats, threaded_poll_and_push
+)
+
+
+class FakeImporter():
+
+    def __init__(self, props=None, error=None):
+        self.props = props
+        self.error = error
+        self.opened = False
+        self.closed = False
+
+    def build_importer(self):
+        return self
+
+    def __enter__(self):
+        self.opened = True
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def poll(self):
+        time.sleep(0.01)
+        if self.error:
+            raise self.error
+        return self.props
+
+
+class ConcurrencyCounter():
+
+    def __init__(self):
+        self.current = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.max = max(self.max, self.current)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.current -= 1
+
+
+def test_async_poll_and_push():
+    importers = {
+        "switch{}".format(i): FakeImporter({"serial": i}) for i in range(20)
+    }
+    importers["broken"] = FakeImporter(error=ValueError("broken"))
+    pushes = ConcurrencyCounter()
+
+    def push(host, props):
+        with pushes:
+            time.sleep(0.01)
+            assert importers[host].closed
+            return props["serial"]
+
+    stats = PipelineStats()
+    results = dict(async_poll_and_push(
+        importers, push, device_concurrency=5, netbox_concurrency=2,
+        stats=stats
+    ))
+
+    assert len(results) == 21
+    assert isinstance(results.pop("broken"), ValueError)
+    assert results == {
+        "switch{}".format(i): i for i in range(20)
+    }
+    assert pushes.max == 2
+    assert len(stats.latencies["poll"]) == 21
+    assert len(stats.latencies["push"]) == 20
+
+
+def test_async_poll_and_push_interrupted():
+    importers = {
+        "switch{}".format(i): FakeImporter({}) for i in range(10)
+    }
+
+    results = async_poll_and_push(importers, lambda host, props: host)
+    next(results)
+    results.close()
+
+    with pytest.raises(StopIteration):
+        next(results)
+
+
+def test_async_poll_and_push_backpressure():
+    importers = {
+        "switch{}".format(i): FakeImporter({}) for i in range(20)
+    }
+    streamed = StreamedImporters(importers)
+    release_push = threading.Event()
+    read_before_push = []
+
+    def push(host, props):
+        release_push.wait()
+        return host
+
+    def release():
+        time.sleep(0.2)
+        read_before_push.append(streamed.read)
+        release_push.set()
+    threading.Thread(target=release).start()
+
+    stats = PipelineStats()
+    results = async_poll_and_push(
+        streamed, push, device_concurrency=5, netbox_concurrency=1,
+        queue_size=2, stats=stats
+    )
+
+    assert len(list(results)) == 20
+    assert stats.max_queue_depth <= 2
+    # 5 polled or waiting for room in the queue, 2 queued and 1 pushed: the
+    # other devices were not read while the push was blocked
+    assert read_before_push == [8]
+
+
+def test_threaded_poll_and_push():
+    importers = {
+        "switch{}".format(i): FakeImporter({"serial": i}) for i in range(20)
+    }
+    importers["broken"] = FakeImporter(error=ValueError("broken"))
+    pushes = ConcurrencyCounter()
+
+    def push(host, props):
+        with pushes:
+            time.sleep(0.01)
+            assert importers[host].closed
+            if props["serial"] == 3:
+                raise ValueError("push error")
+            return props["serial"]
+
+    stats = PipelineStats()
+    results = dict(threaded_poll_and_push(
+        importers, push, pollers=5, pushers=2, stats=stats
+    ))
+
+    assert len(results) == 21
+    assert isinstance(results.pop("broken"), ValueError)
+    assert isinstance(results.pop("switch3"), ValueError)
+    assert results == {
+        "switch{}".format(i): i for i in range(20) if i != 3
+    }
+    assert pushes.max == 2
+    assert len(stats.latencies["poll"]) == 21
+    assert len(stats.latencies["queue"]) == 20
+    assert len(stats.latencies["push"]) == 20
+
+
+def test_threaded_poll_and_push_backpressure():
+    importers = {
+        "switch{}".format(i): FakeImporter({}) for i in range(10)
+    }
+    release_push = threading.Event()
+
+    def push(host, props):
+        release_push.wait()
+        return host
+
+    stats = PipelineStats()
+    results = threaded_poll_and_push(
+        importers, push, pollers=5, pushers=1, queue_size=2, stats=stats
+    )
+
+    def release():
+        time.sleep(0.2)
+        release_push.set()
+    threading.Thread(target=release).start()
+
+    assert len(list(results)) == 10
+    # one device being pushed and 2 queued: polling waited for the pusher
+    assert stats.max_queue_depth <= 2
+    assert max(stats.latencies["queue"]) >= 0.1
+
+
+def test_threaded_poll_and_push_interrupted():
+    importers = {
+        "switch{}".format(i): FakeImporter({}) for i in range(10)
+    }
+
+    results = threaded_poll_and_push(
+        importers, lambda host, props: host, pollers=2, pushers=1,
+        queue_size=1
+    )
+    next(results)
+    results.close()
+
+    with pytest.raises(StopIteration):
+        next(results)
+
+
+class StreamedImporters():
+
+    def __init__(self, importers):
+        self.importers = importers
+        self.read = 0
+
+    def items(self):
+        for host, importer in self.importers.items():
+            time.sleep(0.005)
+            self.read += 1
+            yield host, importer
+
+
+@pytest.mark.parametrize("engine", (async_poll_and_push, threaded_poll_and_push))
+def test_poll_and_push_streamed(engine):
+    importers = {
+        "switch{}".format(i): FakeImporter({"serial": i}) for i in range(10)
+    }
+
+    results = dict(engine(
+        StreamedImporters(importers), lambda host, props: props["serial"]
+    ))
+
+    assert results == {"switch{}".format(i): i for i in range(10)}
@@ -94,6 +94,17 @@ class TestIOSImporter(BaseTestImporter):
 
         assert interfaces == json.loads(data)
 
+    def test_get_interfaces_lag_one_command(self, mocker, monkeypatch):
+        self.stub_get_interface_type(monkeypatch)
+        with self.importer:
+            cli = mocker.spy(self.importer.device, "cli")
+            interfaces = self.importer.get_interfaces()
+
+        commands = [args[0][0] for args, _ in cli.call_args_list]
+        assert commands.count("show running-config | section ^interface") == 1
+        assert not [c for c in commands if c.startswith("show run interface")]
+        assert interfaces["TenGigabitEthernet1/1/1"]["lag"] == "Port-channel10"
+
 class TestNXOSImporter(BaseTestImporter):
     profile = "nxos"
     path = "mock_driver/global/cisco/nxos/"
@@ -203,3 +214,26 @@ class TestJunOSImporter(BaseTestImporter):
             interfaces["ge-0/0/1"]["mac_address"].upper() ==
             "CC:46:D6:6E:0F:79"
         )
+
+    def test_get_interfaces_lag(self, monkeypatch):
+        self.stub_get_interface_type(monkeypatch)
+        with self.importer:
+            interfaces = self.importer.get_interfaces()
+
+        assert interfaces["ge-0/0/0"]["lag"] == "ae10"
+        assert interfaces["ge-0/0/1"]["lag"] == "ae10"
+        assert "lag" not in interfaces["ge-1/0/0"]
+        assert interfaces["ae10"]["type"] == "Link Aggregation Group (LAG)"
+
+    def test_get_interfaces_switching(self, monkeypatch):
+        self.stub_get_interface_type(monkeypatch)
+        with self.importer:
+            interfaces = self.importer.get_interfaces()
+
+        assert interfaces["ae10"]["mode"] == "Tagged"
+        assert interfaces["ae10"]["untagged_vlan"] == 1
+        assert interfaces["ae10"]["tagged_vlans"] == [200, 300]
+        assert interfaces["ge-1/0/0"]["mode"] == "Access"
+        assert interfaces["ge-1/0/0"]["untagged_vlan"] == 200
+        assert interfaces["ge-1/0/1"]["mode"] is None
+        assert interfaces["ge-1/0/1"]["tagged_vlans"] == []
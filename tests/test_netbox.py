@@ -0,0 +1,70 @@
+import pytest
+
+from netbox_netdev_inventory import config, netbox
+from netbox_netdev_inventory.netbox import (
+    build_session, get_netbox_api, RETRY_STATUSES
+)
+
+
+class TestGetNetboxAPI():
+
+    @pytest.fixture(autouse=True)
+    def netbox_config(self, monkeypatch):
+        monkeypatch.setattr(config.get_config, "cache", {
+            "netbox": {
+                "url": "http://netbox.tld/api", "token": "token",
+                "http": {"timeout": 5, "retries": 2},
+            }
+        }, raising=False)
+        monkeypatch.setattr(get_netbox_api, "cache", None, raising=False)
+
+    def test_get_netbox_api(self):
+        netbox_api = get_netbox_api(pool_size=50)
+
+        assert netbox_api.url == "http://netbox.tld/api"
+        assert netbox_api.token == "token"
+        assert netbox_api.session.timeout == 5
+
+        adapter = netbox_api.session.get_adapter("https://netbox.tld/api")
+        assert adapter._pool_maxsize == 50
+        assert adapter.max_retries.total == 2
+        assert adapter.max_retries.backoff_factor == 0.5
+
+    def test_get_netbox_api_pool_size_config(self):
+        config.get_config.cache["netbox"]["http"]["pool_size"] = 20
+        netbox_api = get_netbox_api(pool_size=50)
+
+        adapter = netbox_api.session.get_adapter("https://netbox.tld/api")
+        assert adapter._pool_maxsize == 20
+
+    def test_get_netbox_api_shared(self):
+        assert get_netbox_api(pool_size=50) is get_netbox_api()
+
+
+def test_build_session_retries():
+    session = build_session(retries=4, backoff_factor=1)
+    retry = session.get_adapter("http://netbox.tld/api").max_retries
+
+    assert retry.total == 4
+    assert set(retry.status_forcelist) == set(RETRY_STATUSES)
+    assert retry.is_retry("GET", 503)
+    assert retry.is_retry("PATCH", 429)
+    assert not retry.is_retry("POST", 503)
+
+
+def test_build_session_old_urllib3(monkeypatch):
+    class OldRetry(netbox.Retry):
+        """
+        Retry of urllib3 < 1.26, without `allowed_methods`
+        """
+
+        def __init__(self, method_whitelist=None, **kwargs):
+            if "allowed_methods" in kwargs:
+                raise TypeError("unexpected keyword argument")
+            super().__init__(allowed_methods=method_whitelist, **kwargs)
+
+    monkeypatch.setattr(netbox, "Retry", OldRetry)
+    retry = build_session().get_adapter("http://netbox.tld/api").max_retries
+
+    assert retry.is_retry("PATCH", 503)
+    assert not retry.is_retry("POST", 503)
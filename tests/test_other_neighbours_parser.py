@@ -85,3 +85,88 @@ class TestIOS(TestOtherNeighboursParcer):
     profile = "ios"
     path = "mock_driver/specific/cisco/ios/"
     discovery_protocol = "cdp"
+
+
+class TestMultipleNeighboursPolicies():
+    cdp_neighbours = [
+        {"local_port": "Ethernet1/1", "hostname": "DEV_1", "port": "Eth1/1"},
+        {"local_port": "Ethernet1/2", "hostname": "DEV_1", "port": "Eth1/2"},
+    ]
+    lldp_neighbours = [
+        {
+            "local_port": "Eth1/2", "hostname": "DEV_1", "port": "Eth1/2",
+            "chassis_id": "002a.6ad3.380d",
+        },
+        {
+            "local_port": "Eth1/3", "hostname": "server1", "port": "eth0",
+            "chassis_id": "f898.ef9d.2197",
+        },
+    ]
+
+    def get_multiple_neighbours(self, monkeypatch, neighbours_policy=None):
+        mock_driver = napalm.get_network_driver("mock")
+        monkeypatch.setattr(
+            importer_napalm, "get_network_driver", lambda *args: mock_driver
+        )
+        importer = DeviceImporter(
+            "localhost", "nxos", "foo",
+            napalm_optional_args={
+                "path": os.path.join(BASE_PATH, "mock_driver/specific"),
+                "profile": ["nxos"],
+            },
+            discovery_protocol="multiple",
+            neighbours_policy=neighbours_policy
+        )
+        monkeypatch.setattr(
+            importer, "get_cdp_neighbours", lambda: iter(self.cdp_neighbours)
+        )
+        monkeypatch.setattr(
+            importer, "get_lldp_neighbours",
+            lambda: iter(self.lldp_neighbours)
+        )
+        return list(importer.get_multiple_neighbours())
+
+    def test_prefer_cdp(self, monkeypatch):
+        assert self.get_multiple_neighbours(monkeypatch) == [
+            self.lldp_neighbours[1]
+        ] + self.cdp_neighbours
+
+    def test_prefer_lldp(self, monkeypatch):
+        assert self.get_multiple_neighbours(
+            monkeypatch, "prefer_lldp"
+        ) == [self.cdp_neighbours[0]] + self.lldp_neighbours
+
+    def test_union(self, monkeypatch):
+        assert self.get_multiple_neighbours(monkeypatch, "union") == [
+            self.lldp_neighbours[1],
+            self.cdp_neighbours[0],
+            dict(self.cdp_neighbours[1], chassis_id="002a.6ad3.380d"),
+        ]
+        # neighbours of the parser are not modified
+        assert "chassis_id" not in self.cdp_neighbours[1]
+
+    def test_union_different_neighbours(self, monkeypatch):
+        self.cdp_neighbours = [{
+            "local_port": "Ethernet1/1", "hostname": "DEV_1.foo.tld",
+            "port": "Eth1/1",
+        }]
+        self.lldp_neighbours = [
+            {
+                "local_port": "Eth1/1", "hostname": "DEV_1", "port": "Eth1/1",
+                "chassis_id": "002a.6ad3.380c",
+            },
+            {
+                "local_port": "Eth1/1", "hostname": "server1", "port": "eth0",
+                "chassis_id": "f898.ef9d.2197",
+            },
+        ]
+
+        # the other device seen by LLDP on the same port is kept
+        assert self.get_multiple_neighbours(monkeypatch, "union") == [
+            self.lldp_neighbours[1],
+            dict(self.cdp_neighbours[0], chassis_id="002a.6ad3.380c"),
+        ]
+
+    def test_unknown_policy(self, monkeypatch):
+        with pytest.raises(ValueError):
+            self.get_multiple_neighbours(monkeypatch, "cdp_only")
@@ -25,6 +25,21 @@ class TestIOSParser():
         self.device.open()
         self.parser = IOSParser(self.device)
 
+    def build_other_parser(self):
+        """
+        Parser of the same recorded device, replaying its commands again
+        """
+        device = napalm.get_network_driver("mock")(
+            "localhost", "foo", "bar", optional_args={
+                "path": os.path.join(
+                    BASE_PATH, "mock_driver/specific/cisco/ios"
+                ),
+                "profile": ["ios"],
+            }
+        )
+        device.open()
+        return IOSParser(device)
+
 
     def test_get_interface_type(self):
         assert '1000BASE-T (1GE)' == self.parser.get_interface_type(
@@ -56,3 +71,125 @@ class TestIOSParser():
             data = myfile.read()
 
         assert vlans == json.loads(data)
+
+    def test_get_vlan_commands(self, mocker):
+        cli = mocker.spy(self.device, "cli")
+        list(self.parser.get_vlans())
+
+        assert [args[0] for args, _ in cli.call_args_list] == [
+            ["show vlan all-ports"],
+            ["show vlan brief", "show interfaces trunk"],
+        ]
+
+    def test_parse_vlan_from_brief_same_as_from_id(self, monkeypatch):
+        """
+        Parser test only: `show vlan brief` and `show vlan id` are recorded
+        on the device, but `show interfaces trunk` is hand-written after the
+        `show vlan id` outputs
+        """
+        from_brief = dict(self.parser.get_vlans())
+
+        # replay the recorded `show vlan id` of each VLAN, on the same device
+        parser = self.build_other_parser()
+        monkeypatch.setattr(
+            parser, "_get_vlan_from_brief", parser._get_vlan_from_id
+        )
+        from_id = dict(parser.get_vlans())
+
+        assert from_brief == from_id
+        # Po1 carries VLAN 736, even blocked by the spanning tree
+        assert "Port-channel1" in from_brief["736"]["interfaces"]
+
+    def test_get_vlan_from_id_fallback(self, mocker):
+        cli = self.device.cli
+
+        def cli_without_trunk(commands):
+            trunk = "show interfaces trunk"
+            if trunk not in commands:
+                return cli(commands)
+
+            outputs = cli([c for c in commands if c != trunk])
+            outputs[trunk] = "% Invalid input detected at '^' marker."
+            return outputs
+
+        mocker.patch.object(self.device, "cli", cli_without_trunk)
+        vlans = dict(self.parser.get_vlans())
+
+        assert vlans["760"]["interfaces"][:2] == [
+            "GigabitEthernet0/1", "GigabitEthernet0/2"
+        ]
+
+    def test_get_vlan_unknown_port(self, monkeypatch, caplog):
+        get_abrev_if = self.parser.get_abrev_if
+        # Gi0/1 is not matched by any interface of napalm
+        monkeypatch.setattr(
+            self.parser, "get_abrev_if",
+            lambda i: "" if i == "GigabitEthernet0/1" else get_abrev_if(i)
+        )
+
+        vlans = dict(self.parser.get_vlans())
+
+        assert vlans["760"]["interfaces"][:2] == [
+            "GigabitEthernet0/2", "GigabitEthernet0/3"
+        ]
+        assert "unknown port Gi0/1" in caplog.text
+
+    def test_parse_vlan_brief_wrapped(self):
+        vlans = self.parser._parse_vlan_brief(
+            "VLAN Name                             Status    Ports\n"
+            "---- -------------------------------- --------- ----------\n"
+            "1    default                          active    Gi0/1, Gi0/2\n"
+            "                                                Gi0/3\n"
+            "10   users                            active\n"
+        )
+
+        assert list(vlans.items()) == [
+            ("1", ("default", ["Gi0/1", "Gi0/2", "Gi0/3"])),
+            ("10", ("users", [])),
+        ]
+
+    def test_get_state_token(self):
+        assert self.parser.get_state_token() == (
+            "! Last configuration change at 10:12:44 UTC Tue Jun 4 2019 by "
+            "admin"
+        )
+
+    def test_prefetch_commands(self, monkeypatch):
+        sent = []
+
+        def cli(commands):
+            sent.append(commands)
+            return {cmd: "output of {}".format(cmd) for cmd in commands}
+
+        monkeypatch.setattr(self.device, "cli", cli)
+        self.parser.prefetch_commands()
+        assert sent == [list(IOSParser.poll_commands)]
+
+        assert self.parser._cli("show vlan all-ports") == (
+            "output of show vlan all-ports"
+        )
+        assert len(sent) == 1
+        # outputs are only used once, then sent again
+        self.parser._cli("show vlan all-ports")
+        assert sent[-1] == ["show vlan all-ports"]
+
+    def test_prefetch_commands_error(self, monkeypatch):
+        def cli(commands):
+            if len(commands) > 1:
+                raise ValueError()
+            return {cmd: "output" for cmd in commands}
+
+        monkeypatch.setattr(self.device, "cli", cli)
+        self.parser.prefetch_commands()
+
+        assert self.parser._cli("show interface status") == "output"
+
+    def test_cache_cleared_on_close(self, mocker):
+        cli = mocker.spy(self.device, "cli")
+        self.parser.get_interface_type("GigabitEthernet1/0/24")
+        self.parser.get_interface_type("GigabitEthernet1/0/28")
+        assert cli.call_count == 1
+        assert self.parser.cache.hits == 1
+
+        self.parser.close()
+        assert self.parser.cache.get_or_fetch("ifstatus", dict) == {}
@@ -0,0 +1,145 @@
+import os
+import lxml.etree
+import napalm
+import pytest
+from defusedxml import DTDForbidden
+
+from netbox_netdev_inventory.vendors.juniper import JunOSParser
+from netbox_netdev_inventory.vendors.juniper.base import iter_xml_elements
+
+BASE_PATH = os.path.dirname(__file__)
+
+
+def build_mock_device(path):
+    driver = napalm.get_network_driver("mock")
+
+    optional_args = {
+        "path": os.path.join(BASE_PATH, path),
+        "profile": ["junos"],
+    }
+    device = driver("localhost", "foo", "bar", optional_args=optional_args)
+    device.open()
+    return device
+
+
+class TestJunOSParser():
+    device = None
+
+    @pytest.fixture(autouse=True)
+    def build_device(self, monkeypatch):
+        self.device = build_mock_device("mock_driver/specific/juniper/junos")
+        self.parser = JunOSParser(self.device)
+
+    def test_get_state_token(self):
+        assert self.parser.get_state_token() == "0 2019-06-04 10:12:44 UTC"
+
+    def test_get_interface_type(self):
+        assert self.parser.get_interface_type("ge-0/0/12") == (
+            "1000BASE-T (1GE)"
+        )
+        assert self.parser.get_interface_type("et-0/1/0") == "QSFP+ (40GE)"
+        assert self.parser.get_interface_type("xe-0/2/0") == "SFP+ (10GE)"
+        assert self.parser.get_interface_type("ge-0/2/1") == "SFP (1GE)"
+        # no transceiver in this port
+        assert self.parser.get_interface_type("xe-0/2/3") == "Other"
+        assert self.parser.get_interface_type("xe-1/0/0") == "Other"
+
+    def test_get_pics_by_slot_one_rpc(self, mocker):
+        rpc = mocker.spy(self.device, "cli")
+        for port in range(4):
+            self.parser.get_interface_type("xe-0/2/{}".format(port))
+
+        assert rpc.call_count == 1
+        assert self.parser._get_pics_by_slot()[(0, 2)] == {
+            "type": "4x 1G/10G SFP/SFP+",
+            "ports": {0: "SFP+-10G-SR", 1: "SFP-SX"},
+        }
+
+    def test_get_interface_type_mic(self):
+        """
+        PICs of MIC-based chassis are in a MIC, one level deeper
+        """
+        self.parser = JunOSParser(
+            build_mock_device("mock_driver/specific/juniper/junos_mic")
+        )
+
+        assert self.parser._get_pics_by_slot() == {
+            (1, 0): {
+                "type": "10x 1GE(LAN) SFP",
+                "ports": {0: "SFP-SX", 1: "SFP-LX10"},
+            },
+            (1, 1): {"type": "10x 1GE(LAN) SFP", "ports": {}},
+            (1, 2): {"type": "1x 10GE XFP", "ports": {0: "XFP-10G-LR"}},
+            (1, 3): {"type": "1x 10GE XFP", "ports": {}},
+        }
+        assert self.parser.get_interface_type("ge-1/0/0") == "SFP (1GE)"
+        assert self.parser.get_interface_type("ge-1/0/1") == "SFP (1GE)"
+        assert self.parser.get_interface_type("xe-1/2/0") == "XFP (10GE)"
+
+    def test_get_switching_els(self):
+        """
+        ELS switches reply with the l2ng schema, each VLAN nested in the
+        entry of its interface
+        """
+        self.parser = JunOSParser(
+            build_mock_device("mock_driver/specific/juniper/junos_els")
+        )
+
+        assert self.parser._get_switching_by_if() == {
+            "ae10": {"mode": "trunk", "untagged_vlan": 1, "vlans": [
+                1, 200, 300
+            ]},
+            "ge-0/0/2": {
+                "mode": "access", "untagged_vlan": 200, "vlans": [200]
+            },
+        }
+        assert self.parser.get_interface_netive_vlan("ae10") == 1
+        assert self.parser.get_interface_access_vlan("ge-0/0/2") == 200
+
+    def test_rpc_reply_pyez(self, mocker):
+        """
+        The reply element of PyEZ is walked, not serialized and parsed again
+        """
+        reply = lxml.etree.fromstring(
+            "<interface-information><physical-interface>"
+            "<name>xe-0/0/0</name><logical-interface>"
+            "<name>xe-0/0/0.32767</name><address-family>"
+            "<ae-bundle-name>ae1.0</ae-bundle-name>"
+            "</address-family></logical-interface>"
+            "</physical-interface></interface-information>"
+        )
+        self.device.device = mocker.Mock()
+        self.device.device.execute.return_value = reply
+        rpc = mocker.spy(self.device, "_rpc")
+
+        assert self.parser.get_interfaces_lag(["xe-0/0/0"]) == {
+            "xe-0/0/0": "ae1"
+        }
+        assert not rpc.called
+        request = self.device.device.execute.call_args[0][0]
+        assert request.tag == "get-interface-information"
+        # freed once handled
+        assert not len(reply.find("physical-interface"))
+
+    def test_get_detailed_lldp_neighbours(self):
+        assert list(self.parser.get_detailed_lldp_neighbours()) == [
+            {
+                "local_port": "ge-0/0/0", "hostname": "switch-2.foo.tld",
+                "port": "xe-1/0/4", "chassis_id": "cc:46:d6:6e:0f:00",
+            },
+            {
+                "local_port": "ge-0/0/1", "hostname": "switch-2.foo.tld",
+                "port": "xe-1/0/5", "chassis_id": "cc:46:d6:6e:0f:00",
+            },
+        ]
+
+
+def test_iter_xml_elements_doctype():
+    xml = (
+        '<?xml version="1.0"?>'
+        '<!DOCTYPE rpc-reply [<!ENTITY name "expanded">]>'
+        '<rpc-reply><interface><name>&name;</name></interface></rpc-reply>'
+    )
+
+    with pytest.raises(DTDForbidden):
+        list(iter_xml_elements(xml, "interface"))
@@ -161,3 +161,31 @@ class TestNXOSParser():
         ]
         assert len([x for x in self.parser.get_detailed_lldp_neighbours()
                     if x not in must]) == 0
+
+    def test_parse_ports(self):
+        assert self.parser._parse_ports(
+            "Ethernet1/1-3, port-channel10-11,Ethernet101/1/2"
+        ) == [
+            "Ethernet1/1", "Ethernet1/2", "Ethernet1/3", "port-channel10",
+            "port-channel11", "Ethernet101/1/2",
+        ]
+        assert self.parser._parse_ports(["Ethernet1/1-2", "mgmt0"]) == [
+            "Ethernet1/1", "Ethernet1/2", "mgmt0"
+        ]
+        assert self.parser._parse_ports("") == []
+
+    def test_get_interface_vlans(self, monkeypatch):
+        vlans = [
+            ("4094", {"name": "last", "interfaces": ["Ethernet1/1"]}),
+            ("1", {"name": "default", "interfaces": ["Ethernet1/1"]}),
+            ("200", {
+                "name": "Vlan200", "interfaces": ["Ethernet1/1", "Ethernet1/2"]
+            }),
+        ]
+        monkeypatch.setattr(self.parser, "get_vlans", lambda: iter(vlans))
+
+        assert self.parser.get_interface_vlans("Ethernet1/1") == [
+            "4094", "1", "200"
+        ]
+        assert self.parser.get_interface_vlans("Ethernet1/2") == ["200"]
+        assert self.parser.get_interface_vlans("Ethernet1/3") is None
@@ -0,0 +1,678 @@
+import copy
+import json
+import re
+
+import pytest
+import requests
+from requests.exceptions import HTTPError
+
+from netbox_netdev_inventory.cache import (
+    ChoicesRegistry, CommandsCache, SiteVlansIndex
+)
+from netbox_netdev_inventory.exceptions import NetIfPushingError
+from netbox_netdev_inventory.push import NetboxDevicePropsPusher
+from netbox_netdev_inventory.writer import NetboxWriter
+
+
+NETBOX_URL = "http://netbox.tld/api"
+
+CHOICES = {
+    "interface:type": [
+        {"value": 0, "label": "Virtual"},
+        {"value": 200, "label": "Link Aggregation Group (LAG)"},
+        {"value": 1000, "label": "1000BASE-T (1GE)"},
+        {"value": 1200, "label": "SFP+ (10GE)"},
+        {"value": 32767, "label": "Other"},
+    ],
+    "interface:mode": [
+        {"value": 100, "label": "Access"},
+        {"value": 200, "label": "Tagged"},
+    ],
+}
+
+#: foreign keys of each model, with the model they point to
+FOREIGN_KEYS = {
+    "dcim/devices": {
+        "site": "dcim/sites", "primary_ip4": "ipam/ip-addresses",
+        "primary_ip6": "ipam/ip-addresses",
+    },
+    "dcim/interfaces": {
+        "device": "dcim/devices", "lag": "dcim/interfaces",
+        "untagged_vlan": "ipam/vlans",
+    },
+    "ipam/ip-addresses": {"interface": "dcim/interfaces"},
+    "ipam/vlans": {"site": "dcim/sites"},
+}
+
+
+#: default values set by netbox on new objects
+DEFAULTS = {
+    "dcim/interfaces": {
+        "enabled": True, "description": "", "mac_address": None,
+        "mtu": None, "form_factor": 1000, "mode": None, "lag": None,
+        "untagged_vlan": None, "tagged_vlans": [],
+    },
+    "ipam/ip-addresses": {"interface": None, "description": ""},
+}
+
+
+class FakeNetboxAPI():
+    """
+    Minimal in-memory netbox, answering like the netbox API would
+    """
+
+    def __init__(self):
+        self.url = NETBOX_URL
+        self.api_version = "2.5"
+        self.objects = {}
+        self.requests = []
+        self._last_id = 0
+
+    def _generic_http_method_request(self, method, route, **kwargs):
+        self.requests.append((method, route))
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["API-Version"] = self.api_version
+        return response
+
+    def build_model_route(self, app_name, model):
+        return "{}/{}/".format(app_name, model)
+
+    def add(self, model, **props):
+        self._last_id += 1
+        obj = {"id": self._last_id}
+        obj.update(copy.deepcopy(DEFAULTS.get(model, {})))
+        obj.update(props)
+        self.objects.setdefault(model, {})[obj["id"]] = obj
+        return obj
+
+    def _split_route(self, route):
+        app_name, model, *params = [r for r in route.split("/") if r]
+        return "{}/{}".format(app_name, model), params
+
+    def _serialize(self, model, obj):
+        obj = copy.deepcopy(obj)
+        for fk, fk_model in FOREIGN_KEYS.get(model, {}).items():
+            if obj.get(fk) is not None:
+                obj[fk] = {
+                    "id": obj[fk],
+                    "url": "{}/{}/{}/".format(self.url, fk_model, obj[fk])
+                }
+        if model == "dcim/interfaces":
+            obj["tagged_vlans"] = [
+                {"id": vid} for vid in obj.get("tagged_vlans", [])
+            ]
+            for choice_attr, choice_id in (
+                    ("form_factor", "interface:type"),
+                    ("mode", "interface:mode")
+            ):
+                for choice in CHOICES[choice_id]:
+                    if choice["value"] == obj.get(choice_attr):
+                        obj[choice_attr] = choice
+
+        return obj
+
+    def _match(self, model, obj, params):
+        for k, v in params:
+            if k in ("limit", "offset"):
+                continue
+            if k == "q":
+                if v not in obj.get("address", ""):
+                    return False
+                continue
+            values = v if isinstance(v, (list, tuple)) else [v]
+            if model == "ipam/ip-addresses" and k == "device_id":
+                interface = self.objects["dcim/interfaces"].get(
+                    obj["interface"], {}
+                )
+                if str(interface.get("device")) not in map(str, values):
+                    return False
+                continue
+            if k == "address":
+                # without prefix length, only the host is matched
+                if not any(
+                    obj["address"] == value or
+                    obj["address"].split("/")[0] == value
+                    for value in values
+                ):
+                    return False
+                continue
+
+            attr = re.sub("_id$", "", k)
+            if attr not in obj:
+                return False
+            if str(obj[attr]) not in [str(value) for value in values]:
+                return False
+
+        return True
+
+    def get(self, route, params=None):
+        self.requests.append(("get", route))
+        model, args = self._split_route(route)
+        if model == "dcim/_choices":
+            return copy.deepcopy(CHOICES)
+
+        if args:
+            return self._serialize(
+                model, self.objects[model][int(args[0])]
+            )
+
+        params = dict(params or {})
+        limit, offset = params.get("limit", 50), params.get("offset", 0)
+        results = [
+            self._serialize(model, obj)
+            for obj in self.objects.get(model, {}).values()
+            if self._match(model, obj, params.items())
+        ]
+        return {
+            "count": len(results),
+            "next": "next" if len(results) > offset + limit else None,
+            "results": results[offset:offset + limit],
+        }
+
+    def post(self, route, json=None):
+        self.requests.append(("post", route))
+        model, _ = self._split_route(route)
+        if isinstance(json, list):
+            return [self._serialize(model, self.add(model, **o)) for o in json]
+
+        return self._serialize(model, self.add(model, **json))
+
+    def put(self, route, json=None):
+        self.requests.append(("put", route))
+        model, args = self._split_route(route)
+        self.objects[model][int(args[0])].update(json)
+        return self._serialize(model, self.objects[model][int(args[0])])
+
+    def patch(self, route, json=None):
+        self.requests.append(("patch", route))
+        model, args = self._split_route(route)
+        if isinstance(json, list):
+            return [self._patch_obj(model, o["id"], o) for o in json]
+
+        return self._patch_obj(model, int(args[0]), json)
+
+    def _patch_obj(self, model, obj_id, json):
+        self.objects[model][obj_id].update(
+            {k: v for k, v in json.items() if k != "id"}
+        )
+        return self._serialize(model, self.objects[model][obj_id])
+
+    def delete(self, route):
+        self.requests.append(("delete", route))
+        model, args = self._split_route(route)
+        self.objects[model].pop(int(args[0]))
+
+
+@pytest.fixture(autouse=True)
+def clear_choices_registries():
+    ChoicesRegistry.clear_registries()
+    yield
+    ChoicesRegistry.clear_registries()
+
+
+@pytest.fixture(autouse=True)
+def clear_bulk_support():
+    NetboxWriter.clear_bulk_support()
+    yield
+    NetboxWriter.clear_bulk_support()
+
+
+def polled_interface(**props):
+    interface = {
+        "enabled": True, "description": "", "mac_address": None,
+        "mtu": None, "type": "1000BASE-T (1GE)", "mode": None,
+        "untagged_vlan": None, "tagged_vlans": [],
+    }
+    interface.update(props)
+    return interface
+
+
+class TestNetboxDevicePropsPusher():
+    netbox_api = None
+    device = None
+
+    @pytest.fixture(autouse=True)
+    def build_netbox(self):
+        self.netbox_api = FakeNetboxAPI()
+        site = self.netbox_api.add("dcim/sites", name="site1")
+        self.device = self.netbox_api.add(
+            "dcim/devices", name="switch1", site=site["id"], serial="",
+            primary_ip4=None, primary_ip6=None
+        )
+
+    def add_interface(self, name, **props):
+        return self.netbox_api.add(
+            "dcim/interfaces", device=self.device["id"], name=name, **props
+        )
+
+    def push(self, interfaces, **kwargs):
+        pusher = NetboxDevicePropsPusher(
+            self.netbox_api, "switch1", {"interfaces": interfaces}, **kwargs
+        )
+        pusher.push()
+        return pusher
+
+    def test_push_interfaces_fetched_once(self):
+        interfaces = {}
+        for i in range(120):
+            name = "Ethernet1/{}".format(i)
+            self.add_interface(name)
+            interfaces[name] = polled_interface()
+
+        pusher = self.push(interfaces)
+
+        interfaces_listing = [
+            r for r in self.netbox_api.requests
+            if r == ("get", "dcim/interfaces/")
+        ]
+        # one listing, paginated by 50
+        assert len(interfaces_listing) == 3
+        assert pusher.requests_count == len(self.netbox_api.requests)
+
+    def test_push_interfaces_create_missing(self):
+        self.add_interface("Ethernet1/1")
+
+        self.push({
+            "Ethernet1/1": polled_interface(),
+            "Ethernet1/2": polled_interface(description="new"),
+        })
+
+        pushed = {
+            i["name"]: i
+            for i in self.netbox_api.objects["dcim/interfaces"].values()
+        }
+        assert sorted(pushed) == ["Ethernet1/1", "Ethernet1/2"]
+        assert pushed["Ethernet1/2"]["description"] == "new"
+
+    def test_push_interfaces_overwrite_clean_unmatched(self):
+        self.add_interface("Ethernet1/1")
+        self.add_interface("Ethernet1/2")
+
+        self.push({"Ethernet1/1": polled_interface()}, overwrite=True)
+
+        pushed = [
+            i["name"]
+            for i in self.netbox_api.objects["dcim/interfaces"].values()
+        ]
+        assert pushed == ["Ethernet1/1"]
+
+    def test_push_interfaces_unchanged(self):
+        self.add_interface("Ethernet1/1", description="uplink", mtu=9000)
+
+        pusher = self.push({
+            "Ethernet1/1": polled_interface(description="uplink", mtu=9000),
+        })
+
+        assert not [c for c in pusher.changes if c["model"] == "interfaces"]
+        assert not [
+            r for r in self.netbox_api.requests if r[0] in ("put", "patch")
+        ]
+
+    def test_push_interfaces_patch_only_changed_fields(self):
+        interface = self.add_interface(
+            "Ethernet1/1", description="uplink", mac_address="00:00:00:00:00:AA"
+        )
+
+        pusher = self.push({
+            "Ethernet1/1": polled_interface(
+                description="downlink", mac_address="00:00:00:00:00:aa"
+            ),
+        })
+
+        assert pusher.changes == [{
+            "action": "update", "model": "interfaces", "name": "Ethernet1/1",
+            "fields": {"description": "downlink"}
+        }]
+        assert ("patch", "dcim/interfaces/") in self.netbox_api.requests
+        assert interface["description"] == "downlink"
+
+    def test_push_interfaces_lag(self):
+        self.add_interface("Ethernet1/1")
+        lag = self.add_interface("port-channel1", form_factor=200)
+
+        self.push({
+            "Ethernet1/1": polled_interface(lag="port-channel1"),
+            "port-channel1": polled_interface(
+                type="Link Aggregation Group (LAG)"
+            ),
+        })
+        pusher = self.push({
+            "Ethernet1/1": polled_interface(lag="port-channel1"),
+            "port-channel1": polled_interface(
+                type="Link Aggregation Group (LAG)"
+            ),
+        })
+
+        interfaces = {
+            i["name"]: i
+            for i in self.netbox_api.objects["dcim/interfaces"].values()
+        }
+        assert interfaces["Ethernet1/1"]["lag"] == lag["id"]
+        assert not pusher.changes
+
+    def test_push_dry_run(self):
+        self.add_interface("Ethernet1/1")
+        self.add_interface("Ethernet1/3")
+
+        pusher = self.push({
+            "Ethernet1/1": polled_interface(description="changed"),
+            "Ethernet1/2": polled_interface(),
+        }, overwrite=True, dry_run=True)
+
+        assert sorted(
+            (c["action"], c["name"]) for c in pusher.changes
+        ) == [
+            ("create", "Ethernet1/2"), ("delete", "Ethernet1/3"),
+            ("update", "Ethernet1/1"),
+        ]
+        assert not [r for r in self.netbox_api.requests if r[0] != "get"]
+
+    def test_push_interfaces_bulk_create(self):
+        pusher = self.push({
+            "Ethernet1/{}".format(i): polled_interface() for i in range(5)
+        }, batch_size=2)
+
+        assert len(self.netbox_api.objects["dcim/interfaces"]) == 5
+        assert len([
+            r for r in self.netbox_api.requests
+            if r == ("post", "dcim/interfaces/")
+        ]) == 3
+        assert len([c for c in pusher.changes if c["action"] == "create"]) == 5
+
+    def test_push_interfaces_bulk_error(self, monkeypatch):
+        def post(route, **kwargs):
+            response = requests.Response()
+            response.status_code = 400
+            response._content = json.dumps(
+                [{}, {"mtu": ["Ensure this value is greater than 1."]}]
+            ).encode()
+            raise HTTPError("400 Client Error", response=response)
+
+        monkeypatch.setattr(self.netbox_api, "post", post)
+
+        with pytest.raises(NetIfPushingError) as exc_info:
+            self.push({
+                "Ethernet1/1": polled_interface(),
+                "Ethernet1/2": polled_interface(mtu=0),
+            })
+
+        assert exc_info.value.netif_name == "Ethernet1/2"
+
+    def test_push_interfaces_bulk_update_unsupported(self, monkeypatch):
+        patch = self.netbox_api.patch
+
+        def patch_detail_only(route, json=None):
+            if isinstance(json, list):
+                self.netbox_api.requests.append(("patch", route))
+                response = requests.Response()
+                response.status_code = 405
+                raise HTTPError("405 Method Not Allowed", response=response)
+            return patch(route, json=json)
+
+        monkeypatch.setattr(self.netbox_api, "patch", patch_detail_only)
+        for i in range(4):
+            self.add_interface("Ethernet1/{}".format(i), mtu=1500)
+
+        for mtu in (9000, 1500):
+            self.push({
+                "Ethernet1/{}".format(i): polled_interface(mtu=mtu)
+                for i in range(4)
+            }, batch_size=2)
+
+        assert [
+            o["mtu"]
+            for o in self.netbox_api.objects["dcim/interfaces"].values()
+        ] == [1500] * 4
+        patches = [r for r in self.netbox_api.requests if r[0] == "patch"]
+        # a single bulk update tried for the whole process
+        assert patches.count(("patch", "dcim/interfaces/")) == 1
+        assert len(patches) == 1 + 8
+
+    def test_push_interfaces_bulk_server_error(self, monkeypatch):
+        def patch(route, json=None):
+            response = requests.Response()
+            response.status_code = 500
+            response._content = b"Internal Server Error"
+            raise HTTPError("500 Server Error", response=response)
+
+        monkeypatch.setattr(self.netbox_api, "patch", patch)
+        self.add_interface("Ethernet1/1", mtu=1500)
+
+        # not sent again one by one, as it may have been partially written
+        with pytest.raises(NetIfPushingError):
+            self.push({"Ethernet1/1": polled_interface(mtu=9000)})
+
+    def test_push_interfaces_vlans(self):
+        vlans = {
+            vid: self.netbox_api.add(
+                "ipam/vlans", site=self.device["site"], vid=vid
+            )["id"]
+            for vid in (10, 20, 30)
+        }
+        self.add_interface("Ethernet1/1")
+        vlans_index = SiteVlansIndex(self.netbox_api)
+
+        for i in range(2):
+            self.push({
+                "Ethernet1/1": polled_interface(
+                    mode="Tagged", untagged_vlan="10",
+                    tagged_vlans=["20", "30", "40"]
+                ),
+            }, vlans_index=vlans_index, overwrite=True)
+
+        interface = self.netbox_api.objects["dcim/interfaces"][
+            max(self.netbox_api.objects["dcim/interfaces"])
+        ]
+        assert interface["untagged_vlan"] == vlans[10]
+        assert sorted(interface["tagged_vlans"]) == [vlans[20], vlans[30]]
+        assert (vlans_index.hits, vlans_index.misses) == (7, 1)
+        assert [
+            r for r in self.netbox_api.requests if r[1] == "ipam/vlans/"
+        ] == [("get", "ipam/vlans/")]
+        # the site of the device is not fetched to log the unknown VLAN 40
+        assert not [
+            r for r in self.netbox_api.requests if "dcim/sites" in r[1]
+        ]
+        # unchanged the second time
+        assert len([
+            r for r in self.netbox_api.requests if r[0] == "patch"
+        ]) == 1
+
+    def test_push_interfaces_vlans_without_mode(self):
+        self.netbox_api.add(
+            "ipam/vlans", site=self.device["site"], vid=10
+        )
+        self.add_interface("Ethernet1/1")
+
+        pusher = self.push({
+            "Ethernet1/1": polled_interface(
+                mode="Access", untagged_vlan="10"
+            ),
+        })
+
+        # VLANs are only set with the mode, in overwrite mode
+        assert not pusher.changes
+        assert not [r for r in self.netbox_api.requests if r[0] != "get"]
+
+
+    def test_push_ip_addresses(self):
+        eth1 = self.add_interface("Ethernet1/1")
+        eth2 = self.add_interface("Ethernet1/2")
+        kept = self.netbox_api.add(
+            "ipam/ip-addresses", address="10.0.0.1/24", interface=eth1["id"]
+        )
+        moved = self.netbox_api.add(
+            "ipam/ip-addresses", address="10.0.1.1/24", interface=eth1["id"]
+        )
+        unassigned = self.netbox_api.add(
+            "ipam/ip-addresses", address="10.0.2.1/24"
+        )
+        self.netbox_api.add("ipam/ip-addresses", address="10.0.0.10/24")
+
+        self.push({
+            "Ethernet1/1": polled_interface(ip=["10.0.0.1/24"]),
+            "Ethernet1/2": polled_interface(
+                ip=["10.0.1.1/24", "10.0.2.1/24", "10.0.3.1/24"]
+            ),
+        })
+
+        addresses = {
+            ip["address"]: ip["interface"]
+            for ip in self.netbox_api.objects["ipam/ip-addresses"].values()
+        }
+        assert addresses == {
+            "10.0.0.1/24": eth1["id"], "10.0.1.1/24": eth2["id"],
+            "10.0.2.1/24": eth2["id"], "10.0.3.1/24": eth2["id"],
+            "10.0.0.10/24": None,
+        }
+        assert kept["id"] in self.netbox_api.objects["ipam/ip-addresses"]
+        assert moved["interface"] == unassigned["interface"] == eth2["id"]
+
+        ip_requests = [
+            r for r in self.netbox_api.requests if "ip-addresses" in r[1]
+        ]
+        # device index, search of unknown addresses, bulk create and update
+        assert ip_requests == [
+            ("get", "ipam/ip-addresses/"), ("get", "ipam/ip-addresses/"),
+            ("post", "ipam/ip-addresses/"), ("patch", "ipam/ip-addresses/"),
+        ]
+
+    def test_push_ip_addresses_overwrite(self):
+        eth1 = self.add_interface("Ethernet1/1")
+        eth2 = self.add_interface("Ethernet1/2")
+        kept = self.netbox_api.add(
+            "ipam/ip-addresses", address="10.0.0.1/24", interface=eth1["id"]
+        )
+        self.netbox_api.add(
+            "ipam/ip-addresses", address="10.0.0.2/24", interface=eth1["id"]
+        )
+        moved = self.netbox_api.add(
+            "ipam/ip-addresses", address="10.0.1.1/24", interface=eth2["id"]
+        )
+
+        self.push({
+            "Ethernet1/1": polled_interface(
+                ip=["10.0.0.1/24", "10.0.1.1/24"]
+            ),
+            "Ethernet1/2": polled_interface(ip=["10.0.2.1/24"]),
+        }, overwrite=True)
+
+        addresses = {
+            ip["address"]: ip["interface"]
+            for ip in self.netbox_api.objects["ipam/ip-addresses"].values()
+        }
+        assert addresses == {
+            "10.0.0.1/24": eth1["id"], "10.0.1.1/24": eth1["id"],
+            "10.0.2.1/24": eth2["id"],
+        }
+        assert kept["id"] in self.netbox_api.objects["ipam/ip-addresses"]
+        assert moved["id"] in self.netbox_api.objects["ipam/ip-addresses"]
+
+    def test_push_primary_ip(self):
+        eth1 = self.add_interface("Ethernet1/1")
+        self.netbox_api.add("ipam/ip-addresses", address="10.0.0.10/24")
+        ip = self.netbox_api.add(
+            "ipam/ip-addresses", address="10.0.0.1/24", interface=eth1["id"]
+        )
+
+        pusher = NetboxDevicePropsPusher(
+            self.netbox_api, "switch1", {
+                "interfaces": {"Ethernet1/1": polled_interface()},
+                "primary_ip4": "10.0.0.1", "primary_ip6": "2001:db8::1",
+            }
+        )
+        pusher.push()
+
+        assert self.device["primary_ip4"] == ip["id"]
+        assert self.device["primary_ip6"] is None
+
+    def test_push_choices_fetched_once(self):
+        for i in range(3):
+            self.push({"Ethernet1/1": polled_interface(mtu=1500 + i)})
+
+        assert self.netbox_api.requests.count(("get", "dcim/_choices/")) == 1
+
+
+class TestChoicesRegistry():
+
+    def test_get_value(self):
+        registry = ChoicesRegistry(FakeNetboxAPI())
+
+        assert registry.get_value("interface:type", "SFP+ (10GE)") == 1200
+        with pytest.raises(KeyError):
+            registry.get_value("interface:type", "unknown")
+
+    def test_get_registry_shared(self):
+        netbox_api = FakeNetboxAPI()
+
+        registry = ChoicesRegistry.get_registry(netbox_api)
+        assert ChoicesRegistry.get_registry(FakeNetboxAPI()) is registry
+        assert ChoicesRegistry.get_registry(netbox_api, "ipam") is not registry
+
+    def test_cache_file(self, tmpdir):
+        cache_path = str(tmpdir.join("choices.json"))
+        netbox_api = FakeNetboxAPI()
+
+        for i in range(2):
+            registry = ChoicesRegistry(netbox_api, cache_path=cache_path)
+            assert registry.get_value("interface:mode", "Access") == 100
+        assert netbox_api.requests.count(("get", "dcim/_choices/")) == 1
+
+        netbox_api.api_version = "2.6"
+        registry = ChoicesRegistry(netbox_api, cache_path=cache_path)
+        assert registry.get_value("interface:mode", "Access") == 100
+        assert netbox_api.requests.count(("get", "dcim/_choices/")) == 2
+
+
+class TestSiteVlansIndex():
+
+    def test_ttl(self):
+        netbox_api = FakeNetboxAPI()
+        vlan = netbox_api.add("ipam/vlans", site=1, vid=10)
+        vlans_index = SiteVlansIndex(netbox_api, ttl=0)
+
+        assert vlans_index.get(1, 10) == [vlan["id"]]
+        assert vlans_index.get(1, "10") == [vlan["id"]]
+        assert vlans_index.misses == 2
+
+    def test_invalidate(self):
+        netbox_api = FakeNetboxAPI()
+        vlans_index = SiteVlansIndex(netbox_api)
+
+        assert vlans_index.get(1, 10) == []
+        vlan = netbox_api.add("ipam/vlans", site=1, vid=10)
+        assert vlans_index.get(1, 10) == []
+
+        vlans_index.invalidate(1)
+        assert vlans_index.get(1, 10) == [vlan["id"]]
+
+
+class TestCommandsCache():
+
+    def test_get_or_fetch(self):
+        cache = CommandsCache()
+        fetched = []
+
+        def fetch():
+            fetched.append(1)
+            return {}
+
+        assert cache.get_or_fetch("mode", fetch) == {}
+        # empty results are cached too
+        assert cache.get_or_fetch("mode", fetch) == {}
+        assert len(fetched) == 1
+        assert (cache.hits, cache.misses, cache.refetches) == (1, 1, 0)
+
+        cache.invalidate("mode")
+        cache.get_or_fetch("mode", fetch)
+        assert len(fetched) == 2
+        assert cache.refetches == 1
+
+    def test_clear(self):
+        cache = CommandsCache()
+        cache.get_or_fetch("mode", lambda: 1)
+        cache.clear()
+
+        assert cache.get_or_fetch("mode", lambda: 2) == 2
+        assert (cache.hits, cache.misses, cache.refetches) == (0, 1, 0)
@@ -0,0 +1,81 @@
+import pytest
+
+from netbox_netdev_inventory.exceptions import PollNotCachedError
+from netbox_netdev_inventory.snapshots import PollsCache
+
+
+@pytest.fixture()
+def polls_cache(tmpdir):
+    cache = PollsCache(str(tmpdir.join("polls")))
+    yield cache
+    cache.close()
+
+
+class TestPollsCache():
+    def test_load_last(self, polls_cache):
+        polls_cache.save("switch-1.foo.tld", "props", {"serial": "1"})
+        polls_cache.save("switch-1.foo.tld", "props", {"serial": "2"})
+        polls_cache.save("switch-1.foo.tld", "neighbours", [{"port": "1"}])
+
+        assert polls_cache.load("switch-1.foo.tld", "props") == {
+            "serial": "2"
+        }
+        assert polls_cache.load("switch-1.foo.tld", "neighbours") == [
+            {"port": "1"}
+        ]
+
+    def test_load_before(self, polls_cache, monkeypatch):
+        for timestamp, serial in ((10, "1"), (20, "2")):
+            monkeypatch.setattr(
+                "netbox_netdev_inventory.snapshots.time.time",
+                lambda: timestamp
+            )
+            polls_cache.save("switch-1", "props", {"serial": serial})
+
+        assert polls_cache.load("switch-1", "props", before=15) == {
+            "serial": "1"
+        }
+        with pytest.raises(PollNotCachedError):
+            polls_cache.load("switch-1", "props", before=5)
+
+    def test_load_not_cached(self, polls_cache):
+        polls_cache.save("switch-1", "props", {})
+
+        with pytest.raises(PollNotCachedError):
+            polls_cache.load("switch-2", "props")
+        with pytest.raises(PollNotCachedError):
+            polls_cache.load("switch-1", "neighbours")
+
+    def test_persistence(self, tmpdir):
+        directory = str(tmpdir.join("polls"))
+        polls_cache = PollsCache(directory)
+        polls_cache.save("switch/1", "props", {"interfaces": {"ge-0/0/1": {}}})
+        polls_cache.close()
+
+        polls_cache = PollsCache(directory)
+        try:
+            assert polls_cache.load("switch/1", "props") == {
+                "interfaces": {"ge-0/0/1": {}}
+            }
+        finally:
+            polls_cache.close()
+        assert tmpdir.join("polls", "switch_1.jsonl").check()
+
+    def test_keep_last(self, tmpdir):
+        polls_cache = PollsCache(str(tmpdir.join("polls")), keep=2)
+        try:
+            for serial in range(5):
+                polls_cache.save("switch-1", "props", {"serial": serial})
+                polls_cache.save("switch-1", "neighbours", [serial])
+
+            lines = tmpdir.join("polls", "switch-1.jsonl").readlines()
+            assert len(lines) == 4
+            assert polls_cache.load("switch-1", "props") == {"serial": 4}
+            assert polls_cache.load("switch-1", "neighbours") == [4]
+
+            rows = polls_cache._conn.execute(
+                "SELECT COUNT(*) FROM snapshots"
+            ).fetchone()
+            assert rows == (4,)
+        finally:
+            polls_cache.close()
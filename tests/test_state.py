@@ -0,0 +1,177 @@
+from netbox_netdev_inventory.state import (
+    DevicesState, fingerprint, IncrementalPolling, RunJournal
+)
+
+
+class FakeImporter():
+
+    def __init__(self, props, token=None):
+        self.props = props
+        self.token = token
+        self.polls = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def get_state_token(self):
+        return self.token
+
+    def poll(self):
+        self.polls += 1
+        return self.props
+
+
+class FakeDevice():
+
+    def __init__(self, hostname, importer):
+        self.hostname = hostname
+        self.importer = importer
+
+    def build_importer(self):
+        return self.importer
+
+
+def test_fingerprint():
+    props = {
+        "serial": "ABC",
+        "interfaces": {
+            "Ethernet1/1": {"ip": ["10.0.0.1/24", "10.0.1.1/24"]},
+            "Ethernet1/2": {"tagged_vlans": ["10", "20"]},
+        },
+    }
+    reordered = {
+        "interfaces": {
+            "Ethernet1/2": {"tagged_vlans": ["20", "10"]},
+            "Ethernet1/1": {"ip": ["10.0.1.1/24", "10.0.0.1/24"]},
+        },
+        "serial": "ABC",
+    }
+
+    assert fingerprint(props) == fingerprint(reordered)
+    reordered["serial"] = "DEF"
+    assert fingerprint(props) != fingerprint(reordered)
+
+
+def test_devices_state(tmpdir):
+    path = str(tmpdir.join("state", "state.sqlite"))
+    state = DevicesState(path)
+    assert state.get("switch1") == (None, None)
+
+    state.save("switch1", "hash", "token")
+    state.close()
+
+    assert DevicesState(path).get("switch1") == ("hash", "token")
+
+
+class TestIncrementalPolling():
+
+    def test_poll_unchanged_token(self, tmpdir):
+        incremental = IncrementalPolling(
+            DevicesState(str(tmpdir.join("state.sqlite")))
+        )
+        importer = FakeImporter({"serial": "ABC"}, token="commit 1")
+        device = FakeDevice("switch1", importer)
+
+        props = incremental.poll(device)
+        assert props == {"serial": "ABC"}
+        assert not incremental.is_unchanged("switch1", props)
+        incremental.save("switch1", props)
+
+        assert incremental.poll(device) is None
+        assert importer.polls == 1
+
+        importer.token = "commit 2"
+        assert incremental.poll(device) == {"serial": "ABC"}
+        assert importer.polls == 2
+
+    def test_poll_without_token(self, tmpdir):
+        incremental = IncrementalPolling(
+            DevicesState(str(tmpdir.join("state.sqlite")))
+        )
+        importer = FakeImporter({"serial": "ABC"})
+        device = FakeDevice("switch1", importer)
+
+        incremental.save("switch1", incremental.poll(device))
+
+        props = incremental.poll(device)
+        assert importer.polls == 2
+        assert incremental.is_unchanged("switch1", props)
+        assert not incremental.is_unchanged("switch1", {"serial": "DEF"})
+
+    def test_discard(self, tmpdir):
+        incremental = IncrementalPolling(
+            DevicesState(str(tmpdir.join("state.sqlite")))
+        )
+        importer = FakeImporter({"serial": "ABC"}, token="commit 1")
+        device = FakeDevice("switch1", importer)
+
+        # push failed: the token is forgotten, and the device polled again
+        incremental.poll(device)
+        incremental.discard("switch1")
+        assert not incremental._tokens
+
+        incremental.save("switch1", incremental.poll(device))
+        assert incremental.state.get("switch1")[1] == "commit 1"
+        incremental.close()
+
+
+class FakeDevicesSource():
+
+    def __init__(self, devices):
+        self.devices = devices
+
+    def items(self):
+        return iter(self.devices.items())
+
+
+class TestRunJournal():
+
+    def test_pending(self, tmpdir):
+        path = str(tmpdir.join("journal.sqlite"))
+        journal = RunJournal(path, "run1")
+        journal.mark_done("import", "switch1")
+        journal.mark_done("interconnect", "switch2")
+        journal.close()
+
+        journal = RunJournal(path, "run1")
+        devices = {"switch1": 1, "switch2": 2, "switch3": 3}
+        assert journal.pending("import", devices) == {
+            "switch2": 2, "switch3": 3
+        }
+        assert journal.get_done("interconnect") == {"switch2"}
+
+        streamed = journal.pending("import", FakeDevicesSource(devices))
+        assert sorted(streamed.items()) == [("switch2", 2), ("switch3", 3)]
+
+    def test_other_run(self, tmpdir):
+        path = str(tmpdir.join("journal.sqlite"))
+        RunJournal(path, "run1").mark_done("import", "switch1")
+
+        journal = RunJournal(path, "run2")
+        assert journal.get_done("import") == set()
+        assert journal.pending("import", {"switch1": 1}) == {"switch1": 1}
+
+    def test_prune_old_runs(self, tmpdir, monkeypatch):
+        path = str(tmpdir.join("journal.sqlite"))
+        for i in range(4):
+            monkeypatch.setattr(
+                "netbox_netdev_inventory.state.time.time", lambda: i
+            )
+            journal = RunJournal(path, "run{}".format(i), keep_runs=2)
+            journal.mark_done("import", "switch1")
+            journal.close()
+
+        journal = RunJournal(path, "run0", keep_runs=2)
+        try:
+            runs = journal._conn.execute(
+                "SELECT DISTINCT run_id FROM journal ORDER BY run_id"
+            ).fetchall()
+            assert runs == [("run2",), ("run3",)]
+            assert journal._conn.execute(
+                "PRAGMA journal_mode"
+            ).fetchone() == ("wal",)
+        finally:
+            journal.close()
@@ -1,5 +1,5 @@
 from netbox_netdev_inventory.tools import (
-    is_macaddr, macaddr_to_int
+    NetboxRequestsCounter, in_shard, is_macaddr, macaddr_to_int
 )
 
 class TestTools():
@@ -21,3 +21,52 @@ class TestTools():
 
     def test_is_macaddr_false2(self):
         assert is_macaddr('00:11:22:AA:44:Gg') == False
+
+
+    def test_in_shard_partition(self):
+        hostnames = ["switch{}".format(i) for i in range(100)]
+        shards = [
+            [h for h in hostnames if in_shard(h, [(i, 4)])]
+            for i in range(1, 5)
+        ]
+
+        assert sorted(sum(shards, [])) == sorted(hostnames)
+        assert all(shards)
+
+    def test_in_shard_nested(self):
+        hostnames = ["switch{}".format(i) for i in range(100)]
+        shard = [h for h in hostnames if in_shard(h, [(2, 3)])]
+        sub_shards = [
+            [h for h in hostnames if in_shard(h, [(2, 3), (i, 2)])]
+            for i in (1, 2)
+        ]
+
+        assert sorted(sum(sub_shards, [])) == sorted(shard)
+
+    def test_in_shard_no_shard(self):
+        assert in_shard("switch1", [])
+
+
+class TestNetboxRequestsCounter():
+
+    class _API():
+        url = "http://netbox.tld/api"
+
+        def get(self, *args, **kwargs):
+            return {}
+
+        def post(self, *args, **kwargs):
+            return {}
+
+    def test_count_requests(self):
+        counter = NetboxRequestsCounter(self._API())
+        counter.get("dcim/devices/")
+        counter.post("dcim/devices/", json={})
+
+        assert counter.requests_count == 2
+
+    def test_proxy_attributes(self):
+        counter = NetboxRequestsCounter(self._API())
+
+        assert counter.url == "http://netbox.tld/api"
+        assert counter.requests_count == 0
@@ -5,8 +5,8 @@ import ipaddress
 import logging
 import yaml
 import sys
-from netboxapi import NetboxAPI, NetboxMapper
-from netbox_netdev_inventory.config import get_config
+from netboxapi import NetboxMapper
+from netbox_netdev_inventory.netbox import get_netbox_api
 from tqdm import tqdm
 
 
@@ -39,7 +39,7 @@ def parse_args():
 
 
 def print_orphans(parsed_args):
-    netbox_api = NetboxAPI(**get_config()["netbox"])
+    netbox_api = get_netbox_api()
     for p in get_orphans(netbox_api):
         print(p)
 
@@ -61,7 +61,7 @@ def get_orphans(netbox_api):
 
 
 def fix_vrf(parsed_args):
-    netbox_api = NetboxAPI(**get_config()["netbox"])
+    netbox_api = get_netbox_api()
     ip_mapper = NetboxMapper(netbox_api, "ipam", "ip-addresses")
     prefixes_mapper = NetboxMapper(netbox_api, "ipam", "prefixes")
     for i in tqdm(ip_mapper.get()):
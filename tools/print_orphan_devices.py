@@ -4,8 +4,8 @@ import argparse
 import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 import sys
-from netboxapi import NetboxAPI, NetboxMapper
-from netbox_netdev_inventory.config import get_config
+from netboxapi import NetboxMapper
+from netbox_netdev_inventory.netbox import get_netbox_api
 import tqdm
 
 
@@ -36,7 +36,7 @@ def parse_args():
 
 
 def print_orphans(parsed_args):
-    netbox_api = NetboxAPI(**get_config()["netbox"])
+    netbox_api = get_netbox_api(pool_size=parsed_args.threads)
     devices_mapper = NetboxMapper(netbox_api, "dcim", "devices")
 
     threads = parsed_args.threads